@@ -1,28 +1,167 @@
 #!/bin/bash
+set -o pipefail
+
+source "$(dirname "$0")/metrics.sh"
+source "$(dirname "$0")/verify.sh"
 
 BACKUP_DIR="/backups"
-BACKUP_FILE="backup-$(date +%Y-%m-%d-%H-%M-%S).sql.gz"
+TIMESTAMP="$(date +%Y-%m-%d-%H-%M-%S)"
 
-echo "[$(date '+%Y-%m-%d %H:%M:%S')] ⚡️ Starting backup process..."
-echo "[$(date '+%Y-%m-%d %H:%M:%S')] Host: $PG_HOST, Database: $PG_DATABASE"
-echo "[$(date '+%Y-%m-%d %H:%M:%S')] Backup file: $BACKUP_DIR/$BACKUP_FILE"
+# plain: single-threaded pg_dump piped through gzip
+# directory: pg_dump -Fd -j N with built-in compression, one file per table
+MODE="${BACKUP_MODE:-directory}"
+JOBS="${BACKUP_JOBS:-4}"
+COMPRESSION="${BACKUP_COMPRESSION:-zstd:3}"
+# What the restore check will compare: counts or checksum, recorded in the manifest
+VERIFY="${RESTORE_VERIFY:-counts}"
+# Dump from one specific standby (e.g. patroni2:5432) to keep the snapshot off the
+# primary. Not haproxy:5001: it balances every -j worker connection separately, and
+# a worker on another standby cannot import the snapshot of the first one
+SOURCE_HOST="${BACKUP_HOST:-$PG_HOST}"
+SOURCE_PORT="${BACKUP_PORT:-$PG_PORT}"
 
-pg_dump -h "$PG_HOST" -p "$PG_PORT" -U "$PG_USER" -d "$PG_DATABASE" | gzip > "$BACKUP_DIR/$BACKUP_FILE"
-unset PGPASSWORD
+log() {
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] $*"
+}
+
+# ratio <numerator> <denominator> [decimals]; 0 when the denominator is 0
+ratio() {
+    awk -v a="$1" -v b="$2" -v d="${3:-0}" 'BEGIN { printf "%.*f", d, (b > 0 ? a / b : 0) }'
+}
+
+if ! [[ "$RETENTION" =~ ^[1-9][0-9]*$ ]]; then
+    log "🚨 RETENTION must be a positive number, got '$RETENTION'" >&2
+    exit 1
+fi
 
-if [ $? -eq 0 ]; then
-    echo "[$(date '+%Y-%m-%d %H:%M:%S')] Backup created successfully!"
+case "$MODE" in
+    plain)
+        BACKUP_PATH="$BACKUP_DIR/backup-$TIMESTAMP.sql.gz"
+        ;;
+    directory)
+        BACKUP_PATH="$BACKUP_DIR/backup-$TIMESTAMP.dir"
+        ;;
+    *)
+        log "🚨 Unknown BACKUP_MODE: $MODE" >&2
+        exit 1
+        ;;
+esac
+# The dump is written under a temporary name and renamed once its manifest exists,
+# so restore.sh never picks up a dump that is still being written
+MANIFEST_PATH="$BACKUP_DIR/backup-$TIMESTAMP.manifest"
+PARTIAL_PATH="$BACKUP_PATH.partial"
+
+case "$VERIFY" in
+    counts|checksum)
+        ;;
+    *)
+        log "🚨 Unknown RESTORE_VERIFY: $VERIFY" >&2
+        exit 1
+        ;;
+esac
+
+log "⚡️ Starting backup process..."
+log "Host: $SOURCE_HOST:$SOURCE_PORT, Database: $PG_DATABASE, Mode: $MODE"
+log "Backup file: $BACKUP_PATH"
+
+DATABASE_BYTES=$(psql -h "$SOURCE_HOST" -p "$SOURCE_PORT" -U "$PG_USER" -d "$PG_DATABASE" -tAc \
+    "SELECT pg_database_size(current_database())" 2>/dev/null || echo 0)
+
+START=$(date +%s.%N)
+# One session holds a snapshot for the whole backup: pg_dump dumps it and the
+# manifest counts it, so the restore check compares against exactly what was dumped
+coproc SNAPSHOT_SESSION {
+    psql -h "$SOURCE_HOST" -p "$SOURCE_PORT" -U "$PG_USER" -d "$PG_DATABASE" -v ON_ERROR_STOP=1 -qtAX 2>&1
+}
+SNAPSHOT_PID=$SNAPSHOT_SESSION_PID
+printf '%s\n' "BEGIN ISOLATION LEVEL REPEATABLE READ, READ ONLY;" "SELECT pg_export_snapshot();" \
+    >&"${SNAPSHOT_SESSION[1]}"
+read -r -t 60 SNAPSHOT <&"${SNAPSHOT_SESSION[0]}"
+if ! [[ "$SNAPSHOT" =~ ^[0-9A-F]+-[0-9A-F]+(-[0-9]+)?$ ]]; then
+    log "🚨 Could not export a snapshot: $SNAPSHOT" >&2
+    STATUS=1
+elif [ "$MODE" = "plain" ]; then
+    pg_dump -h "$SOURCE_HOST" -p "$SOURCE_PORT" -U "$PG_USER" -d "$PG_DATABASE" --snapshot="$SNAPSHOT" \
+        | gzip > "$PARTIAL_PATH"
+    STATUS=$?
 else
-    echo "[$(date '+%Y-%m-%d %H:%M:%S')] Backup failed!" >&2
+    pg_dump -h "$SOURCE_HOST" -p "$SOURCE_PORT" -U "$PG_USER" -d "$PG_DATABASE" --snapshot="$SNAPSHOT" \
+        --format=directory --jobs="$JOBS" --compress="$COMPRESSION" --file="$PARTIAL_PATH"
+    STATUS=$?
+fi
+END=$(date +%s.%N)
+
+if [ $STATUS -eq 0 ]; then
+    MANIFEST_START=$(date +%s.%N)
+    {
+        echo "# verify: $VERIFY"
+        table_fingerprints "$SOURCE_HOST" "$SOURCE_PORT" "$PG_DATABASE" "$VERIFY" "$SNAPSHOT"
+    } > "$MANIFEST_PATH.partial"
+    STATUS=$?
+    log "Manifest ($VERIFY) written in $(awk -v a="$(date +%s.%N)" -v b="$MANIFEST_START" 'BEGIN { printf "%.3f", a - b }')s"
+fi
+# Release the snapshot; the session may already be gone if it failed
+if [ -n "${SNAPSHOT_SESSION[1]:-}" ]; then
+    printf '%s\n' "COMMIT;" '\q' >&"${SNAPSHOT_SESSION[1]}" 2>/dev/null
+fi
+wait "$SNAPSHOT_PID" 2>/dev/null
+unset PGPASSWORD
+
+if [ $STATUS -eq 0 ]; then
+    mv "$MANIFEST_PATH.partial" "$MANIFEST_PATH" && mv "$PARTIAL_PATH" "$BACKUP_PATH"
+    STATUS=$?
+fi
+
+DURATION=$(awk -v a="$END" -v b="$START" 'BEGIN { printf "%.3f", a - b }')
+LABELS=(mode="$MODE" compression="$([ "$MODE" = "plain" ] && echo gzip || echo "${COMPRESSION%%:*}")")
+
+if [ $STATUS -ne 0 ]; then
+    log "Backup failed!" >&2
+    rm -rf "$PARTIAL_PATH" "$MANIFEST_PATH.partial" "$MANIFEST_PATH"
+    push_metrics backup "${LABELS[@]}" <<METRICS
+# TYPE backup_success gauge
+backup_success 0
+# TYPE backup_duration_seconds gauge
+backup_duration_seconds $DURATION
+METRICS
     exit 1
 fi
 
-OLD_BACKUPS=$(ls -t "$BACKUP_DIR"/backup-*.sql.gz | tail -n +$(($RETENTION + 1)))
+BACKUP_BYTES=$(du -sb "$BACKUP_PATH" | cut -f1)
+log "Backup created successfully in ${DURATION}s: $BACKUP_BYTES bytes from a $DATABASE_BYTES byte database"
+
+push_metrics backup "${LABELS[@]}" <<METRICS
+# TYPE backup_success gauge
+backup_success 1
+# TYPE backup_last_success_timestamp_seconds gauge
+backup_last_success_timestamp_seconds $(date +%s)
+# TYPE backup_duration_seconds gauge
+backup_duration_seconds $DURATION
+# TYPE backup_size_bytes gauge
+backup_size_bytes $BACKUP_BYTES
+# TYPE backup_database_bytes gauge
+backup_database_bytes $DATABASE_BYTES
+# TYPE backup_throughput_bytes_per_second gauge
+backup_throughput_bytes_per_second $(ratio "$DATABASE_BYTES" "$DURATION")
+# TYPE backup_compression_ratio gauge
+backup_compression_ratio $(ratio "$DATABASE_BYTES" "$BACKUP_BYTES" 3)
+METRICS
+
+# Both formats count towards the retention limit, newest first
+mapfile -t OLD_BACKUPS < <(ls -1dt "$BACKUP_DIR"/backup-*.sql.gz "$BACKUP_DIR"/backup-*.dir 2>/dev/null | tail -n +$((RETENTION + 1)))
 
-if [ -n "$OLD_BACKUPS" ]; then
-    echo "[$(date '+%Y-%m-%d %H:%M:%S')] 🗑 Deleting old backups:"
-    echo "$OLD_BACKUPS"
-    rm -f $OLD_BACKUPS
+if [ ${#OLD_BACKUPS[@]} -gt 0 ]; then
+    log "🗑 Deleting old backups:"
+    printf '%s\n' "${OLD_BACKUPS[@]}"
+    OLD_MANIFESTS=()
+    for path in "${OLD_BACKUPS[@]}"; do
+        # backup-<timestamp>.sql.gz and backup-<timestamp>.dir share backup-<timestamp>.manifest
+        OLD_MANIFESTS+=("${path%%.*}.manifest")
+    done
+    if ! rm -rf -- "${OLD_BACKUPS[@]}" "${OLD_MANIFESTS[@]}"; then
+        log "🚨 Could not delete old backups" >&2
+        exit 1
+    fi
 fi
 
-echo "[$(date '+%Y-%m-%d %H:%M:%S')] 🏁 Backup process completed"
\ No newline at end of file
+log "🏁 Backup process completed"
@@ -0,0 +1,41 @@
+#!/bin/bash
+# Writes the cron table for the backup and, if RESTORE_INTERVAL_CRON and
+# PARTITION_INTERVAL_CRON are set, the restore check and the creation of
+# upcoming season partitions, then runs cron in the foreground. cron starts jobs with
+# an empty environment, so the settings are exported in every job line.
+
+ENVIRONMENT="export PG_HOST=${POSTGRES_HOST} \
+PG_USER=${POSTGRES_USER} \
+PG_PORT=${POSTGRES_PORT} \
+PGPASSWORD=${POSTGRES_PASSWORD} \
+PG_DATABASE=${DB_NAME} \
+RETENTION=${BACKUP_RETENTION_COUNT} \
+BACKUP_MODE=${BACKUP_MODE} \
+BACKUP_JOBS=${BACKUP_JOBS} \
+BACKUP_COMPRESSION=${BACKUP_COMPRESSION} \
+BACKUP_HOST=${BACKUP_HOST} \
+BACKUP_PORT=${BACKUP_PORT} \
+RESTORE_DATABASE=${RESTORE_DATABASE} \
+RESTORE_HOST=${RESTORE_HOST} \
+RESTORE_PORT=${RESTORE_PORT} \
+RESTORE_KEEP=${RESTORE_KEEP} \
+RESTORE_JOBS=${RESTORE_JOBS} \
+RESTORE_VERIFY=${RESTORE_VERIFY} \
+PARTITION_AHEAD_DAYS=${PARTITION_AHEAD_DAYS} \
+PUSHGATEWAY_URL=${PUSHGATEWAY_URL}"
+
+{
+    echo "${BACKUP_INTERVAL_CRON} root . /etc/profile; $ENVIRONMENT; /scripts/backup.sh >> /var/log/cron.log 2>&1"
+    if [ -n "${RESTORE_INTERVAL_CRON}" ]; then
+        echo "${RESTORE_INTERVAL_CRON} root . /etc/profile; $ENVIRONMENT; /scripts/restore.sh >> /var/log/cron.log 2>&1"
+    fi
+    if [ -n "${PARTITION_INTERVAL_CRON}" ]; then
+        echo "${PARTITION_INTERVAL_CRON} root . /etc/profile; $ENVIRONMENT; /scripts/partitions.sh >> /var/log/cron.log 2>&1"
+    fi
+} > /etc/cron.d/backup-cron
+chmod 0644 /etc/cron.d/backup-cron
+
+# Same settings for manual runs via docker-compose exec
+echo "$ENVIRONMENT" > /etc/profile.d/backup-env.sh
+
+exec cron -f
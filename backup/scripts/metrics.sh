@@ -0,0 +1,23 @@
+#!/bin/bash
+# Pushes metrics in Prometheus text format from stdin to the Pushgateway:
+#   push_metrics <job> [label=value ...] <<EOF ... EOF
+# Does nothing when PUSHGATEWAY_URL is empty; a failed push never fails the job.
+
+push_metrics() {
+    local job="$1"
+    shift
+    local path="/metrics/job/$job"
+    for label in "$@"; do
+        path="$path/${label%%=*}/${label#*=}"
+    done
+
+    if [ -z "${PUSHGATEWAY_URL:-}" ]; then
+        cat > /dev/null
+        return 0
+    fi
+
+    if ! curl -sS --max-time 10 --data-binary @- "${PUSHGATEWAY_URL%/}$path"; then
+        echo "[$(date '+%Y-%m-%d %H:%M:%S')] ⚠️ Could not push metrics to $PUSHGATEWAY_URL" >&2
+    fi
+    return 0
+}
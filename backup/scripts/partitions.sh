@@ -0,0 +1,33 @@
+#!/bin/bash
+# Creates the season partitions of matches and its event tables (V6) ahead of
+# time, so inserts dated in the coming season never fail with "no partition
+# of relation found". Runs on PARTITION_INTERVAL_CRON against the primary.
+set -o pipefail
+
+# How far ahead partitions must exist
+AHEAD_DAYS="${PARTITION_AHEAD_DAYS:-365}"
+
+log() {
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] $*"
+}
+
+run_psql() {
+    psql -h "$PG_HOST" -p "$PG_PORT" -U "$PG_USER" -d "$PG_DATABASE" -v ON_ERROR_STOP=1 -qtA "$@"
+}
+
+if ! [[ "$AHEAD_DAYS" =~ ^[0-9]+$ ]]; then
+    log "🚨 PARTITION_AHEAD_DAYS must be a number of days: $AHEAD_DAYS" >&2
+    exit 1
+fi
+
+if [ "$(run_psql -c "SELECT to_regproc('ensure_season_partitions') IS NOT NULL")" != "t" ]; then
+    log "Tables are not partitioned by season (V6 not applied); nothing to do"
+    exit 0
+fi
+
+if ! run_psql -c "SELECT ensure_season_partitions(CURRENT_DATE, CURRENT_DATE + $AHEAD_DAYS)" > /dev/null; then
+    log "🚨 Could not create season partitions" >&2
+    exit 1
+fi
+unset PGPASSWORD
+log "✅ Season partitions exist up to $(date -d "+$AHEAD_DAYS days" +%Y-%m-%d)"
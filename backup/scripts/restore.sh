@@ -0,0 +1,164 @@
+#!/bin/bash
+set -o pipefail
+
+source "$(dirname "$0")/metrics.sh"
+source "$(dirname "$0")/verify.sh"
+
+BACKUP_DIR="/backups"
+# Scratch database the newest backup is restored into. Point RESTORE_HOST at a
+# separate instance (restore-target in docker-compose.yml): restoring through
+# haproxy:5000 would load the whole dump onto the primary and replicate it
+TARGET_DB="${RESTORE_DATABASE:-${PG_DATABASE}_restore_check}"
+TARGET_HOST="${RESTORE_HOST:-$PG_HOST}"
+TARGET_PORT="${RESTORE_PORT:-$PG_PORT}"
+JOBS="${RESTORE_JOBS:-4}"
+KEEP="${RESTORE_KEEP:-false}"
+
+log() {
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] $*"
+}
+
+# ratio <numerator> <denominator> [decimals]; 0 when the denominator is 0
+ratio() {
+    awk -v a="$1" -v b="$2" -v d="${3:-0}" 'BEGIN { printf "%.*f", d, (b > 0 ? a / b : 0) }'
+}
+
+elapsed() {
+    awk -v a="$(date +%s.%N)" -v b="$1" 'BEGIN { printf "%.3f", a - b }'
+}
+
+run_psql() {
+    local host="$1" port="$2" db="$3"
+    shift 3
+    psql -h "$host" -p "$port" -U "$PG_USER" -d "$db" -v ON_ERROR_STOP=1 "$@"
+}
+
+drop_target() {
+    run_psql "$TARGET_HOST" "$TARGET_PORT" postgres -qc "DROP DATABASE IF EXISTS \"$TARGET_DB\" WITH (FORCE)"
+}
+
+fail() {
+    log "🚨 $*" >&2
+    push_metrics restore format="${FORMAT:-unknown}" <<METRICS
+# TYPE restore_success gauge
+restore_success 0
+METRICS
+    exit 1
+}
+
+# Newest complete backup. backup.sh writes the manifest before renaming the dump
+# from .partial, so a dump that is still being written never matches here
+BACKUP_PATH=""
+while read -r path; do
+    if [ -f "${path%%.*}.manifest" ]; then
+        BACKUP_PATH="$path"
+        break
+    fi
+    log "⚠️ Skipping $path: no manifest" >&2
+done < <(ls -1dt "$BACKUP_DIR"/backup-*.sql.gz "$BACKUP_DIR"/backup-*.dir 2>/dev/null)
+[ -n "$BACKUP_PATH" ] || fail "No complete backups in $BACKUP_DIR"
+MANIFEST_PATH="${BACKUP_PATH%%.*}.manifest"
+# counts or checksum, as chosen by RESTORE_VERIFY when the backup was taken
+VERIFY=$(sed -n 's/^# verify: //p' "$MANIFEST_PATH")
+case "$VERIFY" in
+    counts|checksum)
+        ;;
+    *)
+        fail "Unknown verification in $MANIFEST_PATH: ${VERIFY:-none}"
+        ;;
+esac
+
+if [ -d "$BACKUP_PATH" ]; then
+    FORMAT="directory"
+    COMPRESSION=$(pg_restore -l "$BACKUP_PATH" | sed -n 's/^;[[:space:]]*Compression:[[:space:]]*//p' | head -n 1)
+else
+    FORMAT="plain"
+    COMPRESSION="gzip"
+fi
+LABELS=(format="$FORMAT" compression="${COMPRESSION:-none}")
+BACKUP_BYTES=$(du -sb "$BACKUP_PATH" | cut -f1)
+BACKUP_AGE=$(( $(date +%s) - $(stat -c %Y "$BACKUP_PATH") ))
+
+log "⚡️ Restoring $BACKUP_PATH ($FORMAT, $BACKUP_BYTES bytes, ${BACKUP_AGE}s old)"
+log "Target: $TARGET_HOST:$TARGET_PORT/$TARGET_DB"
+
+if [ "$TARGET_HOST:$TARGET_PORT" != "$PG_HOST:$PG_PORT" ]; then
+    # A separate instance has none of the cluster's roles; owners and grants in the
+    # dump refer to them. Roles that already exist there only report an error
+    pg_dumpall -h "$PG_HOST" -p "$PG_PORT" -U "$PG_USER" --roles-only --no-role-passwords \
+        | psql -h "$TARGET_HOST" -p "$TARGET_PORT" -U "$PG_USER" -d postgres -q > /dev/null 2>&1 \
+        || log "⚠️ Could not copy roles to $TARGET_HOST:$TARGET_PORT; existing roles are kept" >&2
+fi
+
+drop_target || fail "Could not drop $TARGET_DB"
+run_psql "$TARGET_HOST" "$TARGET_PORT" postgres -qc "CREATE DATABASE \"$TARGET_DB\"" || fail "Could not create $TARGET_DB"
+
+START=$(date +%s.%N)
+PHASES=()
+if [ "$FORMAT" = "directory" ]; then
+    # Tables first, then data in parallel, then indexes, constraints and triggers in
+    # parallel; post-data also keeps triggers from firing during the load
+    for section in pre-data data post-data; do
+        PHASE_START=$(date +%s.%N)
+        pg_restore -h "$TARGET_HOST" -p "$TARGET_PORT" -U "$PG_USER" -d "$TARGET_DB" \
+            --exit-on-error --section="$section" --jobs="$JOBS" "$BACKUP_PATH" \
+            || fail "pg_restore --section=$section failed"
+        PHASES+=("$section=$(elapsed "$PHASE_START")")
+    done
+else
+    # A plain dump already creates indexes and constraints after the data
+    gunzip -c "$BACKUP_PATH" | run_psql "$TARGET_HOST" "$TARGET_PORT" "$TARGET_DB" -q > /dev/null \
+        || fail "psql restore failed"
+fi
+DURATION=$(elapsed "$START")
+
+RESTORED_BYTES=$(run_psql "$TARGET_HOST" "$TARGET_PORT" "$TARGET_DB" -tAc "SELECT pg_database_size(current_database())")
+log "Restored in ${DURATION}s: $RESTORED_BYTES bytes"
+
+# Compared against the manifest taken in the dump's own snapshot, so writes made
+# on the cluster since the backup do not count as mismatches. A table counts once
+# whether its value differs or it is missing on either side
+VERIFY_START=$(date +%s.%N)
+MISMATCHES=$(diff \
+    <(grep -v '^#' "$MANIFEST_PATH") \
+    <(table_fingerprints "$TARGET_HOST" "$TARGET_PORT" "$TARGET_DB" "$VERIFY") \
+    | awk '/^[<>] / { print $2 }' | sort -u | wc -l)
+VERIFY_DURATION=$(elapsed "$VERIFY_START")
+if [ "$MISMATCHES" -eq 0 ]; then
+    log "✅ Verified by $VERIFY: every table matches the manifest"
+else
+    log "❌ Verification by $VERIFY: $MISMATCHES tables differ from the manifest" >&2
+fi
+
+{
+    echo "# TYPE restore_success gauge"
+    echo "restore_success 1"
+    echo "# TYPE restore_duration_seconds gauge"
+    echo "restore_duration_seconds $DURATION"
+    echo "# TYPE restore_phase_seconds gauge"
+    for phase in "${PHASES[@]}"; do
+        echo "restore_phase_seconds{phase=\"${phase%%=*}\"} ${phase#*=}"
+    done
+    echo "# TYPE restore_backup_bytes gauge"
+    echo "restore_backup_bytes $BACKUP_BYTES"
+    echo "# TYPE restore_database_bytes gauge"
+    echo "restore_database_bytes $RESTORED_BYTES"
+    echo "# TYPE restore_throughput_bytes_per_second gauge"
+    echo "restore_throughput_bytes_per_second $(ratio "$RESTORED_BYTES" "$DURATION")"
+    echo "# TYPE restore_backup_age_seconds gauge"
+    echo "restore_backup_age_seconds $BACKUP_AGE"
+    echo "# TYPE restore_verify_seconds gauge"
+    echo "restore_verify_seconds $VERIFY_DURATION"
+    echo "# TYPE restore_mismatched_tables gauge"
+    echo "restore_mismatched_tables $MISMATCHES"
+    echo "# TYPE restore_last_run_timestamp_seconds gauge"
+    echo "restore_last_run_timestamp_seconds $(date +%s)"
+} | push_metrics restore "${LABELS[@]}"
+
+if [ "$KEEP" != "true" ]; then
+    drop_target || log "⚠️ Could not drop $TARGET_DB" >&2
+fi
+unset PGPASSWORD
+
+[ "$MISMATCHES" -eq 0 ] || exit 1
+log "🏁 Restore check completed"
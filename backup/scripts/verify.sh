@@ -0,0 +1,32 @@
+#!/bin/bash
+# Per-table fingerprints shared by backup.sh, which writes them to a manifest
+# next to the dump, and restore.sh, which checks the restored copy against it:
+#   table_fingerprints <host> <port> <database> <counts|checksum> [snapshot]
+# Prints "table value" lines, sorted. With a snapshot id exported by
+# pg_export_snapshot() the tables are read in that snapshot, i.e. exactly as
+# pg_dump --snapshot saw them. Leaf partitions are included and partitioned
+# parents skipped, so every row is counted once.
+
+table_fingerprints() {
+    local host="$1" port="$2" db="$3" mode="$4" snapshot="${5:-}"
+    local expression="COUNT(*)::text"
+    if [ "$mode" = "checksum" ]; then
+        expression="COALESCE(md5(string_agg(md5(t::text), '''' ORDER BY md5(t::text))), '''')"
+    fi
+    {
+        if [ -n "$snapshot" ]; then
+            echo "BEGIN ISOLATION LEVEL REPEATABLE READ, READ ONLY;"
+            echo "SET TRANSACTION SNAPSHOT '$snapshot';"
+        fi
+        cat <<SQL
+SELECT format('SELECT %L, $expression FROM %I t', c.relname, c.relname)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = 'public' AND c.relkind = 'r' AND c.relname <> 'flyway_schema_history'
+\gexec
+SQL
+        if [ -n "$snapshot" ]; then
+            echo "COMMIT;"
+        fi
+    } | psql -h "$host" -p "$port" -U "$PG_USER" -d "$db" -v ON_ERROR_STOP=1 -qtA -F ' ' | sort
+}
@@ -0,0 +1,29 @@
+-- V5__create_match_summaries_down.sql
+DO $$
+DECLARE
+    source_table TEXT;
+    suffix TEXT;
+BEGIN
+    FOREACH source_table IN ARRAY ARRAY['club_match_stats', 'goals', 'assists', 'fouls', 'injuries', 'clean_sheets'] LOOP
+        FOREACH suffix IN ARRAY ARRAY['insert', 'delete', 'update_old', 'update_new'] LOOP
+            EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', source_table || '_summary_' || suffix, source_table);
+        END LOOP;
+    END LOOP;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS matches_summary_update ON matches;
+
+DROP FUNCTION IF EXISTS sync_match_summaries_clubs();
+DROP FUNCTION IF EXISTS sync_match_summaries();
+DROP FUNCTION IF EXISTS rebuild_match_summaries();
+DROP FUNCTION IF EXISTS refresh_match_summaries(BIGINT[]);
+
+DROP VIEW IF EXISTS club_match_summary_source;
+DROP VIEW IF EXISTS player_match_summary_source;
+
+DROP INDEX IF EXISTS idx_clean_sheets_match;
+DROP INDEX IF EXISTS idx_assists_match;
+
+DROP TABLE IF EXISTS club_match_summary;
+DROP TABLE IF EXISTS player_match_summary;
\ No newline at end of file
@@ -0,0 +1,259 @@
+-- V6__partition_by_season_down.sql
+-- Copies the attached seasons back into plain tables. Fails while the archive
+-- schema holds detached seasons, so they are never dropped silently.
+DROP VIEW IF EXISTS club_match_summary_source;
+DROP VIEW IF EXISTS player_match_summary_source;
+
+-- Secondary indexes to carry back to the plain tables, except the match_id
+-- indexes V6 added for its own foreign keys
+CREATE TEMP TABLE season_table_indexes AS
+SELECT ix.indexname, ix.indexdef
+FROM pg_indexes ix
+WHERE ix.schemaname = 'public' AND ix.tablename = ANY(season_partitioned_tables())
+  AND ix.indexname <> 'idx_' || ix.tablename || '_match_fk'
+  AND NOT EXISTS (
+      SELECT 1 FROM pg_constraint c WHERE c.conindid = format('%I.%I', ix.schemaname, ix.indexname)::regclass
+  );
+
+DO $$
+DECLARE
+    parent_table TEXT;
+    legacy_constraint TEXT;
+BEGIN
+    FOREACH parent_table IN ARRAY season_partitioned_tables() LOOP
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', parent_table, parent_table || '_legacy');
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', parent_table || '_pkey', parent_table || '_legacy_pkey');
+    END LOOP;
+    -- Constraints cloned onto partitions go away with their parent constraint
+    FOREACH parent_table IN ARRAY season_partitioned_tables() LOOP
+        FOR legacy_constraint IN
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = (parent_table || '_legacy')::regclass AND contype IN ('f', 'c') AND conparentid = 0
+        LOOP
+            EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', parent_table || '_legacy', legacy_constraint);
+        END LOOP;
+    END LOOP;
+END;
+$$;
+
+-- Matches table
+CREATE TABLE matches (
+    id BIGINT NOT NULL DEFAULT nextval('matches_id_seq') PRIMARY KEY,
+    tournament_id BIGINT NOT NULL REFERENCES tournaments(id),
+    club1_id BIGINT NOT NULL REFERENCES clubs(id),
+    club2_id BIGINT NOT NULL REFERENCES clubs(id),
+    match_date DATE NOT NULL,
+    stadium_id BIGINT NOT NULL REFERENCES stadiums(id),
+    club1_score SMALLINT NOT NULL,
+    club2_score SMALLINT NOT NULL,
+    referee_id BIGINT NOT NULL REFERENCES referees(id),
+    attendance INTEGER NOT NULL
+);
+ALTER SEQUENCE matches_id_seq OWNED BY matches.id;
+
+-- Club match stats
+CREATE TABLE club_match_stats (
+    match_id BIGINT NOT NULL REFERENCES matches(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    possession DECIMAL(5,2) NOT NULL,
+    shots SMALLINT NOT NULL,
+    shots_on_target SMALLINT NOT NULL,
+    passes INTEGER NOT NULL,
+    pass_accuracy DECIMAL(5,2) NOT NULL,
+    fouls_committed SMALLINT NOT NULL,
+    offsides SMALLINT NOT NULL,
+    corners SMALLINT NOT NULL,
+    PRIMARY KEY (match_id, club_id)
+);
+
+-- Goals table
+CREATE TABLE goals (
+    goal_id BIGINT NOT NULL DEFAULT nextval('goals_goal_id_seq') PRIMARY KEY,
+    match_id BIGINT NOT NULL REFERENCES matches(id),
+    scorer_id BIGINT NOT NULL REFERENCES players(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    goal_mn SMALLINT NOT NULL CHECK (goal_mn BETWEEN 0 AND 120),
+    goal_type goal_type NOT NULL
+);
+ALTER SEQUENCE goals_goal_id_seq OWNED BY goals.goal_id;
+
+-- Starting lineups
+CREATE TABLE starting_lineups (
+    id BIGINT NOT NULL DEFAULT nextval('starting_lineups_id_seq') PRIMARY KEY,
+    match_id BIGINT NOT NULL REFERENCES matches(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    player_id BIGINT NOT NULL REFERENCES players(id),
+    position player_position NOT NULL,
+    is_captain BOOLEAN NOT NULL DEFAULT false,
+    formation VARCHAR(20) NOT NULL
+);
+ALTER SEQUENCE starting_lineups_id_seq OWNED BY starting_lineups.id;
+
+-- Assists
+CREATE TABLE assists (
+    id BIGINT NOT NULL DEFAULT nextval('assists_id_seq') PRIMARY KEY,
+    match_id BIGINT NOT NULL REFERENCES matches(id),
+    goal_id BIGINT NOT NULL REFERENCES goals(goal_id),
+    assistant_id BIGINT NOT NULL REFERENCES players(id),
+    assist_mn SMALLINT NOT NULL CHECK (assist_mn BETWEEN 0 AND 120)
+);
+ALTER SEQUENCE assists_id_seq OWNED BY assists.id;
+
+-- Fouls
+CREATE TABLE fouls (
+    id BIGINT NOT NULL DEFAULT nextval('fouls_id_seq') PRIMARY KEY,
+    match_id BIGINT NOT NULL REFERENCES matches(id),
+    player_id BIGINT NOT NULL REFERENCES players(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    foul_mn SMALLINT NOT NULL CHECK (foul_mn BETWEEN 0 AND 120),
+    foul_type foul_type NOT NULL
+);
+ALTER SEQUENCE fouls_id_seq OWNED BY fouls.id;
+
+-- Clean sheets
+CREATE TABLE clean_sheets (
+    id BIGINT NOT NULL DEFAULT nextval('clean_sheets_id_seq') PRIMARY KEY,
+    match_id BIGINT NOT NULL REFERENCES matches(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    player_id BIGINT NOT NULL REFERENCES players(id)
+);
+ALTER SEQUENCE clean_sheets_id_seq OWNED BY clean_sheets.id;
+
+-- Substitutions
+CREATE TABLE substitutions (
+    id BIGINT NOT NULL DEFAULT nextval('substitutions_id_seq') PRIMARY KEY,
+    match_id BIGINT NOT NULL REFERENCES matches(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    player_out_id BIGINT NOT NULL REFERENCES players(id),
+    player_in_id BIGINT NOT NULL REFERENCES players(id),
+    substitution_mn SMALLINT NOT NULL CHECK (substitution_mn BETWEEN 0 AND 120)
+);
+ALTER SEQUENCE substitutions_id_seq OWNED BY substitutions.id;
+
+-- Injuries
+CREATE TABLE injuries (
+    id BIGINT NOT NULL DEFAULT nextval('injuries_id_seq') PRIMARY KEY,
+    match_id BIGINT NOT NULL REFERENCES matches(id),
+    player_id BIGINT NOT NULL REFERENCES players(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    injury_type injury_type NOT NULL,
+    injury_mn SMALLINT NOT NULL CHECK (injury_mn BETWEEN 0 AND 120),
+    recovery_days INTEGER NOT NULL CHECK (recovery_days > 0)
+);
+ALTER SEQUENCE injuries_id_seq OWNED BY injuries.id;
+
+INSERT INTO matches SELECT * FROM matches_legacy;
+
+INSERT INTO club_match_stats
+SELECT match_id, club_id, possession, shots, shots_on_target, passes, pass_accuracy,
+       fouls_committed, offsides, corners
+FROM club_match_stats_legacy;
+
+INSERT INTO goals
+SELECT goal_id, match_id, scorer_id, club_id, goal_mn, goal_type FROM goals_legacy;
+
+INSERT INTO starting_lineups
+SELECT id, match_id, club_id, player_id, position, is_captain, formation FROM starting_lineups_legacy;
+
+INSERT INTO assists
+SELECT id, match_id, goal_id, assistant_id, assist_mn FROM assists_legacy;
+
+INSERT INTO fouls
+SELECT id, match_id, player_id, club_id, foul_mn, foul_type FROM fouls_legacy;
+
+INSERT INTO clean_sheets
+SELECT id, match_id, club_id, player_id FROM clean_sheets_legacy;
+
+INSERT INTO substitutions
+SELECT id, match_id, club_id, player_out_id, player_in_id, substitution_mn FROM substitutions_legacy;
+
+INSERT INTO injuries
+SELECT id, match_id, player_id, club_id, injury_type, injury_mn, recovery_days FROM injuries_legacy;
+
+DROP TABLE substitutions_legacy;
+DROP TABLE injuries_legacy;
+DROP TABLE fouls_legacy;
+DROP TABLE clean_sheets_legacy;
+DROP TABLE assists_legacy;
+DROP TABLE goals_legacy;
+DROP TABLE starting_lineups_legacy;
+DROP TABLE club_match_stats_legacy;
+DROP TABLE matches_legacy;
+
+-- Indexes carried back from the partitioned tables
+DO $$
+DECLARE
+    definition TEXT;
+BEGIN
+    FOR definition IN SELECT indexdef FROM season_table_indexes ORDER BY indexname LOOP
+        -- Indexes of partitioned tables come back as "ON ONLY"
+        EXECUTE regexp_replace(replace(definition, ' ON ONLY ', ' ON '),
+                               '^CREATE (UNIQUE )?INDEX ', 'CREATE \1INDEX IF NOT EXISTS ');
+    END LOOP;
+END;
+$$;
+DROP TABLE season_table_indexes;
+
+-- Summary sources and triggers as in V5
+CREATE OR REPLACE VIEW player_match_summary_source AS
+SELECT player_id
+    , match_id
+    , club_id
+    , SUM(goals)::INTEGER AS goals
+    , SUM(assists)::INTEGER AS assists
+    , SUM(fouls)::INTEGER AS fouls
+    , SUM(injuries)::INTEGER AS injuries
+    , SUM(clean_sheets)::INTEGER AS clean_sheets
+FROM (
+    SELECT scorer_id AS player_id, match_id, club_id, 1 AS goals, 0 AS assists, 0 AS fouls, 0 AS injuries, 0 AS clean_sheets
+    FROM goals
+    UNION ALL
+    SELECT a.assistant_id, a.match_id, g.club_id, 0, 1, 0, 0, 0
+    FROM assists a
+    JOIN goals g ON a.goal_id = g.goal_id
+    UNION ALL
+    SELECT player_id, match_id, club_id, 0, 0, 1, 0, 0 FROM fouls
+    UNION ALL
+    SELECT player_id, match_id, club_id, 0, 0, 0, 1, 0 FROM injuries
+    UNION ALL
+    SELECT player_id, match_id, club_id, 0, 0, 0, 0, 1 FROM clean_sheets
+) events
+GROUP BY player_id, match_id, club_id;
+
+CREATE OR REPLACE VIEW club_match_summary_source AS
+SELECT cms.match_id
+    , cms.club_id
+    , cms.club_id = m.club1_id AS is_home
+    , cms.possession
+    , cms.pass_accuracy
+    , (SELECT COUNT(*) FROM goals g WHERE g.match_id = cms.match_id AND g.club_id = cms.club_id)::INTEGER AS goals
+    , (SELECT COUNT(*) FROM fouls f WHERE f.match_id = cms.match_id AND f.club_id = cms.club_id)::INTEGER AS fouls
+FROM club_match_stats cms
+JOIN matches m ON cms.match_id = m.id;
+
+DO $$
+DECLARE
+    source_table TEXT;
+BEGIN
+    FOREACH source_table IN ARRAY ARRAY['club_match_stats', 'goals', 'assists', 'fouls', 'injuries', 'clean_sheets'] LOOP
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_insert', source_table);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_delete', source_table);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_update_old', source_table);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_update_new', source_table);
+    END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER matches_summary_update AFTER UPDATE ON matches
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries_clubs();
+
+DROP FUNCTION IF EXISTS archive_seasons(DATE);
+DROP FUNCTION IF EXISTS ensure_season_partitions(DATE, DATE);
+DROP FUNCTION IF EXISTS season_partitioned_tables();
+DROP FUNCTION IF EXISTS season_start(DATE);
+DROP SCHEMA IF EXISTS archive;
\ No newline at end of file
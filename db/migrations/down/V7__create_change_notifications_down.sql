@@ -0,0 +1,17 @@
+-- V7__create_change_notifications_down.sql
+DO $$
+DECLARE
+    source_table TEXT;
+BEGIN
+    FOREACH source_table IN ARRAY ARRAY[
+        'clubs', 'stadiums', 'players', 'managers', 'referees', 'tournaments', 'contracts', 'transfers',
+        'personal_awards', 'league_statistics', 'cup_statistics', 'matches', 'club_match_stats',
+        'starting_lineups', 'goals', 'assists', 'clean_sheets', 'fouls', 'injuries', 'substitutions',
+        'player_match_summary', 'club_match_summary'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', source_table || '_notify_change', source_table);
+    END LOOP;
+END;
+$$;
+
+DROP FUNCTION IF EXISTS notify_table_change();
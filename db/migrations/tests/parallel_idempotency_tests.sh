@@ -0,0 +1,218 @@
+#!/bin/bash
+set -o pipefail
+
+DB_HOST="$TEST_DB_HOST"
+DB_PORT="$TEST_DB_PORT"
+DB_NAME="$TEST_DB_NAME"
+DB_USER="$TEST_DB_USER"
+DB_PASSWORD="$TEST_DB_PASSWORD"
+JOBS="${TEST_JOBS:-$(nproc)}"
+# Optional data loaded once the schema reaches TEST_SEED_VERSION, so every later
+# migration is tested against a populated database: a .sql file or a pg_dump archive
+SEED_FILE="${TEST_SEED_FILE:-}"
+SEED_VERSION="${TEST_SEED_VERSION:-}"
+
+MIGRATIONS_DIR="/migrations"
+UP_DIR="$MIGRATIONS_DIR/up"
+DOWN_DIR="$MIGRATIONS_DIR/down"
+PREFIX="${DB_NAME}_mig"
+
+export PGPASSWORD="$DB_PASSWORD"
+
+WORK_DIR=$(mktemp -d)
+
+required_vars=("DB_HOST" "DB_PORT" "DB_USER" "PGPASSWORD" "DB_NAME")
+for var in "${required_vars[@]}"; do
+    if [ -z "${!var:-}" ]; then
+        echo "🚨 ERROR: Required variable $var is not set"
+        exit 1
+    fi
+done
+
+if [ -n "$SEED_FILE" ] && [ -z "$SEED_VERSION" ]; then
+    echo "🚨 ERROR: TEST_SEED_FILE needs TEST_SEED_VERSION, the migration it matches"
+    exit 1
+fi
+
+run_psql() {
+    local db="$1"
+    shift
+    psql -h "$DB_HOST" -p "$DB_PORT" -U "$DB_USER" -d "$db" -v ON_ERROR_STOP=1 -q "$@"
+}
+
+# Schema as sorted text lines built from the catalogs. Names and definitions
+# only: no OIDs, no statistics, no data, so equal schemas give equal snapshots
+take_catalog_snapshot() {
+    local db="$1" snapshot_file="$2"
+    run_psql "$db" -tA > "$snapshot_file.unsorted" <<-'EOSQL'
+	WITH schemas AS (
+	    SELECT oid, nspname FROM pg_namespace
+	    WHERE nspname NOT IN ('pg_catalog', 'information_schema', 'pg_toast') AND nspname NOT LIKE 'pg_temp_%' AND nspname NOT LIKE 'pg_toast_temp_%'
+	)
+	SELECT 'schema ' || nspname FROM schemas
+	UNION ALL
+	SELECT format('relation %s.%s %s %s %s %s', s.nspname, c.relname, c.relkind, c.relpersistence,
+	              COALESCE(pg_get_partkeydef(c.oid), ''), COALESCE(pg_get_expr(c.relpartbound, c.oid), ''))
+	FROM pg_class c JOIN schemas s ON s.oid = c.relnamespace
+	WHERE c.relkind IN ('r', 'p', 'v', 'm', 'S', 'f')
+	UNION ALL
+	SELECT format('column %s.%s %s %s %s not_null=%s default=%s', s.nspname, c.relname, a.attnum, a.attname,
+	              format_type(a.atttypid, a.atttypmod), a.attnotnull, COALESCE(pg_get_expr(d.adbin, d.adrelid), ''))
+	FROM pg_attribute a
+	JOIN pg_class c ON c.oid = a.attrelid
+	JOIN schemas s ON s.oid = c.relnamespace
+	LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+	WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f') AND a.attnum > 0 AND NOT a.attisdropped
+	UNION ALL
+	SELECT format('constraint %s.%s %s %s', s.nspname, c.relname, con.conname, pg_get_constraintdef(con.oid))
+	FROM pg_constraint con
+	JOIN pg_class c ON c.oid = con.conrelid
+	JOIN schemas s ON s.oid = c.relnamespace
+	UNION ALL
+	SELECT 'index ' || pg_get_indexdef(i.indexrelid)
+	FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid JOIN schemas s ON s.oid = c.relnamespace
+	UNION ALL
+	SELECT format('view %s.%s %s', s.nspname, c.relname, md5(pg_get_viewdef(c.oid)))
+	FROM pg_class c JOIN schemas s ON s.oid = c.relnamespace
+	WHERE c.relkind IN ('v', 'm')
+	UNION ALL
+	SELECT format('function %s.%s(%s) %s', s.nspname, p.proname, pg_get_function_identity_arguments(p.oid),
+	              md5(pg_get_functiondef(p.oid)))
+	FROM pg_proc p JOIN schemas s ON s.oid = p.pronamespace
+	WHERE p.prokind IN ('f', 'p')
+	UNION ALL
+	SELECT 'trigger ' || pg_get_triggerdef(t.oid)
+	FROM pg_trigger t JOIN pg_class c ON c.oid = t.tgrelid JOIN schemas s ON s.oid = c.relnamespace
+	WHERE NOT t.tgisinternal
+	UNION ALL
+	SELECT format('type %s.%s %s %s', s.nspname, t.typname, t.typtype,
+	              COALESCE((SELECT string_agg(e.enumlabel, ',' ORDER BY e.enumsortorder) FROM pg_enum e WHERE e.enumtypid = t.oid), ''))
+	FROM pg_type t JOIN schemas s ON s.oid = t.typnamespace
+	WHERE t.typtype IN ('e', 'd', 'c') AND (t.typrelid = 0 OR (SELECT relkind FROM pg_class WHERE oid = t.typrelid) = 'c')
+	UNION ALL
+	SELECT format('sequence %s.%s %s %s %s %s %s', s.nspname, c.relname, format_type(q.seqtypid, NULL),
+	              q.seqstart, q.seqincrement, q.seqmin, q.seqmax)
+	FROM pg_sequence q JOIN pg_class c ON c.oid = q.seqrelid JOIN schemas s ON s.oid = c.relnamespace
+	UNION ALL
+	SELECT format('extension %s %s', extname, extversion) FROM pg_extension
+	EOSQL
+    local status=$?
+    sort "$snapshot_file.unsorted" > "$snapshot_file"
+    rm -f "$snapshot_file.unsorted"
+    return $status
+}
+
+load_seed() {
+    local db="$1"
+    echo "  🌱 Loading $SEED_FILE"
+    if [[ "$SEED_FILE" == *.sql ]]; then
+        run_psql "$db" -f "$SEED_FILE" > /dev/null
+    else
+        pg_restore -h "$DB_HOST" -p "$DB_PORT" -U "$DB_USER" -d "$db" --data-only --exit-on-error \
+            --jobs="$JOBS" "$SEED_FILE"
+    fi
+}
+
+drop_databases() {
+    local databases
+    databases=$(run_psql "$DB_NAME" -tAc "SELECT datname FROM pg_database WHERE datname LIKE '${PREFIX}\_%'")
+    for db in $databases; do
+        run_psql "$DB_NAME" -c "DROP DATABASE IF EXISTS \"$db\" WITH (FORCE)"
+    done
+}
+
+cleanup() {
+    drop_databases
+    rm -rf "$WORK_DIR"
+}
+trap cleanup EXIT
+
+# Down, up again, and compare with the snapshot taken right after the first up
+test_migration() {
+    local index="$1" migration="$2"
+    local up_file="$UP_DIR/$migration"
+    local down_file="$DOWN_DIR/${migration/_up.sql/_down.sql}"
+    local db="${PREFIX}_test_$index"
+
+    run_psql "$DB_NAME" -c "CREATE DATABASE \"$db\" TEMPLATE \"${PREFIX}_state_$index\"" || return 1
+    echo "  ⏪ Rolling back"
+    run_psql "$db" -f "$down_file" > /dev/null || return 1
+    echo "  ⚡ Re-applying"
+    run_psql "$db" -f "$up_file" > /dev/null || return 1
+    take_catalog_snapshot "$db" "$WORK_DIR/after_$index.txt" || return 1
+    run_psql "$DB_NAME" -c "DROP DATABASE \"$db\" WITH (FORCE)"
+
+    if ! diff -u "$WORK_DIR/before_$index.txt" "$WORK_DIR/after_$index.txt"; then
+        echo "  🔍 Schema mismatch detected!"
+        return 1
+    fi
+}
+
+migrations=($(ls "$UP_DIR" | sort -V))
+total_migrations="${#migrations[@]}"
+
+echo "🔎 Found $total_migrations migrations to test, $JOBS in parallel"
+drop_databases
+
+# Build the state after every migration once; each state is the template the
+# next one starts from, and its snapshot is the expected result of down + up
+echo "🏗 Building migration states..."
+run_psql "$DB_NAME" -c "CREATE DATABASE \"${PREFIX}_state_0\" TEMPLATE template0" || exit 1
+for ((i=1; i<=total_migrations; i++)); do
+    migration="${migrations[$((i-1))]}"
+    down_file="$DOWN_DIR/${migration/_up.sql/_down.sql}"
+    if [ ! -f "$down_file" ]; then
+        echo "🚨 ERROR: Down file not found: $down_file"
+        exit 1
+    fi
+    echo "  ⚡ Applying: $migration"
+    run_psql "$DB_NAME" -c "CREATE DATABASE \"${PREFIX}_state_$i\" TEMPLATE \"${PREFIX}_state_$((i-1))\"" || exit 1
+    if ! run_psql "${PREFIX}_state_$i" -f "$UP_DIR/$migration" > /dev/null; then
+        echo "❌ FAILURE: $migration does not apply"
+        exit 1
+    fi
+    if [ -n "$SEED_FILE" ] && [[ "$migration" == "V${SEED_VERSION}__"* ]]; then
+        load_seed "${PREFIX}_state_$i" || exit 1
+    fi
+    take_catalog_snapshot "${PREFIX}_state_$i" "$WORK_DIR/before_$i.txt" || exit 1
+done
+
+echo "🚀 Starting idempotency tests..."
+echo "========================================"
+
+for ((i=1; i<=total_migrations; i++)); do
+    while [ "$(jobs -rp | wc -l)" -ge "$JOBS" ]; do
+        wait -n
+    done
+    # Exit statuses go to files: a job reaped by `wait -n` cannot be waited for again
+    (
+        test_migration "$i" "${migrations[$((i-1))]}"
+        echo $? > "$WORK_DIR/status_$i.txt"
+    ) > "$WORK_DIR/log_$i.txt" 2>&1 &
+done
+wait
+
+failures=0
+for ((i=1; i<=total_migrations; i++)); do
+    migration="${migrations[$((i-1))]}"
+    echo ""
+    echo "🧪 MIGRATION #$i/$total_migrations: $migration"
+    echo "----------------------------------------"
+    cat "$WORK_DIR/log_$i.txt"
+    if [ "$(cat "$WORK_DIR/status_$i.txt" 2>/dev/null)" = "0" ]; then
+        echo "✅ SUCCESS: Migration is idempotent"
+    else
+        echo "❌ FAILURE: Migration is NOT idempotent"
+        failures=$((failures + 1))
+    fi
+done
+
+echo ""
+echo "========================================"
+if [ "$failures" -gt 0 ]; then
+    echo "❌ $failures of $total_migrations migrations failed the idempotency test"
+    exit 1
+fi
+echo "🎉 All migrations passed idempotency test!"
+echo "========================================"
+exit 0
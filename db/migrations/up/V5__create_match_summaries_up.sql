@@ -0,0 +1,175 @@
+-- V5__create_match_summaries_up.sql
+
+-- Per-player, per-match event counts. Derived data: no foreign keys,
+-- rebuild_match_summaries() recreates it from the event tables
+CREATE TABLE IF NOT EXISTS player_match_summary (
+    player_id BIGINT NOT NULL,
+    match_id BIGINT NOT NULL,
+    club_id BIGINT NOT NULL,
+    goals INTEGER NOT NULL DEFAULT 0,
+    assists INTEGER NOT NULL DEFAULT 0,
+    fouls INTEGER NOT NULL DEFAULT 0,
+    injuries INTEGER NOT NULL DEFAULT 0,
+    clean_sheets INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_id, match_id, club_id)
+);
+
+-- Per-club, per-match stats with goal and foul counts
+CREATE TABLE IF NOT EXISTS club_match_summary (
+    match_id BIGINT NOT NULL,
+    club_id BIGINT NOT NULL,
+    is_home BOOLEAN NOT NULL,
+    possession DECIMAL(5,2) NOT NULL,
+    pass_accuracy DECIMAL(5,2) NOT NULL,
+    goals INTEGER NOT NULL DEFAULT 0,
+    fouls INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (match_id, club_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_player_match_summary_match ON player_match_summary(match_id);
+CREATE INDEX IF NOT EXISTS idx_club_match_summary_club ON club_match_summary(club_id);
+
+-- Refreshing a match looks up its events by match_id
+CREATE INDEX IF NOT EXISTS idx_assists_match ON assists(match_id);
+CREATE INDEX IF NOT EXISTS idx_clean_sheets_match ON clean_sheets(match_id);
+
+-- What the summaries should contain; a filter on match_id is pushed down into every event table
+CREATE OR REPLACE VIEW player_match_summary_source AS
+SELECT player_id
+    , match_id
+    , club_id
+    , SUM(goals)::INTEGER AS goals
+    , SUM(assists)::INTEGER AS assists
+    , SUM(fouls)::INTEGER AS fouls
+    , SUM(injuries)::INTEGER AS injuries
+    , SUM(clean_sheets)::INTEGER AS clean_sheets
+FROM (
+    SELECT scorer_id AS player_id, match_id, club_id, 1 AS goals, 0 AS assists, 0 AS fouls, 0 AS injuries, 0 AS clean_sheets
+    FROM goals
+    UNION ALL
+    SELECT a.assistant_id, a.match_id, g.club_id, 0, 1, 0, 0, 0
+    FROM assists a
+    JOIN goals g ON a.goal_id = g.goal_id
+    UNION ALL
+    SELECT player_id, match_id, club_id, 0, 0, 1, 0, 0 FROM fouls
+    UNION ALL
+    SELECT player_id, match_id, club_id, 0, 0, 0, 1, 0 FROM injuries
+    UNION ALL
+    SELECT player_id, match_id, club_id, 0, 0, 0, 0, 1 FROM clean_sheets
+) events
+GROUP BY player_id, match_id, club_id;
+
+CREATE OR REPLACE VIEW club_match_summary_source AS
+SELECT cms.match_id
+    , cms.club_id
+    , cms.club_id = m.club1_id AS is_home
+    , cms.possession
+    , cms.pass_accuracy
+    , (SELECT COUNT(*) FROM goals g WHERE g.match_id = cms.match_id AND g.club_id = cms.club_id)::INTEGER AS goals
+    , (SELECT COUNT(*) FROM fouls f WHERE f.match_id = cms.match_id AND f.club_id = cms.club_id)::INTEGER AS fouls
+FROM club_match_stats cms
+JOIN matches m ON cms.match_id = m.id;
+
+-- Recompute the summaries of the given matches
+CREATE OR REPLACE FUNCTION refresh_match_summaries(match_ids BIGINT[]) RETURNS void AS $$
+BEGIN
+    DELETE FROM player_match_summary WHERE match_id = ANY(match_ids);
+    INSERT INTO player_match_summary (player_id, match_id, club_id, goals, assists, fouls, injuries, clean_sheets)
+    SELECT player_id, match_id, club_id, goals, assists, fouls, injuries, clean_sheets
+    FROM player_match_summary_source
+    WHERE match_id = ANY(match_ids)
+    ON CONFLICT (player_id, match_id, club_id) DO UPDATE
+    SET goals = EXCLUDED.goals,
+        assists = EXCLUDED.assists,
+        fouls = EXCLUDED.fouls,
+        injuries = EXCLUDED.injuries,
+        clean_sheets = EXCLUDED.clean_sheets;
+
+    DELETE FROM club_match_summary WHERE match_id = ANY(match_ids);
+    INSERT INTO club_match_summary (match_id, club_id, is_home, possession, pass_accuracy, goals, fouls)
+    SELECT match_id, club_id, is_home, possession, pass_accuracy, goals, fouls
+    FROM club_match_summary_source
+    WHERE match_id = ANY(match_ids)
+    ON CONFLICT (match_id, club_id) DO UPDATE
+    SET is_home = EXCLUDED.is_home,
+        possession = EXCLUDED.possession,
+        pass_accuracy = EXCLUDED.pass_accuracy,
+        goals = EXCLUDED.goals,
+        fouls = EXCLUDED.fouls;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute everything, e.g. after a bulk load with refresh deferred
+CREATE OR REPLACE FUNCTION rebuild_match_summaries() RETURNS void AS $$
+BEGIN
+    TRUNCATE player_match_summary, club_match_summary;
+    INSERT INTO player_match_summary (player_id, match_id, club_id, goals, assists, fouls, injuries, clean_sheets)
+    SELECT player_id, match_id, club_id, goals, assists, fouls, injuries, clean_sheets
+    FROM player_match_summary_source;
+    INSERT INTO club_match_summary (match_id, club_id, is_home, possession, pass_accuracy, goals, fouls)
+    SELECT match_id, club_id, is_home, possession, pass_accuracy, goals, fouls
+    FROM club_match_summary_source;
+    ANALYZE player_match_summary;
+    ANALYZE club_match_summary;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger: one refresh per statement for all matches it touched.
+-- Bulk loaders set match_summaries.defer_refresh = on and rebuild once at the end
+CREATE OR REPLACE FUNCTION sync_match_summaries() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('match_summaries.defer_refresh', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM refresh_match_summaries(ARRAY(SELECT DISTINCT match_id FROM changed_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- is_home comes from matches.club1_id; refresh the matches whose clubs an update changed
+CREATE OR REPLACE FUNCTION sync_match_summaries_clubs() RETURNS trigger AS $$
+DECLARE
+    match_ids BIGINT[];
+BEGIN
+    IF current_setting('match_summaries.defer_refresh', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    match_ids := ARRAY(
+        SELECT n.id
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE (n.club1_id, n.club2_id) IS DISTINCT FROM (o.club1_id, o.club2_id)
+    );
+    IF cardinality(match_ids) > 0 THEN
+        PERFORM refresh_match_summaries(match_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Column lists cannot be combined with transition tables, so score updates fire it too
+CREATE OR REPLACE TRIGGER matches_summary_update AFTER UPDATE ON matches
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries_clubs();
+
+-- Transition tables allow a single event per trigger, so every source table gets
+-- four: inserts, deletes, and both the old and new side of updates
+DO $$
+DECLARE
+    source_table TEXT;
+BEGIN
+    FOREACH source_table IN ARRAY ARRAY['club_match_stats', 'goals', 'assists', 'fouls', 'injuries', 'clean_sheets'] LOOP
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_insert', source_table);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_delete', source_table);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_update_old', source_table);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_update_new', source_table);
+    END LOOP;
+END;
+$$;
+
+-- Pick up data loaded before this migration
+SELECT rebuild_match_summaries();
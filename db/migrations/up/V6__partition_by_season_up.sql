@@ -0,0 +1,380 @@
+-- V6__partition_by_season_up.sql
+-- Matches and every per-match table are range-partitioned by match_date, one
+-- partition per season (July 1 to July 1). Event tables carry match_date so
+-- they can reference the partitioned matches table and be pruned with it.
+
+-- Season a date belongs to, given by its first day
+CREATE OR REPLACE FUNCTION season_start(match_day DATE) RETURNS DATE AS $$
+    SELECT make_date(EXTRACT(YEAR FROM match_day - INTERVAL '6 months')::INTEGER, 7, 1)
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Partitioned tables, parents before children
+CREATE OR REPLACE FUNCTION season_partitioned_tables() RETURNS TEXT[] AS $$
+    SELECT ARRAY[
+        'matches', 'club_match_stats', 'starting_lineups', 'goals', 'assists',
+        'clean_sheets', 'fouls', 'injuries', 'substitutions'
+    ]
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Create the partitions of every season between the two dates, e.g. goals_2024_25
+CREATE OR REPLACE FUNCTION ensure_season_partitions(from_date DATE, to_date DATE) RETURNS void AS $$
+DECLARE
+    season DATE;
+    parent_table TEXT;
+BEGIN
+    FOR season IN
+        SELECT generate_series(season_start(from_date)::TIMESTAMP, to_date::TIMESTAMP, INTERVAL '1 year')::DATE
+    LOOP
+        FOREACH parent_table IN ARRAY season_partitioned_tables() LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                parent_table || '_' || to_char(season, 'YYYY') || '_' || to_char(season + INTERVAL '1 year', 'YY'),
+                parent_table, season, (season + INTERVAL '1 year')::DATE
+            );
+        END LOOP;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE SCHEMA IF NOT EXISTS archive;
+
+-- Detach the seasons that ended on or before `cutoff` and move them to the
+-- archive schema. Returns the number of archived seasons.
+CREATE OR REPLACE FUNCTION archive_seasons(cutoff DATE) RETURNS INTEGER AS $$
+DECLARE
+    tables TEXT[] := season_partitioned_tables();
+    season_partition TEXT;
+    suffix TEXT;
+    child_table TEXT;
+    fk_name TEXT;
+    archived INTEGER := 0;
+BEGIN
+    FOR season_partition IN
+        SELECT c.relname
+        FROM pg_inherits inh
+        JOIN pg_class c ON c.oid = inh.inhrelid
+        WHERE inh.inhparent = 'matches'::regclass
+          AND substring(pg_get_expr(c.relpartbound, c.oid) FROM 'TO \(''([0-9-]+)''\)')::DATE <= cutoff
+        ORDER BY c.relname
+    LOOP
+        suffix := substring(season_partition FROM length('matches') + 1);
+        EXECUTE format('DELETE FROM player_match_summary WHERE match_id IN (SELECT id FROM %I)', season_partition);
+        EXECUTE format('DELETE FROM club_match_summary WHERE match_id IN (SELECT id FROM %I)', season_partition);
+        -- Children first: a matches partition can only be detached once nothing references it
+        FOR i IN REVERSE array_length(tables, 1)..1 LOOP
+            child_table := tables[i] || suffix;
+            EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', tables[i], child_table);
+            FOR fk_name IN
+                SELECT conname FROM pg_constraint WHERE conrelid = child_table::regclass AND contype = 'f'
+            LOOP
+                EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', child_table, fk_name);
+            END LOOP;
+            EXECUTE format('ALTER TABLE %I SET SCHEMA archive', child_table);
+        END LOOP;
+        archived := archived + 1;
+    END LOOP;
+    RETURN archived;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Secondary indexes the tables have now (from V4, V5 or added by hand), to be
+-- carried over to the partitioned tables. Only what exists is recreated, so V6
+-- does not bring back V4 indexes on a schema that never had them.
+CREATE TEMP TABLE season_table_indexes AS
+SELECT ix.indexname, ix.indexdef
+FROM pg_indexes ix
+WHERE ix.schemaname = 'public' AND ix.tablename = ANY(season_partitioned_tables())
+  AND NOT EXISTS (
+      SELECT 1 FROM pg_constraint c WHERE c.conindid = format('%I.%I', ix.schemaname, ix.indexname)::regclass
+  );
+
+-- Move the current tables aside. Their foreign keys and checks are dropped so
+-- the partitioned tables get the same constraint names.
+DROP VIEW IF EXISTS club_match_summary_source;
+DROP VIEW IF EXISTS player_match_summary_source;
+
+DO $$
+DECLARE
+    parent_table TEXT;
+    legacy_constraint TEXT;
+BEGIN
+    FOREACH parent_table IN ARRAY season_partitioned_tables() LOOP
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', parent_table, parent_table || '_legacy');
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', parent_table || '_pkey', parent_table || '_legacy_pkey');
+    END LOOP;
+    FOREACH parent_table IN ARRAY season_partitioned_tables() LOOP
+        FOR legacy_constraint IN
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = (parent_table || '_legacy')::regclass AND contype IN ('f', 'c')
+        LOOP
+            EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', parent_table || '_legacy', legacy_constraint);
+        END LOOP;
+    END LOOP;
+END;
+$$;
+
+-- Matches table
+CREATE TABLE matches (
+    id BIGINT NOT NULL DEFAULT nextval('matches_id_seq'),
+    tournament_id BIGINT NOT NULL REFERENCES tournaments(id),
+    club1_id BIGINT NOT NULL REFERENCES clubs(id),
+    club2_id BIGINT NOT NULL REFERENCES clubs(id),
+    match_date DATE NOT NULL,
+    stadium_id BIGINT NOT NULL REFERENCES stadiums(id),
+    club1_score SMALLINT NOT NULL,
+    club2_score SMALLINT NOT NULL,
+    referee_id BIGINT NOT NULL REFERENCES referees(id),
+    attendance INTEGER NOT NULL,
+    PRIMARY KEY (id, match_date)
+) PARTITION BY RANGE (match_date);
+ALTER SEQUENCE matches_id_seq OWNED BY matches.id;
+
+-- Club match stats
+CREATE TABLE club_match_stats (
+    match_id BIGINT NOT NULL,
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    possession DECIMAL(5,2) NOT NULL,
+    shots SMALLINT NOT NULL,
+    shots_on_target SMALLINT NOT NULL,
+    passes INTEGER NOT NULL,
+    pass_accuracy DECIMAL(5,2) NOT NULL,
+    fouls_committed SMALLINT NOT NULL,
+    offsides SMALLINT NOT NULL,
+    corners SMALLINT NOT NULL,
+    match_date DATE NOT NULL,
+    PRIMARY KEY (match_id, club_id, match_date),
+    FOREIGN KEY (match_id, match_date) REFERENCES matches(id, match_date)
+) PARTITION BY RANGE (match_date);
+
+-- Starting lineups
+CREATE TABLE starting_lineups (
+    id BIGINT NOT NULL DEFAULT nextval('starting_lineups_id_seq'),
+    match_id BIGINT NOT NULL,
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    player_id BIGINT NOT NULL REFERENCES players(id),
+    position player_position NOT NULL,
+    is_captain BOOLEAN NOT NULL DEFAULT false,
+    formation VARCHAR(20) NOT NULL,
+    match_date DATE NOT NULL,
+    PRIMARY KEY (id, match_date),
+    FOREIGN KEY (match_id, match_date) REFERENCES matches(id, match_date)
+) PARTITION BY RANGE (match_date);
+ALTER SEQUENCE starting_lineups_id_seq OWNED BY starting_lineups.id;
+
+-- Goals table
+CREATE TABLE goals (
+    goal_id BIGINT NOT NULL DEFAULT nextval('goals_goal_id_seq'),
+    match_id BIGINT NOT NULL,
+    scorer_id BIGINT NOT NULL REFERENCES players(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    goal_mn SMALLINT NOT NULL CHECK (goal_mn BETWEEN 0 AND 120),
+    goal_type goal_type NOT NULL,
+    match_date DATE NOT NULL,
+    PRIMARY KEY (goal_id, match_date),
+    FOREIGN KEY (match_id, match_date) REFERENCES matches(id, match_date)
+) PARTITION BY RANGE (match_date);
+ALTER SEQUENCE goals_goal_id_seq OWNED BY goals.goal_id;
+
+-- Assists
+CREATE TABLE assists (
+    id BIGINT NOT NULL DEFAULT nextval('assists_id_seq'),
+    match_id BIGINT NOT NULL,
+    goal_id BIGINT NOT NULL,
+    assistant_id BIGINT NOT NULL REFERENCES players(id),
+    assist_mn SMALLINT NOT NULL CHECK (assist_mn BETWEEN 0 AND 120),
+    match_date DATE NOT NULL,
+    PRIMARY KEY (id, match_date),
+    FOREIGN KEY (match_id, match_date) REFERENCES matches(id, match_date),
+    FOREIGN KEY (goal_id, match_date) REFERENCES goals(goal_id, match_date)
+) PARTITION BY RANGE (match_date);
+ALTER SEQUENCE assists_id_seq OWNED BY assists.id;
+
+-- Clean sheets
+CREATE TABLE clean_sheets (
+    id BIGINT NOT NULL DEFAULT nextval('clean_sheets_id_seq'),
+    match_id BIGINT NOT NULL,
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    player_id BIGINT NOT NULL REFERENCES players(id),
+    match_date DATE NOT NULL,
+    PRIMARY KEY (id, match_date),
+    FOREIGN KEY (match_id, match_date) REFERENCES matches(id, match_date)
+) PARTITION BY RANGE (match_date);
+ALTER SEQUENCE clean_sheets_id_seq OWNED BY clean_sheets.id;
+
+-- Fouls
+CREATE TABLE fouls (
+    id BIGINT NOT NULL DEFAULT nextval('fouls_id_seq'),
+    match_id BIGINT NOT NULL,
+    player_id BIGINT NOT NULL REFERENCES players(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    foul_mn SMALLINT NOT NULL CHECK (foul_mn BETWEEN 0 AND 120),
+    foul_type foul_type NOT NULL,
+    match_date DATE NOT NULL,
+    PRIMARY KEY (id, match_date),
+    FOREIGN KEY (match_id, match_date) REFERENCES matches(id, match_date)
+) PARTITION BY RANGE (match_date);
+ALTER SEQUENCE fouls_id_seq OWNED BY fouls.id;
+
+-- Injuries
+CREATE TABLE injuries (
+    id BIGINT NOT NULL DEFAULT nextval('injuries_id_seq'),
+    match_id BIGINT NOT NULL,
+    player_id BIGINT NOT NULL REFERENCES players(id),
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    injury_type injury_type NOT NULL,
+    injury_mn SMALLINT NOT NULL CHECK (injury_mn BETWEEN 0 AND 120),
+    recovery_days INTEGER NOT NULL CHECK (recovery_days > 0),
+    match_date DATE NOT NULL,
+    PRIMARY KEY (id, match_date),
+    FOREIGN KEY (match_id, match_date) REFERENCES matches(id, match_date)
+) PARTITION BY RANGE (match_date);
+ALTER SEQUENCE injuries_id_seq OWNED BY injuries.id;
+
+-- Substitutions
+CREATE TABLE substitutions (
+    id BIGINT NOT NULL DEFAULT nextval('substitutions_id_seq'),
+    match_id BIGINT NOT NULL,
+    club_id BIGINT NOT NULL REFERENCES clubs(id),
+    player_out_id BIGINT NOT NULL REFERENCES players(id),
+    player_in_id BIGINT NOT NULL REFERENCES players(id),
+    substitution_mn SMALLINT NOT NULL CHECK (substitution_mn BETWEEN 0 AND 120),
+    match_date DATE NOT NULL,
+    PRIMARY KEY (id, match_date),
+    FOREIGN KEY (match_id, match_date) REFERENCES matches(id, match_date)
+) PARTITION BY RANGE (match_date);
+ALTER SEQUENCE substitutions_id_seq OWNED BY substitutions.id;
+
+-- Partitions for the data already loaded, plus the current and the next season.
+-- Later seasons are created by ensure_season_partitions(): the seeder and the
+-- query simulator's match writer call it for the dates they insert, and the
+-- postgres-backup container runs backup/scripts/partitions.sh on a schedule
+-- (PARTITION_INTERVAL_CRON) to keep the next season ready for everyone else.
+SELECT ensure_season_partitions(
+    LEAST(COALESCE(MIN(match_date), CURRENT_DATE), CURRENT_DATE),
+    GREATEST(COALESCE(MAX(match_date), CURRENT_DATE), (CURRENT_DATE + INTERVAL '1 year')::DATE)
+) FROM matches_legacy;
+
+INSERT INTO matches SELECT * FROM matches_legacy;
+
+INSERT INTO club_match_stats
+SELECT cms.*, m.match_date FROM club_match_stats_legacy cms JOIN matches_legacy m ON cms.match_id = m.id;
+
+INSERT INTO starting_lineups
+SELECT sl.*, m.match_date FROM starting_lineups_legacy sl JOIN matches_legacy m ON sl.match_id = m.id;
+
+INSERT INTO goals
+SELECT g.*, m.match_date FROM goals_legacy g JOIN matches_legacy m ON g.match_id = m.id;
+
+INSERT INTO assists
+SELECT a.*, m.match_date FROM assists_legacy a JOIN matches_legacy m ON a.match_id = m.id;
+
+INSERT INTO clean_sheets
+SELECT cs.*, m.match_date FROM clean_sheets_legacy cs JOIN matches_legacy m ON cs.match_id = m.id;
+
+INSERT INTO fouls
+SELECT f.*, m.match_date FROM fouls_legacy f JOIN matches_legacy m ON f.match_id = m.id;
+
+INSERT INTO injuries
+SELECT i.*, m.match_date FROM injuries_legacy i JOIN matches_legacy m ON i.match_id = m.id;
+
+INSERT INTO substitutions
+SELECT s.*, m.match_date FROM substitutions_legacy s JOIN matches_legacy m ON s.match_id = m.id;
+
+DROP TABLE substitutions_legacy;
+DROP TABLE injuries_legacy;
+DROP TABLE fouls_legacy;
+DROP TABLE clean_sheets_legacy;
+DROP TABLE assists_legacy;
+DROP TABLE goals_legacy;
+DROP TABLE starting_lineups_legacy;
+DROP TABLE club_match_stats_legacy;
+DROP TABLE matches_legacy;
+
+-- Indexes carried over from the plain tables, now partitioned
+DO $$
+DECLARE
+    definition TEXT;
+BEGIN
+    FOR definition IN SELECT indexdef FROM season_table_indexes ORDER BY indexname LOOP
+        EXECUTE regexp_replace(definition, '^CREATE (UNIQUE )?INDEX ', 'CREATE \1INDEX IF NOT EXISTS ');
+    END LOOP;
+END;
+$$;
+DROP TABLE season_table_indexes;
+
+-- Deletes from matches and the summary triggers look up events by match_id;
+-- index it where no carried-over index already starts with it
+DO $$
+DECLARE
+    child_table TEXT;
+BEGIN
+    FOREACH child_table IN ARRAY (season_partitioned_tables())[2:] LOOP
+        IF NOT EXISTS (
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = child_table::regclass AND a.attname = 'match_id'
+        ) THEN
+            EXECUTE format('CREATE INDEX %I ON %I(match_id)', 'idx_' || child_table || '_match_fk', child_table);
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- Summary sources and triggers from V5, bound to the partitioned tables
+CREATE OR REPLACE VIEW player_match_summary_source AS
+SELECT player_id
+    , match_id
+    , club_id
+    , SUM(goals)::INTEGER AS goals
+    , SUM(assists)::INTEGER AS assists
+    , SUM(fouls)::INTEGER AS fouls
+    , SUM(injuries)::INTEGER AS injuries
+    , SUM(clean_sheets)::INTEGER AS clean_sheets
+FROM (
+    SELECT scorer_id AS player_id, match_id, club_id, 1 AS goals, 0 AS assists, 0 AS fouls, 0 AS injuries, 0 AS clean_sheets
+    FROM goals
+    UNION ALL
+    SELECT a.assistant_id, a.match_id, g.club_id, 0, 1, 0, 0, 0
+    FROM assists a
+    JOIN goals g ON a.goal_id = g.goal_id AND a.match_date = g.match_date
+    UNION ALL
+    SELECT player_id, match_id, club_id, 0, 0, 1, 0, 0 FROM fouls
+    UNION ALL
+    SELECT player_id, match_id, club_id, 0, 0, 0, 1, 0 FROM injuries
+    UNION ALL
+    SELECT player_id, match_id, club_id, 0, 0, 0, 0, 1 FROM clean_sheets
+) events
+GROUP BY player_id, match_id, club_id;
+
+CREATE OR REPLACE VIEW club_match_summary_source AS
+SELECT cms.match_id
+    , cms.club_id
+    , cms.club_id = m.club1_id AS is_home
+    , cms.possession
+    , cms.pass_accuracy
+    , (SELECT COUNT(*) FROM goals g WHERE g.match_id = cms.match_id AND g.club_id = cms.club_id)::INTEGER AS goals
+    , (SELECT COUNT(*) FROM fouls f WHERE f.match_id = cms.match_id AND f.club_id = cms.club_id)::INTEGER AS fouls
+FROM club_match_stats cms
+JOIN matches m ON cms.match_id = m.id AND cms.match_date = m.match_date;
+
+DO $$
+DECLARE
+    source_table TEXT;
+BEGIN
+    FOREACH source_table IN ARRAY ARRAY['club_match_stats', 'goals', 'assists', 'fouls', 'injuries', 'clean_sheets'] LOOP
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_insert', source_table);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_delete', source_table);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_update_old', source_table);
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries()', source_table || '_summary_update_new', source_table);
+    END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER matches_summary_update AFTER UPDATE ON matches
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION sync_match_summaries_clubs();
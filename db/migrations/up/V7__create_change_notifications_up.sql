@@ -0,0 +1,29 @@
+-- V7__create_change_notifications_up.sql
+
+-- Announce which table a committed statement changed, for application-side caches.
+-- NOTIFY is delivered on commit and duplicate payloads within a transaction are
+-- folded into one, so a bulk load sends a single message per table
+CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('table_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level triggers on partitioned tables fire for the parent named in the
+-- statement, so payloads carry e.g. "goals" rather than "goals_2024_25"
+DO $$
+DECLARE
+    source_table TEXT;
+BEGIN
+    FOREACH source_table IN ARRAY ARRAY[
+        'clubs', 'stadiums', 'players', 'managers', 'referees', 'tournaments', 'contracts', 'transfers',
+        'personal_awards', 'league_statistics', 'cup_statistics', 'matches', 'club_match_stats',
+        'starting_lineups', 'goals', 'assists', 'clean_sheets', 'fouls', 'injuries', 'substitutions',
+        'player_match_summary', 'club_match_summary'
+    ] LOOP
+        EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()', source_table || '_notify_change', source_table);
+    END LOOP;
+END;
+$$;
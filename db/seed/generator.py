@@ -0,0 +1,96 @@
+from datetime import date, timedelta
+import numpy as np
+
+
+class BulkGenerator:
+    """Column-oriented row generator for tables seeded without a custom handler.
+
+    Every column is produced for a whole batch at once: numeric, boolean, date
+    and enum columns come straight from NumPy, while Faker-backed text columns
+    are drawn from pools sampled once per run.
+    """
+
+    def __init__(self, fake, rng, pool_size=2000, batch_size=50000, today=None):
+        self.fake = fake
+        self.rng = rng
+        self.today = today or date.today()
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.pools = {}
+
+    def pool(self, name, factory):
+        if name not in self.pools:
+            self.pools[name] = np.array([factory() for _ in range(self.pool_size)], dtype=object)
+        return self.pools[name]
+
+    def choice(self, name, factory, n):
+        return self.rng.choice(self.pool(name, factory), n)
+
+    def integers(self, low, high, n):
+        # Inclusive bounds, like Faker.random_int
+        return self.rng.integers(low, high + 1, n)
+
+    def dates(self, start, end, n):
+        offsets = self.rng.integers(0, (end - start).days + 1, n)
+        return np.datetime64(start) + offsets.astype('timedelta64[D]')
+
+    def decimals(self, left_digits, right_digits, n):
+        scale = 10 ** right_digits
+        return self.rng.integers(1, 10 ** left_digits * scale, n) / scale
+
+    def booleans(self, n):
+        return self.rng.random(n) < 0.5
+
+    def _country(self):
+        country = self.fake.country()
+        return country if len(country) <= 50 else self._country()
+
+    def column(self, col, dtype, n, enum_values=None):
+        today = self.today
+        if col == 'name':
+            return self.choice('first_name', self.fake.first_name, n)
+        if col == 'surname':
+            return self.choice('last_name', self.fake.last_name, n)
+        if col in ('nationality', 'country'):
+            return self.choice('country', self._country, n)
+        if col == 'birth_date':
+            return self.dates(today - timedelta(days=50 * 365), today - timedelta(days=20 * 365), n)
+        if col == 'height_sm':
+            return self.integers(150, 210, n)
+        if col == 'weight_kg':
+            return self.integers(50, 150, n)
+        if col in ('is_right_footed', 'has_fifa_license'):
+            return self.booleans(n)
+        if col == 'city':
+            return self.choice('city', self.fake.city, n)
+        if col == 'capacity':
+            return self.integers(5000, 300000, n)
+        if col == 'opened_year':
+            return self.integers(1800, 2025, n)
+        if col == 'prize_pool_usd':
+            return self.decimals(8, 2, n)
+        if col == 'official_website_url':
+            return self.choice('url', self.fake.url, n)
+        if enum_values:
+            return self.rng.choice(np.array(enum_values, dtype=object), n)
+        if 'int' in dtype:
+            return self.integers(1, 1000, n)
+        if 'date' in dtype:
+            decade_start = date(today.year - today.year % 10, 1, 1)
+            return self.dates(decade_start, today, n)
+        if 'varchar' in dtype or 'text' in dtype or 'character' in dtype:
+            return self.choice('text', lambda: self.fake.text(50)[:50], n)
+        return np.full(n, None, dtype=object)
+
+    def rows(self, columns, count, enum_values=None):
+        """Yield row tuples for `columns` ([(name, data_type), ...]) in batches."""
+        enum_values = enum_values or {}
+        produced = 0
+        while produced < count:
+            n = min(self.batch_size, count - produced)
+            batch = [
+                self.column(col, dtype, n, enum_values.get(col)).tolist()
+                for col, dtype in columns
+            ]
+            yield from zip(*batch)
+            produced += n
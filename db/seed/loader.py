@@ -0,0 +1,212 @@
+import io
+import struct
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from contextlib import contextmanager
+
+PG_EPOCH = date(2000, 1, 1)
+BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+BINARY_TRAILER = struct.pack('>h', -1)
+TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def encode_text_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).translate(TEXT_ESCAPES)
+
+
+def encode_text_row(row):
+    return ('\t'.join(encode_text_value(value) for value in row) + '\n').encode()
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def encode_numeric(value):
+    """Encode a number in PostgreSQL's binary NUMERIC format (base-10000 digits)."""
+    d = Decimal(str(value))
+    sign = 0x4000 if d < 0 else 0x0000
+    d = abs(d)
+    dscale = max(0, -d.as_tuple().exponent)
+    int_part, _, frac_part = format(d, 'f').partition('.')
+    int_part = int_part.lstrip('0')
+    int_part = int_part.zfill((len(int_part) + 3) // 4 * 4)
+    frac_part += '0' * (-len(frac_part) % 4)
+    digits = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    digits += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+    weight = len(int_part) // 4 - 1
+    while digits and digits[0] == 0:
+        digits.pop(0)
+        weight -= 1
+    while digits and digits[-1] == 0:
+        digits.pop()
+    if not digits:
+        weight = 0
+    return struct.pack(f'>hhHH{len(digits)}h', len(digits), weight, sign, dscale, *digits)
+
+
+BINARY_ENCODERS = {
+    'int2': lambda v: struct.pack('>h', int(v)),
+    'int4': lambda v: struct.pack('>i', int(v)),
+    'int8': lambda v: struct.pack('>q', int(v)),
+    'float4': lambda v: struct.pack('>f', float(v)),
+    'float8': lambda v: struct.pack('>d', float(v)),
+    'bool': lambda v: b'\x01' if v else b'\x00',
+    'date': lambda v: struct.pack('>i', (_as_date(v) - PG_EPOCH).days),
+    'numeric': encode_numeric,
+}
+
+
+def text_encoder(value):
+    # text, varchar and enum columns all accept UTF-8 bytes on binary input
+    return str(value).encode()
+
+
+class RowStream(io.RawIOBase):
+    """File-like adapter feeding encoded rows to copy_expert.
+
+    At most one read request worth of rows (plus one row) is buffered, so the
+    whole table never has to exist in memory.
+    """
+
+    def __init__(self, rows, encode_row, header=b'', trailer=b''):
+        self.rows = iter(rows)
+        self.encode_row = encode_row
+        self.buffer = bytearray(header)
+        self.trailer = trailer
+        self.count = 0
+        self.exhausted = False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = 1 << 16
+        while len(self.buffer) < size and not self.exhausted:
+            row = next(self.rows, None)
+            if row is None:
+                self.exhausted = True
+                self.buffer += self.trailer
+                break
+            self.buffer += self.encode_row(row)
+            self.count += 1
+        chunk = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+class CopyLoader:
+    """Streams rows into a table with COPY ... FROM STDIN.
+
+    `fmt` is 'text' or 'binary'. With `commit_rows` > 0 every that many rows
+    are copied and committed separately, otherwise the table loads in one
+    transaction.
+    """
+
+    def __init__(self, conn, fmt='text', commit_rows=0, buffer_size=1 << 20):
+        if fmt not in ('text', 'binary'):
+            raise ValueError(f"Unknown COPY format: {fmt}")
+        self.conn = conn
+        self.fmt = fmt
+        self.commit_rows = commit_rows
+        self.buffer_size = buffer_size
+
+    def column_types(self, table, columns):
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT a.attname, CASE WHEN t.typtype = 'e' THEN 'text' ELSE t.typname END
+                FROM pg_attribute a
+                JOIN pg_type t ON t.oid = a.atttypid
+                WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+            """, (table,))
+            types = dict(cur.fetchall())
+        return [types[col] for col in columns]
+
+    def binary_row_encoder(self, table, columns):
+        encoders = [BINARY_ENCODERS.get(typ, text_encoder) for typ in self.column_types(table, columns)]
+        field_count = struct.pack('>h', len(columns))
+
+        def encode_row(row):
+            parts = [field_count]
+            for encode, value in zip(encoders, row):
+                if value is None:
+                    parts.append(b'\xff\xff\xff\xff')
+                else:
+                    data = encode(value)
+                    parts.append(struct.pack('>i', len(data)))
+                    parts.append(data)
+            return b''.join(parts)
+
+        return encode_row
+
+    def copy_chunk(self, table, columns, rows):
+        column_list = ', '.join(columns)
+        if self.fmt == 'binary':
+            stream = RowStream(rows, self.binary_row_encoder(table, columns), BINARY_HEADER, BINARY_TRAILER)
+            sql = f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT binary)"
+        else:
+            stream = RowStream(rows, encode_text_row)
+            sql = f"COPY {table} ({column_list}) FROM STDIN"
+        with self.conn.cursor() as cur:
+            cur.copy_expert(sql, stream, size=self.buffer_size)
+        return stream.count
+
+    def load(self, table, columns, rows):
+        rows = iter(rows)
+        total = 0
+        try:
+            while True:
+                chunk = islice(rows, self.commit_rows) if self.commit_rows else rows
+                copied = self.copy_chunk(table, columns, chunk)
+                self.conn.commit()
+                total += copied
+                if not self.commit_rows or copied < self.commit_rows:
+                    return total
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    @contextmanager
+    def deferred_constraints(self, table):
+        """Drop secondary indexes and foreign keys of `table`, restore them on exit."""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+                FROM pg_index i
+                WHERE i.indrelid = %s::regclass
+                  AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+            """, (table,))
+            indexes = cur.fetchall()
+            cur.execute("""
+                SELECT conname, pg_get_constraintdef(oid)
+                FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype = 'f' AND conparentid = 0
+            """, (table,))
+            foreign_keys = cur.fetchall()
+            for name, _ in foreign_keys:
+                cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+            for name, _ in indexes:
+                cur.execute(f"DROP INDEX {name}")
+        self.conn.commit()
+        try:
+            yield
+        finally:
+            self.conn.rollback()
+            with self.conn.cursor() as cur:
+                for _, definition in indexes:
+                    # Indexes of partitioned tables come back as "ON ONLY", which would skip the partitions
+                    cur.execute(definition.replace(" ON ONLY ", " ON ", 1))
+                for name, definition in foreign_keys:
+                    cur.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+            self.conn.commit()
@@ -0,0 +1,140 @@
+import math
+import multiprocessing
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+_seeder = None
+
+
+def _init_worker(lineup_seed):
+    global _seeder
+    from seed import DatabaseSeeder
+    _seeder = DatabaseSeeder()
+    _seeder.lineup_seed = lineup_seed
+    # Dropping foreign keys locks the referenced tables too; concurrent drops
+    # deadlock, so the coordinating process handles deferral for everyone
+    _seeder.defer_constraints = False
+
+
+def _run_task(table, shard):
+    # An index built by a previous task may only cover that task's shard
+    _seeder.index.clear()
+    _seeder.run_task(table, shard)
+    return table, shard
+
+
+class ParallelSeeder:
+    """Seeds tables concurrently on a process pool, one connection per process.
+
+    A table is submitted as soon as every table it depends on (foreign keys
+    from the catalog plus DatabaseSeeder.DATA_DEPENDENCIES) is done. Large
+    plain tables are split into id ranges and match-based handlers into
+    match id ranges, each shard running as its own task.
+    """
+
+    def __init__(self, seeder):
+        self.seeder = seeder
+        self.workers = seeder.workers
+        self.shard_rows = seeder.shard_rows
+        self.tables = list(seeder.INDEPENDENT_TABLES) + list(seeder.seeding_handlers())
+
+    def dependency_graph(self):
+        deps = {table: set() for table in self.tables}
+        for child, parent in self.seeder.execute_query("""
+            SELECT conrelid::regclass::text, confrelid::regclass::text
+            FROM pg_constraint
+            WHERE contype = 'f' AND connamespace = 'public'::regnamespace
+        """):
+            if child in deps and parent in deps and child != parent:
+                deps[child].add(parent)
+        for table, extra in self.seeder.DATA_DEPENDENCIES.items():
+            if table in deps:
+                deps[table] |= extra & deps.keys()
+        return deps
+
+    def split(self, first, last, count):
+        """Split [first, last] into at most `workers` contiguous ranges."""
+        shards = min(self.workers, max(1, math.ceil(count / self.shard_rows)))
+        step = math.ceil((last - first + 1) / shards)
+        if self.seeder.random_seed is not None:
+            # Seeded tables are generated in blocks of shard_rows ids; keep shards aligned to them
+            step = math.ceil(step / self.shard_rows) * self.shard_rows
+        return [(lo, min(lo + step - 1, last)) for lo in range(first, last + 1, step)]
+
+    def shards(self, table):
+        if table in self.seeder.INDEPENDENT_TABLES:
+            count = self.seeder.table_count(table)
+            if count < self.shard_rows:
+                return [None]
+            return self.split(1, count, count)
+        # Concurrent shards interleave BIGSERIAL ids, which would make a
+        # seeded dataset differ between runs
+        if table in self.seeder.SHARDED_HANDLERS and self.seeder.random_seed is None:
+            first, last, count = self.seeder.execute_query("SELECT MIN(id), MAX(id), COUNT(*) FROM matches")[0]
+            # Every match fans out into dozens of event rows
+            if not count or count * 22 < self.shard_rows:
+                return [None]
+            return self.split(first, last, count * 22)
+        return [None]
+
+    def run(self):
+        deps = self.dependency_graph()
+        done = set()
+        for table in self.tables:
+            if not self.seeder.table_exists_and_empty(table):
+                print(f"Skipped seeding {table} table")
+                done.add(table)
+        pending = {table: deps[table] for table in self.tables if table not in done}
+
+        deferred = {}
+        context = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                     initializer=_init_worker, initargs=(self.seeder.lineup_seed,)) as pool:
+                try:
+                    self.schedule(pool, deps, pending, done, deferred)
+                except BaseException:
+                    # Let the shards already running finish before their constraints come back
+                    pool.shutdown(cancel_futures=True)
+                    raise
+        finally:
+            # Left over only when a shard failed: tables that were still loading
+            # would otherwise stay without their foreign keys and indexes
+            for table, stack in deferred.items():
+                try:
+                    stack.close()
+                except Exception as e:
+                    print(f"Could not restore constraints of {table}: {e}")
+
+    def schedule(self, pool, deps, pending, done, deferred):
+        remaining = {}
+        sharded = set()
+        running = {}
+        while pending or running:
+            for table in [t for t, d in pending.items() if d <= done]:
+                del pending[table]
+                shards = self.shards(table)
+                remaining[table] = len(shards)
+                if len(shards) > 1:
+                    sharded.add(table)
+                    print(f"Seeding {table} in {len(shards)} shards")
+                if self.seeder.defer_constraints:
+                    deferred[table] = ExitStack()
+                    deferred[table].enter_context(self.seeder.loader.deferred_constraints(table))
+                for shard in shards:
+                    running[pool.submit(_run_task, table, shard)] = table
+
+            if not running:
+                raise RuntimeError(f"Circular seeding dependencies: {sorted(pending)}")
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table = running.pop(future)
+                future.result()
+                remaining[table] -= 1
+                if remaining[table] == 0:
+                    if table in deferred:
+                        deferred.pop(table).close()
+                    if table in self.seeder.INDEPENDENT_TABLES and table in sharded:
+                        self.seeder.sync_sequence(table)
+                    done.add(table)
@@ -1,15 +1,114 @@
 import os
+import zlib
+import random
+from contextlib import nullcontext
+from itertools import islice
+from datetime import date, timedelta
 import psycopg2
-from psycopg2 import extras
+import numpy as np
 from faker import Faker
 from dotenv import load_dotenv
+from generator import BulkGenerator
+from loader import CopyLoader
+
+CUP_STAGES = ["1/32", "1/16", "1/8", "1/4", "1/2", "final"]
+
+# Season of m.match_date as "2024/2025"; a season is 365 days and the latest ends on the reference date
+SEASON_LABEL_SQL = """(
+    (%(reference_year)s - GREATEST(0, (%(reference_date)s::DATE - m.match_date) / 365) - 1)::TEXT || '/' ||
+    (%(reference_year)s - GREATEST(0, (%(reference_date)s::DATE - m.match_date) / 365))::TEXT
+)"""
+
+
+def sql_randint(low, high):
+    """SQL for a uniform integer in [low, high] like Faker's random_int; bounds may be column expressions."""
+    return f"(({low}) + floor(random() * (({high}) - ({low}) + 1)))::INTEGER"
+
+
+def lineup_player_sql(*positions):
+    """Per club, the first player of its lineup (see _club_lineups) playing one of `positions`."""
+    position_list = ", ".join(f"'{position}'" for position in positions)
+    return f"""
+        SELECT DISTINCT ON (club_id) club_id, player_id
+        FROM (
+            SELECT DISTINCT ON (club_id, player_id) club_id, player_id, position, id
+            FROM starting_lineups
+            ORDER BY club_id, player_id, id
+        ) l
+        WHERE position IN ({position_list})
+        ORDER BY club_id, id
+    """
 
 class DatabaseSeeder:
+    # Tables seeded by BulkGenerator, with their size relative to SEED_COUNT
+    INDEPENDENT_TABLES = {"stadiums": 1, "managers": 1, "tournaments": 1, "referees": 1, "players": 11}
+
+    # Rows per unit of SEED_SCALE_FACTOR
+    CARDINALITY_RATIOS = {
+        "stadiums": 250, "managers": 250, "tournaments": 20, "referees": 100, "players": 5000,
+        "clubs": 200, "matches": 10000, "personal_awards": 500, "transfers": 1000
+    }
+
+    # Handlers that accept a match id range and can be split into shards
+    SHARDED_HANDLERS = {
+        "club_match_stats", "starting_lineups", "goals", "assists", "clean_sheets",
+        "fouls", "injuries", "substitutions"
+    }
+
+    # Handlers read these tables even though no foreign key points at them
+    DATA_DEPENDENCIES = {
+        "goals": {"starting_lineups"},
+        "assists": {"starting_lineups"},
+        "clean_sheets": {"starting_lineups"},
+        "fouls": {"club_match_stats", "starting_lineups"},
+        "injuries": {"club_match_stats", "starting_lineups"},
+        "substitutions": {"club_match_stats", "starting_lineups"},
+        "league_statistics": {"matches"},
+        "cup_statistics": {"matches"},
+    }
+
+    # Tables grown by SEED_MODE=append, in load order
+    APPEND_TABLES = [
+        "matches", "club_match_stats", "starting_lineups", "goals", "assists", "clean_sheets",
+        "fouls", "injuries", "substitutions", "league_statistics", "cup_statistics", "transfers"
+    ]
+
     def __init__(self):
         load_dotenv()
         self.fake = Faker()
         self.seed_count = int(os.getenv("SEED_COUNT", 100))
+        self.scale_factor = float(os.getenv("SEED_SCALE_FACTOR", 0))
+        # A scale factor implies a reproducible dataset unless a seed is given explicitly
+        random_seed = os.getenv("SEED_RANDOM_SEED") or ("0" if self.scale_factor else None)
+        self.random_seed = int(random_seed) if random_seed is not None else None
+        reference_date = os.getenv("SEED_REFERENCE_DATE") or ("2025-06-30" if self.random_seed is not None else None)
+        self.reference_date = date.fromisoformat(reference_date) if reference_date else date.today()
+        self.seasons = int(os.getenv("SEED_SEASONS", 1))
+        self.season_growth = float(os.getenv("SEED_SEASON_GROWTH", 1))
+        self.scorer_skew = float(os.getenv("SEED_SCORER_SKEW", 0))
+        self.hot_club_share = float(os.getenv("SEED_HOT_CLUBS", 0))
+        self.hot_club_weight = float(os.getenv("SEED_HOT_CLUB_WEIGHT", 5))
+        self.mode = os.getenv("SEED_MODE", "fresh")
+        if self.mode not in ("fresh", "append"):
+            raise ValueError(f"Unknown SEED_MODE: {self.mode}")
+        self.append_seasons = int(os.getenv("SEED_APPEND_SEASONS", 1))
+        self.rng = np.random.default_rng()
+        self.generator = BulkGenerator(self.fake, self.rng, today=self.reference_date)
+        self._columns_cache = {}
+        self._enum_cache = {}
+        self._enum_types_cache = None
+        self.index = {}
+        # Lineups are drawn per club from this seed so that shards agree on them
+        self.lineup_seed = self.derive_seed("lineups") if self.random_seed is not None else random.getrandbits(32)
+        self.workers = int(os.getenv("SEED_WORKERS", 1))
+        self.shard_rows = int(os.getenv("SEED_SHARD_ROWS", 100000))
+        self.defer_constraints = os.getenv("SEED_DEFER_CONSTRAINTS", "false").lower() == "true"
         self.conn = psycopg2.connect(**self.get_db_config())
+        self.loader = CopyLoader(
+            self.conn,
+            fmt=os.getenv("SEED_COPY_FORMAT", "text"),
+            commit_rows=int(os.getenv("SEED_COMMIT_ROWS", 0))
+        )
         
     def get_db_config(self):
         return {
@@ -18,6 +117,8 @@ class DatabaseSeeder:
             "database": os.getenv("DB_NAME"),
             "user": os.getenv("DB_ADMIN_USER"),
             "password": os.getenv("DB_ADMIN_PASSWORD"),
+            # Summary triggers (V5) stay idle during the load; refresh_match_summaries() catches up
+            "options": "-c match_summaries.defer_refresh=on",
         }
 
     def execute_query(self, query, params=None):
@@ -25,11 +126,82 @@ class DatabaseSeeder:
             cur.execute(query, params or ())
             return cur.fetchall()
 
+    def derive_seed(self, *key):
+        return zlib.crc32(":".join(str(part) for part in (self.random_seed,) + key).encode())
+
+    def reseed(self, *key):
+        """Restart every random source from a seed derived from `key`.
+
+        Each table (and shard) gets its own stream, so the data does not depend
+        on the order in which tables run or on how many workers there are.
+        """
+        if self.random_seed is None:
+            return
+        seed = self.derive_seed(*key)
+        self.fake.seed_instance(seed)
+        self.rng = np.random.default_rng(seed)
+        self.generator.rng = self.rng
+        self.generator.pools.clear()
+
+    def table_count(self, table):
+        if self.scale_factor:
+            return max(1, round(self.CARDINALITY_RATIOS[table] * self.scale_factor))
+        return self.seed_count * self.INDEPENDENT_TABLES.get(table, 1)
+
+    def _season_bounds(self, season):
+        """First and last day of a season; season 0 ends on the reference date."""
+        end = self.reference_date - timedelta(days=365 * season)
+        return end - timedelta(days=364), end
+
+    def _season_params(self):
+        """Parameters of SEASON_LABEL_SQL."""
+        return {"reference_date": self.reference_date, "reference_year": self.reference_date.year}
+
+    def _club_results_sql(self, condition, match_range):
+        """Per club, tournament and season: matches, results, goals and clean sheets of the matching matches.
+
+        `first_seen` orders clubs by their first appearance, home side first.
+        """
+        return f"""
+            SELECT m.tournament_id, {SEASON_LABEL_SQL} AS season, side.club_id,
+                   COUNT(*) AS matches_played,
+                   COUNT(*) FILTER (WHERE side.scored > side.conceded) AS wins,
+                   COUNT(*) FILTER (WHERE side.scored = side.conceded) AS draws,
+                   COUNT(*) FILTER (WHERE side.scored < side.conceded) AS losses,
+                   SUM(side.scored) AS goals_scored,
+                   SUM(side.conceded) AS goals_conceded,
+                   COUNT(*) FILTER (WHERE side.conceded = 0) AS clean_sheets,
+                   SUM(CASE WHEN side.scored > side.conceded THEN 3
+                            WHEN side.scored = side.conceded THEN 1 ELSE 0 END) AS points,
+                   MIN(m.id * 2 + side.side) AS first_seen
+            FROM matches m
+            CROSS JOIN LATERAL (VALUES (m.club1_id, m.club1_score, m.club2_score, 0),
+                                       (m.club2_id, m.club2_score, m.club1_score, 1))
+                AS side(club_id, scored, conceded, side)
+            WHERE {condition}{self._match_filter("m.id", match_range, prefix="AND")}
+            GROUP BY 1, 2, 3
+        """
+
+    def _append_count(self, table):
+        """Rows for the appended seasons, continuing the per-season size and growth."""
+        per_season = self.table_count(table) / self.seasons
+        return round(per_season * sum(self.season_growth ** i for i in range(1, self.append_seasons + 1)))
+
+    def _club_weights(self, club_ids):
+        """Selection weights making the first SEED_HOT_CLUBS share of clubs "hot"."""
+        hot = round(len(club_ids) * self.hot_club_share)
+        return [self.hot_club_weight if i < hot else 1 for i in range(len(club_ids))]
+
     def table_exists_and_empty(self, table):
         result = self.execute_query(f"SELECT COUNT(*) FROM {table}")
         return result[0][0] == 0
 
     def get_table_columns(self, table_name):
+        if table_name not in self._columns_cache:
+            self._columns_cache[table_name] = self._fetch_table_columns(table_name)
+        return self._columns_cache[table_name]
+
+    def _fetch_table_columns(self, table_name):
         return self.execute_query("""
             SELECT c.column_name,
                 CASE WHEN pg_type.typtype = 'e' THEN pg_type.typname 
@@ -41,6 +213,17 @@ class DatabaseSeeder:
         """, (table_name,))
     
     def _get_enum_values(self, enum_name):
+        if enum_name not in self._enum_cache:
+            self._enum_cache[enum_name] = self._fetch_enum_values(enum_name)
+        return self._enum_cache[enum_name]
+
+    def _enum_types(self):
+        if self._enum_types_cache is None:
+            rows = self.execute_query("SELECT typname FROM pg_type WHERE typtype = 'e'")
+            self._enum_types_cache = {row[0] for row in rows}
+        return self._enum_types_cache
+
+    def _fetch_enum_values(self, enum_name):
         try:
             query = """
                 SELECT e.enumlabel 
@@ -61,79 +244,235 @@ class DatabaseSeeder:
             print(f"Error getting ENUM values for '{enum_name}': {e}")
             return []
 
-    def insert_data(self, query, data, table_name):
+    def insert_data(self, table_name, columns, rows):
+        if self._has_column(table_name, 'match_date') and 'match_date' not in columns and 'match_id' in columns:
+            # V6 partitions per-match tables by match_date; handlers only know the match.
+            # Dates are resolved before COPY starts, no other query may run while it streams
+            match_dates = self._match_dates()
+            position = columns.index('match_id')
+            rows = (list(row) + [match_dates[row[position]]] for row in rows)
+            columns = list(columns) + ['match_date']
+        try:
+            if self.defer_constraints:
+                with self.loader.deferred_constraints(table_name):
+                    count = self.loader.load(table_name, columns, rows)
+            else:
+                count = self.loader.load(table_name, columns, rows)
+            print(f"Inserted {count} rows into {table_name}")
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error inserting into {table_name}: {str(e)}")
+
+    def insert_select(self, table_name, columns, query, params=None, seed_key=(), prepare=()):
+        """Fill a table with INSERT ... SELECT, for data derived from rows already in the database.
+
+        `query` yields `columns` plus match_date, which is kept only where V6
+        added it. The `prepare` statements run first in the same transaction.
+        """
+        columns = list(columns)
+        if self._has_column(table_name, 'match_date'):
+            columns.append('match_date')
+        column_list = ', '.join(columns)
         try:
-            with self.conn.cursor() as cursor:
-                extras.execute_values(cursor, query, data, page_size=1000)
+            with self.loader.deferred_constraints(table_name) if self.defer_constraints else nullcontext():
+                with self.conn.cursor() as cur:
+                    self._server_seed(cur, *seed_key)
+                    for statement in prepare:
+                        cur.execute(statement, params or {})
+                    cur.execute(
+                        f"INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM ({query}) derived",
+                        params or {}
+                    )
+                    count = cur.rowcount
                 self.conn.commit()
-                print(f"Inserted {len(data)} rows into {table_name}")
+            print(f"Inserted {count} rows into {table_name}")
         except Exception as e:
             self.conn.rollback()
             print(f"Error inserting into {table_name}: {str(e)}")
 
-    def generate_row_data(self, table):
-        column_handlers = {
-            'name': lambda: self.fake.first_name(),
-            'surname': lambda: self.fake.last_name(),
-            'nationality': self._generate_country,
-            'country': self._generate_country,
-            'birth_date': lambda: self.fake.date_of_birth(minimum_age=20, maximum_age=50).isoformat(),
-            'height_sm': lambda: self.fake.random_int(150, 210),
-            'weight_kg': lambda: self.fake.random_int(50, 150),
-            'is_right_footed': lambda: self.fake.boolean(),
-            'has_fifa_license': lambda: self.fake.boolean(),
-            'city': lambda: self.fake.city(),
-            'capacity': lambda: self.fake.random_int(5000, 300000),
-            'opened_year': lambda: self.fake.random_int(1800, 2025),
-            'prize_pool_usd': self._generate_decimal,
-            'official_website_url': lambda: self.fake.url(),
-            'surface_type': lambda: self.fake.random_element(self._get_enum_values("surface_type"))
-        }
-        
-        row = {}
-        for col, dtype in self.get_table_columns(table):
-            if col == 'id': continue
-            
-            if col in column_handlers:
-                row[col] = column_handlers[col]()
-            elif 'int' in dtype:
-                row[col] = self.fake.random_int(1, 1000)
-            elif 'date' in dtype:
-                row[col] = self.fake.date_this_decade().isoformat()
-            elif 'varchar' in dtype or 'text' in dtype:
-                row[col] = self.fake.text(50)[:50]
-            else:
-                row[col] = None
-                
-        return row
+    def _server_seed(self, cur, *key):
+        """Seed random() of the session, so data generated by the server is reproducible too."""
+        if self.random_seed is not None:
+            cur.execute("SELECT setseed(%s)", (self.derive_seed(*key) / 0xFFFFFFFF * 2 - 1,))
 
-    def _generate_country(self):
-        country = self.fake.country()
-        return country if len(country) <= 50 else self._generate_country()
+    def _has_column(self, table_name, column):
+        return any(col == column for col, _ in self.get_table_columns(table_name))
+
+    def _match_dates(self):
+        if 'match_dates' not in self.index:
+            self.index['match_dates'] = dict(self.execute_query("SELECT id, match_date FROM matches"))
+        return self.index['match_dates']
+
+    def ensure_season_partitions(self, first_date, last_date):
+        """Create the V6 season partitions covering [first_date, last_date], if the schema is partitioned."""
+        if self.execute_query("SELECT to_regproc('ensure_season_partitions')")[0][0] is None:
+            return
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT ensure_season_partitions(%s, %s)", (first_date, last_date))
+        self.conn.commit()
+
+    def _players(self):
+        if 'players' not in self.index:
+            self.index['players'] = [row[0] for row in self.execute_query("SELECT id FROM players ORDER BY id")]
+        return self.index['players']
+
+    def _club_lineups(self):
+        """Lineup of every club as [(player_id, position), ...] in lineup order."""
+        if 'lineups' not in self.index:
+            lineups = {}
+            for club_id, player_id, position in self.execute_query("""
+                SELECT club_id, player_id, position FROM (
+                    SELECT DISTINCT ON (club_id, player_id) club_id, player_id, position, id
+                    FROM starting_lineups
+                    ORDER BY club_id, player_id, id
+                ) l
+                ORDER BY id
+            """):
+                lineups.setdefault(club_id, []).append((player_id, position))
+            self.index['lineups'] = lineups
+        return self.index['lineups']
+
+    def _lineup_players(self, club_id):
+        return [player_id for player_id, _ in self._club_lineups().get(club_id, [])]
+
+    def _lineup_player(self, club_id, positions):
+        for player_id, position in self._club_lineups().get(club_id, []):
+            if position in positions:
+                return player_id
+        return None
 
     def _generate_decimal(self):
         return round(float(self.fake.pydecimal(left_digits=8, right_digits=2, positive=True)), 2)
 
-    def seed_table(self, table, custom_handler=None, multiplier=1):
-        if not self.table_exists_and_empty(table):
+    def _match_filter(self, column, match_range, prefix="WHERE"):
+        if match_range is None:
+            return ""
+        return f" {prefix} {column} BETWEEN {int(match_range[0])} AND {int(match_range[1])}"
+
+    def seed_table(self, table, custom_handler=None, id_range=None):
+        if id_range is None and not self.table_exists_and_empty(table):
             print(f"Skipped seeding {table} table")
             return
 
         if custom_handler:
             custom_handler()
         else:
-            columns = [col for col, _ in self.get_table_columns(table) if col != 'id']
-            data = [tuple(self.generate_row_data(table).values()) for _ in range(self.seed_count * multiplier)]
-            query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
-            self.insert_data(query, data, table)
+            columns = [(col, dtype) for col, dtype in self.get_table_columns(table) if col != 'id']
+            enum_types = self._enum_types()
+            enum_values = {col: self._get_enum_values(dtype) for col, dtype in columns if dtype in enum_types}
+            names = [col for col, _ in columns]
+            if id_range is None and self.random_seed is None:
+                rows = self.generator.rows(columns, self.table_count(table), enum_values)
+            else:
+                # Shards carry explicit ids so they can be generated side by side
+                first_id, last_id = id_range or (1, self.table_count(table))
+                generated = self._generate_range(table, columns, first_id, last_id, enum_values)
+                rows = ((row_id,) + row for row_id, row in zip(range(first_id, last_id + 1), generated))
+                names = ['id'] + names
+            self.insert_data(table, names, rows)
+            if id_range is None and self.random_seed is not None:
+                self.sync_sequence(table)
+
+    def _generate_range(self, table, columns, first_id, last_id, enum_values):
+        if self.random_seed is None:
+            yield from self.generator.rows(columns, last_id - first_id + 1, enum_values)
+            return
+        # Seeded rows come in fixed blocks of SEED_SHARD_ROWS ids, each drawn from
+        # its own stream, so every way of sharding the table yields the same data
+        for block in range((first_id - 1) // self.shard_rows, (last_id - 1) // self.shard_rows + 1):
+            block_first = block * self.shard_rows + 1
+            block_last = min(block_first + self.shard_rows - 1, last_id)
+            self.reseed(table, block)
+            rows = self.generator.rows(columns, block_last - block_first + 1, enum_values)
+            yield from islice(rows, max(first_id, block_first) - block_first, None)
+
+    def sync_sequence(self, table):
+        with self.conn.cursor() as cur:
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}")
+        self.conn.commit()
+
+    def run_task(self, table, shard=None):
+        """Seed one table, or one shard of it, in the current process."""
+        self.reseed(table, shard)
+        if table in self.INDEPENDENT_TABLES:
+            self.seed_table(table, id_range=shard)
+        elif shard is not None:
+            self.seeding_handlers()[table](match_range=shard)
+        else:
+            self.seeding_handlers()[table]()
 
     def run_seeding(self):
-        independent_tables = ["stadiums", "managers", "tournaments", "referees", "players"]
-        for table in independent_tables:
-            multiplier = 11 if table == "players" else 1
-            self.seed_table(table, multiplier=multiplier)
+        if self.mode == "append":
+            self.run_append()
+            return
+
+        if self.workers > 1:
+            from parallel import ParallelSeeder
+            ParallelSeeder(self).run()
+        else:
+            for table in self.INDEPENDENT_TABLES:
+                if self.table_exists_and_empty(table):
+                    self.run_task(table)
+                else:
+                    print(f"Skipped seeding {table} table")
+
+            for table in self.seeding_handlers():
+                if self.table_exists_and_empty(table):
+                    self.run_task(table)
+
+        self.refresh_match_summaries()
 
-        seeding_handlers = {
+    def run_append(self):
+        """Add SEED_APPEND_SEASONS seasons of matches after the latest one, with everything derived from them."""
+        last_date, last_id = self.execute_query("SELECT MAX(match_date), COALESCE(MAX(id), 0) FROM matches")[0]
+        if last_date is None:
+            print("No matches to append to, run a fresh seed first")
+            return
+
+        match_count = self._append_count("matches")
+        transfer_count = self._append_count("transfers")
+        season_start = last_date + timedelta(days=1)
+        # The new seasons follow the last one, so their labels never collide with existing standings
+        self.reference_date = last_date + timedelta(days=365 * self.append_seasons)
+        self.generator.today = self.reference_date
+        self.seasons = self.append_seasons
+        # Clubs keep the lineups they already play with
+        self._club_lineups()
+
+        handlers = self.seeding_handlers()
+        for table in self.APPEND_TABLES:
+            self.reseed(table, "append", last_id)
+            if table == "matches":
+                self._seed_matches(count=match_count)
+                first_id, last_new_id = self.execute_query(
+                    "SELECT MIN(id), MAX(id) FROM matches WHERE id > %s", (last_id,)
+                )[0]
+                if first_id is None:
+                    return
+                match_range = (first_id, last_new_id)
+            elif table == "transfers":
+                self._seed_transfers(count=transfer_count, since=season_start)
+            else:
+                handlers[table](match_range=match_range)
+
+        self.refresh_match_summaries(after_match_id=last_id)
+
+    def refresh_match_summaries(self, after_match_id=None):
+        """Bring the V5 summary tables up to date: all of them, or only matches after `after_match_id`."""
+        if self.execute_query("SELECT to_regproc('rebuild_match_summaries')")[0][0] is None:
+            return
+        with self.conn.cursor() as cur:
+            if after_match_id is None:
+                cur.execute("SELECT rebuild_match_summaries()")
+            else:
+                cur.execute(
+                    "SELECT refresh_match_summaries(ARRAY(SELECT id FROM matches WHERE id > %s))", (after_match_id,)
+                )
+        self.conn.commit()
+        print("Refreshed match summaries")
+
+    def seeding_handlers(self):
+        return {
             "clubs": self._seed_clubs,
             "matches": self._seed_matches,
             "club_match_stats": self._seed_club_match_stats,
@@ -150,356 +489,316 @@ class DatabaseSeeder:
             "contracts": self._seed_contracts,
             "transfers": self._seed_transfers
         }
-        
-        for table, handler in seeding_handlers.items():
-            if self.table_exists_and_empty(table):
-                handler()
 
     def _seed_clubs(self):
-        stadium_ids = [row[0] for row in self.execute_query("SELECT id FROM stadiums")]
-        manager_ids = [row[0] for row in self.execute_query("SELECT id FROM managers")]
-        
+        stadium_ids = [row[0] for row in self.execute_query("SELECT id FROM stadiums ORDER BY id")]
+        manager_ids = [row[0] for row in self.execute_query("SELECT id FROM managers ORDER BY id")]
+        count = self.table_count("clubs")
+
+        stadiums = self.fake.random.sample(stadium_ids, count)
+        managers = self.fake.random.sample(manager_ids, count)
+
         data = []
-        for _ in range(self.seed_count):
-            stadium_id = self.fake.random_element(stadium_ids)
-            manager_id = self.fake.random_element(manager_ids)
-            stadium_ids.remove(stadium_id)
-            manager_ids.remove(manager_id)
-            
+        for stadium_id, manager_id in zip(stadiums, managers):
             data.append([
                 self.fake.company(), self.fake.city(), self.fake.random_int(1900, 2025),
                 stadium_id, manager_id, self._generate_decimal(), self.fake.url(), False
             ])
         
-        self.insert_data("""
-            INSERT INTO clubs (name, city, founded_year, stadium_id, manager_id,
-                            budget_usd, official_website_url, is_defunct) VALUES %s
-        """, data, "clubs")
-
-    def _seed_matches(self):
-        tournament_ids = [row[0] for row in self.execute_query("SELECT id FROM tournaments")]
-        club_stadiums = [(row[0], row[1]) for row in self.execute_query("SELECT id, stadium_id FROM clubs")]
-        referee_ids = [row[0] for row in self.execute_query("SELECT id FROM referees")]
-        
+        self.insert_data("clubs", [
+            'name', 'city', 'founded_year', 'stadium_id', 'manager_id', 'budget_usd',
+            'official_website_url', 'is_defunct'
+        ], data)
+
+    def _seed_matches(self, count=None):
+        tournament_ids = [row[0] for row in self.execute_query("SELECT id FROM tournaments ORDER BY id")]
+        club_stadiums = [(row[0], row[1]) for row in self.execute_query("SELECT id, stadium_id FROM clubs ORDER BY id")]
+        referee_ids = [row[0] for row in self.execute_query("SELECT id FROM referees ORDER BY id")]
+        club_weights = self._club_weights(club_stadiums)
+        # Newer seasons hold SEED_SEASON_GROWTH times as many matches as the one before
+        seasons = list(range(self.seasons))
+        season_weights = [self.season_growth ** (self.seasons - 1 - season) for season in seasons]
+        self.ensure_season_partitions(self._season_bounds(self.seasons - 1)[0], self.reference_date)
+
         data = []
-        for _ in range(self.seed_count):
+        for _ in range(count or self.table_count("matches")):
             tournament_id = self.fake.random_element(tournament_ids)
-            club1_id, stadium_id = self.fake.random_element(club_stadiums)
-            club2_id = self.fake.random_element([x for x in club_stadiums if x[0] != club1_id])[0]
-            
+            club1_id, stadium_id = self.fake.random.choices(club_stadiums, weights=club_weights)[0]
+            club2_id = club1_id
+            while club2_id == club1_id:
+                club2_id = self.fake.random.choices(club_stadiums, weights=club_weights)[0][0]
+            season_start, season_end = self._season_bounds(self.fake.random.choices(seasons, weights=season_weights)[0])
+
             data.append([
                 tournament_id, club1_id, club2_id,
-                self.fake.date_between(start_date='-1y', end_date='today'),
+                self.fake.date_between(start_date=season_start, end_date=season_end),
                 stadium_id, self.fake.random_int(0, 4), self.fake.random_int(0, 4),
                 self.fake.random_element(referee_ids), self.fake.random_int(10000, 50000)
             ])
         
-        self.insert_data("""
-            INSERT INTO matches (tournament_id, club1_id, club2_id, match_date, stadium_id,
-                            club1_score, club2_score, referee_id, attendance) VALUES %s
-        """, data, "matches")
+        self.insert_data("matches", [
+            'tournament_id', 'club1_id', 'club2_id', 'match_date', 'stadium_id', 'club1_score',
+            'club2_score', 'referee_id', 'attendance'
+        ], data)
 
-    def _seed_club_match_stats(self):
-        matches = self.execute_query("SELECT id, club1_id, club2_id, club1_score, club2_score FROM matches")
-        data = []
-        
-        for match_id, club1_id, club2_id, score1, score2 in matches:
-            possession = self.fake.random_int(30, 70)
-            shots1, shots2 = self.fake.random_int(score1, 20), self.fake.random_int(score2, 20)
-            
-            data.extend([
-                [match_id, club1_id, possession, shots1, self.fake.random_int(score1, shots1),
-                self.fake.random_int(400, 700), self.fake.random_int(70, 95),
-                self.fake.random_int(0, 20), self.fake.random_int(2, 7), self.fake.random_int(3, 15)],
-                [match_id, club2_id, 100-possession, shots2, self.fake.random_int(score2, shots2),
-                self.fake.random_int(400, 700), self.fake.random_int(70, 95),
-                self.fake.random_int(20, 35), self.fake.random_int(2, 7), self.fake.random_int(3, 15)]
-            ])
-        
-        self.insert_data("""
-            INSERT INTO club_match_stats (match_id, club_id, possession, shots, shots_on_target,
-                                        passes, pass_accuracy, fouls_committed, offsides, corners) VALUES %s
-        """, data, "club_match_stats")
-
-    def _seed_starting_lineups(self):
-        match_clubs = self.execute_query("SELECT id, club1_id, club2_id FROM matches")
-        player_ids = [row[0] for row in self.execute_query("SELECT id FROM players")]
+    def _seed_club_match_stats(self, match_range=None):
+        # Possession is drawn per match and split between the sides; the away side commits more fouls
+        self.insert_select("club_match_stats", [
+            'match_id', 'club_id', 'possession', 'shots', 'shots_on_target', 'passes',
+            'pass_accuracy', 'fouls_committed', 'offsides', 'corners'
+        ], f"""
+            SELECT match_id, club_id, possession, shots,
+                   {sql_randint('score', 'shots')} AS shots_on_target,
+                   {sql_randint(400, 700)} AS passes,
+                   {sql_randint(70, 95)} AS pass_accuracy,
+                   CASE WHEN is_home THEN {sql_randint(0, 20)} ELSE {sql_randint(20, 35)} END AS fouls_committed,
+                   {sql_randint(2, 7)} AS offsides,
+                   {sql_randint(3, 15)} AS corners,
+                   match_date
+            FROM (
+                SELECT m.id AS match_id, side.club_id, side.score, side.is_home, m.match_date,
+                       CASE WHEN side.is_home THEN m.possession ELSE 100 - m.possession END AS possession,
+                       {sql_randint('side.score', 20)} AS shots
+                FROM (
+                    SELECT id, club1_id, club2_id, club1_score, club2_score, match_date,
+                           {sql_randint(30, 70)} AS possession
+                    FROM matches{self._match_filter("id", match_range)}
+                    ORDER BY id
+                ) m
+                CROSS JOIN LATERAL (VALUES (m.club1_id, m.club1_score, true), (m.club2_id, m.club2_score, false))
+                    AS side(club_id, score, is_home)
+                ORDER BY m.id, NOT side.is_home
+            ) sides
+        """, seed_key=("club_match_stats", match_range))
+
+    def _seed_starting_lineups(self, match_range=None):
+        match_clubs = self.execute_query(
+            "SELECT id, club1_id, club2_id FROM matches" + self._match_filter("id", match_range) + " ORDER BY id"
+        )
+        player_ids = [row[0] for row in self.execute_query("SELECT id FROM players ORDER BY id")]
         positions = ["ST", "RW", "LW", "CM", "RM", "LM", "CB", "CB", "LB", "RB", "GK"]
-        
-        clubs = list(set([club for match in match_clubs for club in [match[1], match[2]]]))
-        lineups = {club: self.fake.random_elements(player_ids, 11, True) for club in clubs}
-        
-        data = []
-        for match_id, club1_id, club2_id in match_clubs:
-            for i in range(11):
-                is_captain = (i == 3)
-                data.extend([
-                    [match_id, club1_id, lineups[club1_id][i], positions[i], is_captain, "4-3-3"],
-                    [match_id, club2_id, lineups[club2_id][i], positions[i], is_captain, "4-3-3"]
-                ])
-        
-        self.insert_data("""
-            INSERT INTO starting_lineups (match_id, club_id, player_id, position, is_captain, formation) VALUES %s
-        """, data, "starting_lineups")
 
-    def _seed_goals(self):
-        matches = self.execute_query("SELECT id, club1_id, club2_id, club1_score, club2_score FROM matches")
-        clubs = list(set([club for match in matches for club in [match[1], match[2]]]))
-        
-        scorers = {}
-        for club in clubs:
-            result = self.execute_query(f"SELECT player_id FROM starting_lineups WHERE club_id={club} AND position='ST'")
-            scorers[club] = result[0][0] if result else None
-        
-        data = []
-        for match_id, club1_id, club2_id, score1, score2 in matches:
-            data.extend([[match_id, scorers[club1_id], club1_id, self.fake.random_int(0, 75), 'Open Play'] 
-                    for _ in range(int(score1))])
-            data.extend([[match_id, scorers[club2_id], club2_id, self.fake.random_int(0, 75), 'Open Play'] 
-                    for _ in range(int(score2))])
-        
-        self.insert_data("""
-            INSERT INTO goals (match_id, scorer_id, club_id, goal_mn, goal_type) VALUES %s
-        """, data, "goals")
+        clubs = set([club for match in match_clubs for club in [match[1], match[2]]])
+        known = self.index.get('lineups', {})
+        lineups = {
+            club: [player_id for player_id, _ in known[club]] if club in known
+            else random.Random(f"{self.lineup_seed}:{club}").sample(player_ids, 11)
+            for club in clubs
+        }
 
-    def _seed_assists(self):
-        goals = self.execute_query("SELECT goal_id, match_id, club_id FROM goals")
-        clubs = list(set([goal[2] for goal in goals]))
-        
-        assistants = {}
-        for club in clubs:
-            result = self.execute_query(f"SELECT player_id FROM starting_lineups WHERE club_id={club} AND position='RW'")
-            assistants[club] = result[0][0] if result else None
-        
-        data = [[match_id, goal_id, assistants[club_id], self.fake.random_int(0, 75)] 
-                for goal_id, match_id, club_id in goals]
-        
-        self.insert_data("""
-            INSERT INTO assists (match_id, goal_id, assistant_id, assist_mn) VALUES %s
-        """, data, "assists")
+        def rows():
+            for match_id, club1_id, club2_id in match_clubs:
+                for i in range(11):
+                    is_captain = (i == 3)
+                    yield [match_id, club1_id, lineups[club1_id][i], positions[i], is_captain, "4-3-3"]
+                    yield [match_id, club2_id, lineups[club2_id][i], positions[i], is_captain, "4-3-3"]
 
-    def _seed_clean_sheets(self):
-        matches = self.execute_query("SELECT id, club1_id, club2_id, club1_score, club2_score FROM matches")
-        clubs = list(set([club for match in matches for club in [match[1], match[2]]]))
-        
-        keepers = {}
-        for club in clubs:
-            result = self.execute_query(f"SELECT player_id FROM starting_lineups WHERE club_id={club} AND position IN ('GK', 'CB')")
-            keepers[club] = result[0][0] if result else None
-        
-        data = []
-        for match_id, club1_id, club2_id, score1, score2 in matches:
-            if int(score2) == 0:  # club1 clean sheet
-                data.append([match_id, club1_id, keepers[club1_id]])
-            if int(score1) == 0:  # club2 clean sheet  
-                data.append([match_id, club2_id, keepers[club2_id]])
-        
-        self.insert_data("""
-            INSERT INTO clean_sheets (match_id, club_id, player_id) VALUES %s
-        """, data, "clean_sheets")
+        self.insert_data("starting_lineups", [
+            'match_id', 'club_id', 'player_id', 'position', 'is_captain', 'formation'
+        ], rows())
+        # Later handlers pick scorers, keepers and substitutes from these lineups
+        if match_range is None or 'lineups' in self.index:
+            self.index.setdefault('lineups', {}).update(
+                {club: list(zip(lineup, positions)) for club, lineup in lineups.items()}
+            )
+
+    def _seed_goals(self, match_range=None):
+        matches = self.execute_query(
+            "SELECT id, club1_id, club2_id, club1_score, club2_score FROM matches"
+            + self._match_filter("id", match_range) + " ORDER BY id"
+        )
+        clubs = set([club for match in matches for club in [match[1], match[2]]])
+        if self.scorer_skew:
+            # Zipf-like: the striker scores most, then wingers and midfielders, never the keeper
+            outfield = {club: [p for p, position in self._club_lineups().get(club, []) if position != 'GK']
+                        for club in clubs}
+            scorer_weights = [1 / (rank + 1) ** self.scorer_skew for rank in range(10)]
+            scorer = lambda club: self.fake.random.choices(outfield[club], weights=scorer_weights[:len(outfield[club])])[0]
+        else:
+            strikers = {club: self._lineup_player(club, ('ST',)) for club in clubs}
+            scorer = strikers.get
+
+        def rows():
+            for match_id, club1_id, club2_id, score1, score2 in matches:
+                for _ in range(int(score1)):
+                    yield [match_id, scorer(club1_id), club1_id, self.fake.random_int(0, 75), 'Open Play']
+                for _ in range(int(score2)):
+                    yield [match_id, scorer(club2_id), club2_id, self.fake.random_int(0, 75), 'Open Play']
 
-    def _seed_fouls(self):
-        fouls_data = self.execute_query("SELECT match_id, club_id, fouls_committed FROM club_match_stats")
+        self.insert_data("goals", ['match_id', 'scorer_id', 'club_id', 'goal_mn', 'goal_type'], rows())
+
+    def _seed_assists(self, match_range=None):
+        # Every goal is assisted by the right winger of the scoring club
+        self.insert_select("assists", ['match_id', 'goal_id', 'assistant_id', 'assist_mn'], f"""
+            SELECT g.match_id, g.goal_id, w.player_id AS assistant_id,
+                   {sql_randint(0, 75)} AS assist_mn, m.match_date
+            FROM goals g
+            JOIN matches m ON m.id = g.match_id
+            JOIN ({lineup_player_sql("RW")}) w ON w.club_id = g.club_id
+            {self._match_filter("g.match_id", match_range)}
+            ORDER BY g.goal_id
+        """, seed_key=("assists", match_range))
+
+    def _seed_clean_sheets(self, match_range=None):
+        # A side that conceded nothing credits its keeper (the first GK or CB of its lineup)
+        self.insert_select("clean_sheets", ['match_id', 'club_id', 'player_id'], f"""
+            SELECT m.id AS match_id, side.club_id, k.player_id, m.match_date
+            FROM matches m
+            CROSS JOIN LATERAL (VALUES (m.club1_id, m.club2_score, 1), (m.club2_id, m.club1_score, 2))
+                AS side(club_id, conceded, side)
+            JOIN ({lineup_player_sql("GK", "CB")}) k ON k.club_id = side.club_id
+            WHERE side.conceded = 0{self._match_filter("m.id", match_range, prefix="AND")}
+            ORDER BY m.id, side.side
+        """, seed_key=("clean_sheets", match_range))
+
+    def _seed_fouls(self, match_range=None):
+        fouls_data = self.execute_query(
+            "SELECT match_id, club_id, fouls_committed FROM club_match_stats"
+            + self._match_filter("match_id", match_range) + " ORDER BY match_id, club_id"
+        )
         foul_types = self._get_enum_values("foul_type")
-        
-        data = []
-        for match_id, club_id, foul_count in fouls_data:
-            players = [row[0] for row in self.execute_query(f"SELECT player_id FROM starting_lineups WHERE club_id={club_id}")]
-            data.extend([
-                [match_id, self.fake.random_element(players), club_id, self.fake.random_int(0, 90), self.fake.random_element(foul_types)]
-                for _ in range(int(foul_count))
-            ])
-        
-        self.insert_data("""
-            INSERT INTO fouls (match_id, player_id, club_id, foul_mn, foul_type) VALUES %s
-        """, data, "fouls")
+        # Resolve lineups before COPY starts: no other query may run while it streams
+        lineups = {club_id: self._lineup_players(club_id) for club_id in set(row[1] for row in fouls_data)}
+
+        def rows():
+            for match_id, club_id, foul_count in fouls_data:
+                players = lineups[club_id]
+                for _ in range(int(foul_count)):
+                    yield [
+                        match_id, self.fake.random_element(players), club_id,
+                        self.fake.random_int(0, 90), self.fake.random_element(foul_types)
+                    ]
+
+        self.insert_data("fouls", ['match_id', 'player_id', 'club_id', 'foul_mn', 'foul_type'], rows())
 
-    def _seed_injuries(self):
-        matches = self.execute_query("SELECT match_id, club_id FROM club_match_stats")
+    def _seed_injuries(self, match_range=None):
+        matches = self.execute_query(
+            "SELECT match_id, club_id FROM club_match_stats"
+            + self._match_filter("match_id", match_range) + " ORDER BY match_id, club_id"
+        )
         injury_types = self._get_enum_values("injury_type")
         
         data = []
         for match_id, club_id in matches:
-            players = [row[0] for row in self.execute_query(f"SELECT player_id FROM starting_lineups WHERE club_id={club_id}")]
+            players = self._lineup_players(club_id)
             data.append([
                 match_id, self.fake.random_element(players), club_id,
                 self.fake.random_element(injury_types), self.fake.random_int(0, 90), self.fake.random_int(10, 90)
             ])
         
-        self.insert_data("""
-            INSERT INTO injuries (match_id, player_id, club_id, injury_type, injury_mn, recovery_days) VALUES %s
-        """, data, "injuries")
+        self.insert_data("injuries", [
+            'match_id', 'player_id', 'club_id', 'injury_type', 'injury_mn', 'recovery_days'
+        ], data)
+
+    def _seed_substitutions(self, match_range=None):
+        matches = self.execute_query(
+            "SELECT match_id, club_id FROM club_match_stats"
+            + self._match_filter("match_id", match_range) + " ORDER BY match_id, club_id"
+        )
+        all_players = self._players()
 
-    def _seed_substitutions(self):
-        matches = self.execute_query("SELECT match_id, club_id FROM club_match_stats")
-        all_players = [row[0] for row in self.execute_query("SELECT id FROM players")]
-        
         data = []
         for match_id, club_id in matches:
-            players = [row[0] for row in self.execute_query(f"SELECT player_id FROM starting_lineups WHERE club_id={club_id}")]
-            available_subs = list(set(all_players) - set(players))
-            
-            if players and available_subs:
-                data.append([
-                    match_id, club_id, self.fake.random_element(players),
-                    self.fake.random_element(available_subs), self.fake.random_int(75, 90)
-                ])
+            players = self._lineup_players(club_id)
+            if not players or len(all_players) <= len(set(players)):
+                continue
+            # Rejection sampling keeps each draw O(1) instead of rebuilding the bench
+            substitute = self.fake.random_element(all_players)
+            while substitute in players:
+                substitute = self.fake.random_element(all_players)
+            data.append([
+                match_id, club_id, self.fake.random_element(players),
+                substitute, self.fake.random_int(75, 90)
+            ])
         
-        self.insert_data("""
-            INSERT INTO substitutions (match_id, club_id, player_out_id, player_in_id, substitution_mn) VALUES %s
-        """, data, "substitutions")
+        self.insert_data("substitutions", [
+            'match_id', 'club_id', 'player_out_id', 'player_in_id', 'substitution_mn'
+        ], data)
     
-    def _seed_league_statistics(self):
-        matches = self.execute_query(f"""
-            SELECT id, club1_id, club2_id, club1_score, club2_score, tournament_id 
-            FROM matches WHERE tournament_id < {int(self.seed_count / 2)}
-        """)
-        
-        stats = {}
-        league_counters = {}
-        
-        for match_id, club1_id, club2_id, score1, score2, tournament_id in matches:
-            club1_key = (club1_id, tournament_id)
-            club2_key = (club2_id, tournament_id)
-
-            for club_key in [club1_key, club2_key]:
-                if club_key not in stats:
-                    stats[club_key] = {
-                        'matches': 0, 'wins': 0, 'draws': 0, 'losses': 0,
-                        'goals_scored': 0, 'goals_conceded': 0, 'points': 0
-                    }
-                if tournament_id not in league_counters:
-                    league_counters[tournament_id] = 1
-        
-            score1, score2 = int(score1), int(score2)
-            
-            stats[club1_key]['matches'] += 1
-            stats[club1_key]['goals_scored'] += score1
-            stats[club1_key]['goals_conceded'] += score2
-            
-            stats[club2_key]['matches'] += 1
-            stats[club2_key]['goals_scored'] += score2
-            stats[club2_key]['goals_conceded'] += score1
-            
-            if score1 > score2:
-                stats[club1_key]['wins'] += 1
-                stats[club1_key]['points'] += 3
-                stats[club2_key]['losses'] += 1
-            elif score1 < score2:
-                stats[club2_key]['wins'] += 1
-                stats[club2_key]['points'] += 3
-                stats[club1_key]['losses'] += 1
-            else:
-                stats[club1_key]['draws'] += 1
-                stats[club2_key]['draws'] += 1
-                stats[club1_key]['points'] += 1
-                stats[club2_key]['points'] += 1
-        
-        sorted_stats = {}
-        for tournament_id in set(key[1] for key in stats.keys()):
-            tournament_stats = {key: stat for key, stat in stats.items() if key[1] == tournament_id}
-            sorted_tournament = dict(sorted(tournament_stats.items(), 
-                                        key=lambda x: x[1]['points'], reverse=True))
-            sorted_stats[tournament_id] = sorted_tournament
-        
-        data = []
-        for tournament_id, tournament_stats in sorted_stats.items():
-            position = 1
-            for (club_id, _), stat in tournament_stats.items():
-                data.append([
-                    tournament_id, "2024/2025", club_id,
-                    stat['matches'], stat['wins'], stat['draws'], stat['losses'],
-                    stat['goals_scored'], stat['goals_conceded'], stat['points'], position
-                ])
-                position += 1
-        
-        self.insert_data("""
-            INSERT INTO league_statistics 
-            (league_id, season, club_id, matches_played, wins, draws, losses,
-            goals_scored, goals_conceded, points, league_position) VALUES %s
-        """, data, "league_statistics")
-
-    def _seed_cup_statistics(self):
-        matches = self.execute_query(f"""
-            SELECT id, club1_id, club2_id, club1_score, club2_score, tournament_id 
-            FROM matches WHERE tournament_id > {int(self.seed_count / 2) + 1}
-        """)
-        
-        stats = {}
-        stages = ["1/32", "1/16", "1/8", "1/4", "1/2", "final"]
-        
-        for match_id, club1_id, club2_id, score1, score2, tournament_id in matches:
-            club1_key = (club1_id, tournament_id)
-            club2_key = (club2_id, tournament_id)
-            
-            for club_key in [club1_key, club2_key]:
-                if club_key not in stats:
-                    stats[club_key] = {
-                        'matches': 0, 'goals_scored': 0, 'goals_conceded': 0, 
-                        'clean_sheets': 0, 'stage': "1/32", 'is_winner': False
-                    }
-            
-            score1, score2 = int(score1), int(score2)
-            
-            stats[club1_key]['matches'] += 1
-            stats[club1_key]['goals_scored'] += score1
-            stats[club1_key]['goals_conceded'] += score2
-            if score2 == 0:
-                stats[club1_key]['clean_sheets'] += 1
-            
-            stats[club2_key]['matches'] += 1
-            stats[club2_key]['goals_scored'] += score2
-            stats[club2_key]['goals_conceded'] += score1
-            if score1 == 0:
-                stats[club2_key]['clean_sheets'] += 1
-            
-            if stats[club1_key]['stage'] != "eliminated" and stats[club2_key]['stage'] != "eliminated":
-                if score1 > score2:
-                    current_stage_index = stages.index(stats[club1_key]['stage'])
-                    if current_stage_index < len(stages) - 1:
-                        stats[club1_key]['stage'] = stages[current_stage_index + 1]
-                    stats[club2_key]['stage'] = "eliminated"
-                elif score1 < score2:
-                    current_stage_index = stages.index(stats[club2_key]['stage'])
-                    if current_stage_index < len(stages) - 1:
-                        stats[club2_key]['stage'] = stages[current_stage_index + 1]
-                    stats[club1_key]['stage'] = "eliminated"
-                else:
-                    winner_key = self.fake.random_element([club1_key, club2_key])
-                    loser_key = club2_key if winner_key == club1_key else club1_key
-                    
-                    current_stage_index = stages.index(stats[winner_key]['stage'])
-                    if current_stage_index < len(stages) - 1:
-                        stats[winner_key]['stage'] = stages[current_stage_index + 1]
-                    stats[loser_key]['stage'] = "eliminated"
-        
-        for club_key, stat in stats.items():
-            if stat['stage'] == 'final':
-                stat['is_winner'] = self.fake.boolean()
-        
-        data = []
-        for (club_id, tournament_id), stat in stats.items():
-            if stat['stage'] != "eliminated": 
-                data.append([
-                    tournament_id, "2024/2025", club_id,
-                    stat['matches'], stat['goals_scored'], stat['goals_conceded'], 
-                    stat['clean_sheets'], stat['stage'], stat['is_winner']
-                ])
-        
-        self.insert_data("""
-            INSERT INTO cup_statistics 
-            (cup_id, season, club_id, matches_played, goals_scored, goals_conceded, 
-            clean_sheets, stage_reached, is_winner) VALUES %s
-        """, data, "cup_statistics")
+    def _seed_league_statistics(self, match_range=None):
+        # Standings per league and season; ties on points keep the order clubs first appeared in
+        self.insert_select("league_statistics", [
+            'league_id', 'season', 'club_id', 'matches_played', 'wins', 'draws', 'losses',
+            'goals_scored', 'goals_conceded', 'points', 'league_position'
+        ], f"""
+            SELECT tournament_id AS league_id, season, club_id, matches_played, wins, draws, losses,
+                   goals_scored, goals_conceded, points,
+                   ROW_NUMBER() OVER (PARTITION BY tournament_id, season ORDER BY points DESC, first_seen)
+                       AS league_position
+            FROM ({self._club_results_sql("m.tournament_id < %(league_limit)s", match_range)}) results
+            ORDER BY tournament_id, season, league_position
+        """, {
+            **self._season_params(), "league_limit": int(self.table_count("tournaments") / 2)
+        }, seed_key=("league_statistics", match_range))
+
+    def _seed_cup_statistics(self, match_range=None):
+        # Knockout progress depends on every earlier match of both clubs, so it is
+        # replayed in match order by a server-side loop; totals stay set-based
+        params = {**self._season_params(), "cup_limit": int(self.table_count("tournaments") / 2) + 1}
+        self.insert_select("cup_statistics", [
+            'cup_id', 'season', 'club_id', 'matches_played', 'goals_scored', 'goals_conceded',
+            'clean_sheets', 'stage_reached', 'is_winner'
+        ], f"""
+            SELECT p.cup_id, p.season, p.club_id, r.matches_played, r.goals_scored, r.goals_conceded,
+                   r.clean_sheets, (ARRAY{CUP_STAGES})[p.stage + 1] AS stage_reached,
+                   CASE WHEN p.stage = {len(CUP_STAGES) - 1} THEN random() < 0.5 ELSE false END AS is_winner
+            FROM seed_cup_progress p
+            JOIN ({self._club_results_sql("m.tournament_id > %(cup_limit)s", match_range)}) r
+                ON r.club_id = p.club_id AND r.tournament_id = p.cup_id AND r.season = p.season
+            WHERE p.stage >= 0
+            ORDER BY r.first_seen
+        """, params, seed_key=("cup_statistics", match_range), prepare=[f"""
+            CREATE TEMP TABLE seed_cup_matches ON COMMIT DROP AS
+            SELECT m.id, m.club1_id, m.club2_id, m.club1_score, m.club2_score, m.tournament_id,
+                   {SEASON_LABEL_SQL} AS season
+            FROM matches m
+            WHERE m.tournament_id > %(cup_limit)s{self._match_filter("m.id", match_range, prefix="AND")}
+        """, """
+            CREATE TEMP TABLE seed_cup_progress (
+                club_id BIGINT NOT NULL,
+                cup_id BIGINT NOT NULL,
+                season TEXT NOT NULL,
+                stage INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (club_id, cup_id, season)
+            ) ON COMMIT DROP
+        """, f"""
+            DO $$
+            DECLARE
+                m RECORD;
+                stage1 INTEGER;
+                stage2 INTEGER;
+                club1_wins BOOLEAN;
+            BEGIN
+                FOR m IN SELECT * FROM seed_cup_matches ORDER BY id LOOP
+                    INSERT INTO seed_cup_progress (club_id, cup_id, season)
+                    VALUES (m.club1_id, m.tournament_id, m.season), (m.club2_id, m.tournament_id, m.season)
+                    ON CONFLICT DO NOTHING;
+                    SELECT stage INTO stage1 FROM seed_cup_progress
+                    WHERE club_id = m.club1_id AND cup_id = m.tournament_id AND season = m.season;
+                    SELECT stage INTO stage2 FROM seed_cup_progress
+                    WHERE club_id = m.club2_id AND cup_id = m.tournament_id AND season = m.season;
+                    -- Stage -1 means eliminated; matches involving an eliminated club change nothing
+                    CONTINUE WHEN stage1 < 0 OR stage2 < 0;
+                    -- A draw goes to either club with equal chance
+                    club1_wins := m.club1_score > m.club2_score
+                        OR (m.club1_score = m.club2_score AND random() < 0.5);
+                    UPDATE seed_cup_progress
+                    SET stage = CASE WHEN (club_id = m.club1_id) = club1_wins
+                                     THEN LEAST(stage + 1, {len(CUP_STAGES) - 1}) ELSE -1 END
+                    WHERE cup_id = m.tournament_id AND season = m.season AND club_id IN (m.club1_id, m.club2_id);
+                END LOOP;
+            END
+            $$
+        """])
 
     def _seed_personal_awards(self):
-        player_ids = [row[0] for row in self.execute_query("SELECT id FROM players")]
+        player_ids = [row[0] for row in self.execute_query("SELECT id FROM players ORDER BY id")]
         
         data = []
-        for _ in range(self.seed_count):
+        for _ in range(self.table_count("personal_awards")):
             data.append([
                 self.fake.random_element(player_ids),
-                self.fake.date_between(start_date='-1y', end_date='today'),
+                self.fake.date_between(start_date=self.reference_date - timedelta(days=365), end_date=self.reference_date),
                 self.fake.random_element([
                     "Лучший бомбардир сезона",
                     "Лучший ассистент сезона", 
@@ -511,13 +810,11 @@ class DatabaseSeeder:
                 ])
             ])
         
-        self.insert_data("""
-            INSERT INTO personal_awards (player_id, award_date, award_description) VALUES %s
-        """, data, "personal_awards")
+        self.insert_data("personal_awards", ['player_id', 'award_date', 'award_description'], data)
 
     def _seed_contracts(self):
-        clubs = list(set([row[0] for row in self.execute_query("SELECT id FROM clubs")]))
-        player_ids = [row[0] for row in self.execute_query("SELECT id FROM players")]
+        clubs = sorted(set([row[0] for row in self.execute_query("SELECT id FROM clubs")]))
+        player_ids = [row[0] for row in self.execute_query("SELECT id FROM players ORDER BY id")]
         status_values = self._get_enum_values("contract_status")
         
         club_assignments = {}
@@ -531,10 +828,15 @@ class DatabaseSeeder:
         data = []
         for club_id, players in club_assignments.items():
             for player_id in players:
-                start_date = self.fake.date_between(start_date='-2y', end_date='today')
+                start_date = self.fake.date_between(
+                    start_date=self.reference_date - timedelta(days=730), end_date=self.reference_date
+                )
                 data.append([
                     player_id, club_id, start_date,
-                    self.fake.date_between(start_date='today', end_date='+3y'),
+                    self.fake.date_between(
+                        start_date=self.reference_date + timedelta(days=1),
+                        end_date=self.reference_date + timedelta(days=3 * 365)
+                    ),
                     round(float(self.fake.pydecimal(
                         left_digits=self.fake.random_int(6, 8), 
                         right_digits=2, 
@@ -543,19 +845,18 @@ class DatabaseSeeder:
                     self.fake.random_element(status_values)
                 ])
         
-        self.insert_data("""
-            INSERT INTO contracts 
-            (player_id, club_id, start_date, end_date, salary_usd, status) VALUES %s
-        """, data, "contracts")
-
-    def _seed_transfers(self):
-        contracts = self.execute_query("SELECT id, player_id, club_id, start_date FROM contracts")
-        club_ids = [row[0] for row in self.execute_query("SELECT id FROM clubs")]
+        self.insert_data("contracts", [
+            'player_id', 'club_id', 'start_date', 'end_date', 'salary_usd', 'status'
+        ], data)
+
+    def _seed_transfers(self, count=None, since=None):
+        contracts = self.execute_query("SELECT id, player_id, club_id, start_date FROM contracts ORDER BY id")
+        club_ids = [row[0] for row in self.execute_query("SELECT id FROM clubs ORDER BY id")]
         transfer_types = self._get_enum_values("transfer_type")
         
         transfer_contracts = self.fake.random_elements(
             elements=contracts, 
-            length=min(self.seed_count, len(contracts)), 
+            length=min(count or self.table_count("transfers"), len(contracts)), 
             unique=True
         )
         
@@ -563,10 +864,16 @@ class DatabaseSeeder:
         for contract in transfer_contracts:
             contract_id, player_id, from_club_id, start_date = contract
             
-            to_club_id = self.fake.random_element([cid for cid in club_ids if cid != from_club_id])
+            to_club_id = from_club_id
+            while to_club_id == from_club_id:
+                to_club_id = self.fake.random_element(club_ids)
             
+            transfer_date = start_date
+            if since is not None:
+                transfer_date = self.fake.date_between(start_date=since, end_date=self.reference_date)
+
             data.append([
-                player_id, from_club_id, to_club_id, start_date,
+                player_id, from_club_id, to_club_id, transfer_date,
                 round(float(self.fake.pydecimal(
                         left_digits=self.fake.random_int(8, 10), 
                         right_digits=2, 
@@ -576,11 +883,10 @@ class DatabaseSeeder:
                 self.fake.random_element(transfer_types)
             ])
         
-        self.insert_data("""
-            INSERT INTO transfers 
-            (player_id, from_club_id, to_club_id, transfer_date, transfer_fee_usd, 
-            contract_id, transfer_type) VALUES %s
-        """, data, "transfers")
+        self.insert_data("transfers", [
+            'player_id', 'from_club_id', 'to_club_id', 'transfer_date', 'transfer_fee_usd',
+            'contract_id', 'transfer_type'
+        ], data)
 
 if __name__ == "__main__":
     seeder = DatabaseSeeder()
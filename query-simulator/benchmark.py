@@ -0,0 +1,381 @@
+import os
+import re
+import math
+import sys
+import json
+import time
+import logging
+import threading
+import subprocess
+from collections import defaultdict
+import psycopg2
+import psycopg2.extensions
+from plans import EXPLAIN_PREFIX, PlanSample, walk
+from simulator import QuerySimulator
+
+logger = logging.getLogger("benchmark")
+
+MIGRATION_RE = re.compile(r'^V(\d+)__\w+_up\.sql$')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def migration_files(migrations_dir):
+    """{version: path} of the up migrations."""
+    files = {}
+    for filename in os.listdir(migrations_dir):
+        match = MIGRATION_RE.match(filename)
+        if match:
+            files[int(match.group(1))] = os.path.join(migrations_dir, filename)
+    return files
+
+
+class BenchmarkSimulator(QuerySimulator):
+    """QuerySimulator that records the duration of every query once warmup is over."""
+
+    def __init__(self):
+        super().__init__()
+        self.recording = False
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.stats_before = None
+
+    def execute_query(self, query_name, worker="0", intended_start=None):
+        duration = super().execute_query(query_name, worker, intended_start)
+        if self.recording:
+            if duration is None:
+                self.errors[query_name] += 1
+            else:
+                self.samples[query_name].append(duration)
+        return duration
+
+
+class Benchmark:
+    """Runs the simulator workload against several schema variants of one dataset.
+
+    The dataset is seeded once into a template database migrated to
+    `base_version`. Every variant is a fresh clone of the template with its
+    own migrations, index statements and SQL files applied on top, so all
+    variants see byte-identical data. The first variant is the baseline the
+    others are compared against.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.template = config.get("template", "bench_template")
+        self.base_version = int(config.get("base_version", 3))
+        self.duration = float(config.get("duration", 300))
+        self.warmup = float(config.get("warmup", 60))
+        self.threshold = float(config.get("regression_threshold", 0.1))
+        self.metric = config.get("regression_metric", "p95")
+        self.env = {key: str(value) for key, value in config.get("env", {}).items()}
+        self.variants = config["variants"]
+        self.keep_databases = config.get("keep_databases", False)
+        self.report_path = config.get("report", "/data/benchmark")
+        self.migrations = migration_files(os.getenv("MIGRATIONS_DIR", "/migrations/up"))
+        self.base_dir = os.path.dirname(os.path.abspath(config.get("_path", ".")))
+
+    def conn_kwargs(self, dbname):
+        return {
+            "dbname": dbname,
+            "user": os.getenv('DB_ADMIN_USER'),
+            "password": os.getenv('DB_ADMIN_PASSWORD'),
+            "host": os.getenv("POSTGRES_HOST", "haproxy"),
+            "port": os.getenv("POSTGRES_PORT", 5000),
+        }
+
+    def connect(self, dbname, autocommit=False):
+        conn = psycopg2.connect(**self.conn_kwargs(dbname))
+        if autocommit:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def database_exists(self, dbname):
+        conn = self.connect("postgres", autocommit=True)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (dbname,))
+                return cursor.fetchone() is not None
+        finally:
+            conn.close()
+
+    def admin(self, statement):
+        conn = self.connect("postgres", autocommit=True)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(statement)
+        finally:
+            conn.close()
+
+    def resolve(self, path):
+        return path if os.path.isabs(path) else os.path.join(self.base_dir, path)
+
+    def apply(self, dbname, statements):
+        """Run (label, sql) pairs in the database, one transaction each."""
+        conn = self.connect(dbname)
+        try:
+            for label, sql in statements:
+                logger.info(f"[{dbname}] applying {label}")
+                with conn.cursor() as cursor:
+                    cursor.execute(sql)
+                conn.commit()
+        finally:
+            conn.close()
+
+    def read_migration(self, version):
+        if version not in self.migrations:
+            raise ValueError(f"No up migration V{version}")
+        with open(self.migrations[version]) as f:
+            return os.path.basename(self.migrations[version]), f.read()
+
+    def prepare_template(self):
+        """Create and seed the template; False if it still has to be seeded by hand."""
+        if self.database_exists(self.template):
+            return True
+        self.admin(f'CREATE DATABASE "{self.template}"')
+        versions = sorted(v for v in self.migrations if v <= self.base_version)
+        self.apply(self.template, [self.read_migration(v) for v in versions])
+        seed_command = self.config.get("seed_command")
+        if not seed_command:
+            logger.error(f"Template {self.template} created at V{self.base_version}; seed it, e.g. "
+                         f"docker-compose run --rm --no-deps -e APP_ENV=dev -e DB_NAME={self.template} seeder, "
+                         f"then run the benchmark again")
+            return False
+        logger.info(f"Seeding {self.template}: {seed_command}")
+        subprocess.run(seed_command, shell=True, check=True, env={**os.environ, "DB_NAME": self.template})
+        return True
+
+    def variant_statements(self, variant):
+        statements = [self.read_migration(int(v)) for v in variant.get("migrations", [])]
+        statements += [(f"index {i + 1}", sql) for i, sql in enumerate(variant.get("indexes", []))]
+        for path in variant.get("sql", []):
+            with open(self.resolve(path)) as f:
+                statements.append((os.path.basename(path), f.read()))
+        return statements
+
+    def check_queries(self, simulator, dbname):
+        """PREPARE every query on the variant; a query that does not even parse there fails the benchmark.
+
+        Otherwise it would only error at run time, get no baseline and be reported "n/a".
+        """
+        broken = []
+        conn = self.connect(dbname)
+        try:
+            for query_name in sorted(simulator.templates):
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(simulator.templates[query_name].prepare_sql())
+                except psycopg2.Error as e:
+                    broken.append(f"{query_name}: {str(e).strip()}")
+                conn.rollback()
+        finally:
+            conn.close()
+        if broken:
+            raise ValueError(f"Queries do not run on {dbname}: " + "; ".join(broken))
+
+    def database_stats(self, dbname):
+        conn = self.connect(dbname)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT blks_hit, blks_read FROM pg_stat_database WHERE datname = current_database()")
+                hit, read = cursor.fetchone()
+                cursor.execute("SELECT COALESCE(SUM(pg_relation_size(indexrelid)), 0) FROM pg_stat_user_indexes")
+                index_bytes = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        return {"blks_hit": hit, "blks_read": read, "index_bytes": index_bytes}
+
+    def explain(self, simulator, dbname, query_name):
+        """Buffers of one EXPLAIN ANALYZE and the size of the indexes its plan uses."""
+        template = simulator.templates[query_name]
+        values, _ = template.draw()
+        statement, args = template.plain_sql(values)
+        conn = self.connect(dbname)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(EXPLAIN_PREFIX + statement, args)
+                explain = cursor.fetchone()[0]
+                sample = PlanSample(explain)
+                result = explain[0] if isinstance(explain, list) else explain
+                indexes = sorted({node["Index Name"] for _, node in walk(result["Plan"]) if "Index Name" in node})
+                cursor.execute(
+                    "SELECT COALESCE(SUM(pg_relation_size(to_regclass(name))), 0) FROM unnest(%s::text[]) AS name",
+                    (indexes,)
+                )
+                index_bytes = cursor.fetchone()[0]
+            conn.rollback()
+        finally:
+            conn.close()
+        return {
+            "buffers_hit": sample.buffers["hit"],
+            "buffers_read": sample.buffers["read"],
+            "indexes": indexes,
+            "index_bytes": index_bytes,
+            "fingerprint": sample.fingerprint,
+        }
+
+    def run_variant(self, variant):
+        name = variant["name"]
+        dbname = f"bench_{name}"
+        self.admin(f'DROP DATABASE IF EXISTS "{dbname}" WITH (FORCE)')
+        self.admin(f'CREATE DATABASE "{dbname}" TEMPLATE "{self.template}"')
+        try:
+            self.apply(dbname, self.variant_statements(variant))
+            conn = self.connect(dbname, autocommit=True)
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("VACUUM ANALYZE")
+            finally:
+                conn.close()
+            return self.run_workload(variant, dbname)
+        finally:
+            if not self.keep_databases:
+                self.admin(f'DROP DATABASE IF EXISTS "{dbname}" WITH (FORCE)')
+
+    def run_workload(self, variant, dbname):
+        # Plan sampling and the result cache would distort the timings; replicas are opt-in
+        env = {"PLAN_SAMPLE_INTERVAL": "0", "PLAN_STORE": "", "CACHE_SIZE_MB": "0", "REPLICA_ENDPOINTS": "",
+               "SERVER_STATS_INTERVAL": "0", "WRITE_MATCHES": "0", "RESULTS_DIR": "",
+               "RETRY_MAX_ATTEMPTS": "1", "PATRONI_API": "",
+               **self.env, **{k: str(v) for k, v in variant.get("env", {}).items()}, "DB_NAME": dbname}
+        saved = {key: os.environ.get(key) for key in env}
+        os.environ.update(env)
+        try:
+            simulator = BenchmarkSimulator()
+            self.check_queries(simulator, dbname)
+            # Warmup fills shared buffers and the OS cache before anything is recorded
+            timers = [
+                threading.Timer(self.warmup, self.start_recording, args=(simulator, dbname)),
+                threading.Timer(self.warmup + self.duration, simulator.stop_event.set),
+            ]
+            for timer in timers:
+                timer.daemon = True
+                timer.start()
+            logger.info(f"Running {variant['name']}: {self.warmup:.0f}s warmup, {self.duration:.0f}s measured")
+            simulator.run_queries()
+            after = self.database_stats(dbname)
+            queries = {}
+            for query_name in sorted(simulator.queries):
+                samples = sorted(simulator.samples.get(query_name, []))
+                stats = {
+                    "count": len(samples),
+                    "errors": simulator.errors.get(query_name, 0),
+                    "throughput": len(samples) / self.duration,
+                }
+                for q in PERCENTILES:
+                    stats[f"p{q}"] = percentile(samples, q)
+                try:
+                    stats.update(self.explain(simulator, dbname, query_name))
+                except psycopg2.Error as e:
+                    logger.error(f"Could not explain {query_name} on {variant['name']}: {e}")
+                queries[query_name] = stats
+            simulator.close()
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+        before = simulator.stats_before or after
+        return {
+            "name": variant["name"],
+            "queries": queries,
+            "blks_hit": after["blks_hit"] - before["blks_hit"],
+            "blks_read": after["blks_read"] - before["blks_read"],
+            "index_bytes": after["index_bytes"],
+        }
+
+    def start_recording(self, simulator, dbname):
+        simulator.stats_before = self.database_stats(dbname)
+        simulator.recording = True
+
+    def compare(self, results):
+        """Attach the change against the baseline to every query; return the regressions."""
+        baseline = results[0]["queries"]
+        regressions = []
+        for result in results[1:]:
+            for query_name, stats in result["queries"].items():
+                base = baseline.get(query_name, {}).get(self.metric)
+                value = stats.get(self.metric)
+                if not base or value is None:
+                    stats["change"] = None
+                    stats["verdict"] = "n/a"
+                    continue
+                stats["change"] = value / base - 1
+                stats["verdict"] = "FAIL" if stats["change"] > self.threshold else "ok"
+                if stats["verdict"] == "FAIL":
+                    regressions.append((result["name"], query_name, stats["change"]))
+        return regressions
+
+    def write_report(self, results, regressions):
+        os.makedirs(os.path.dirname(self.report_path) or ".", exist_ok=True)
+        with open(f"{self.report_path}.json", "w") as f:
+            json.dump({"config": self.config, "results": results, "regressions": regressions}, f, indent=2, default=str)
+
+        ms = lambda value: "—" if value is None else f"{value * 1000:.1f}"
+        lines = [
+            f"# Benchmark: {', '.join(r['name'] for r in results)}",
+            "",
+            f"Template `{self.template}` (V{self.base_version}), warmup {self.warmup:.0f}s, measured {self.duration:.0f}s. "
+            f"Regression: {self.metric} more than {self.threshold:.0%} above `{results[0]['name']}`.",
+            "",
+        ]
+        for result in results:
+            total = result["blks_hit"] + result["blks_read"]
+            ratio = f"{result['blks_hit'] / total:.2%}" if total else "—"
+            lines += [
+                f"## {result['name']}",
+                "",
+                f"Buffer hit ratio {ratio}, indexes {result['index_bytes'] / 1024 / 1024:.1f} MB",
+                "",
+                "| Query | p50, ms | p95, ms | p99, ms | q/s | errors | buffers hit/read | index MB | vs baseline |",
+                "|---|---|---|---|---|---|---|---|---|",
+            ]
+            for query_name, stats in result["queries"].items():
+                change = stats.get("change")
+                versus = "—" if change is None else f"{change:+.1%} {stats['verdict']}"
+                lines.append(
+                    f"| {query_name} | {ms(stats['p50'])} | {ms(stats['p95'])} | {ms(stats['p99'])} "
+                    f"| {stats['throughput']:.2f} | {stats['errors']} "
+                    f"| {stats.get('buffers_hit', '—')}/{stats.get('buffers_read', '—')} "
+                    f"| {stats.get('index_bytes', 0) / 1024 / 1024:.2f} | {versus} |"
+                )
+            lines.append("")
+        lines.append(f"**{'FAIL' if regressions else 'PASS'}**" + (
+            ": " + ", ".join(f"{variant}/{query} {change:+.1%}" for variant, query, change in regressions)
+            if regressions else ""))
+        with open(f"{self.report_path}.md", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        logger.info(f"Report written to {self.report_path}.md")
+
+    def run(self):
+        if not self.prepare_template():
+            return 2
+        results = []
+        for variant in self.variants:
+            start = time.monotonic()
+            try:
+                results.append(self.run_variant(variant))
+            except ValueError as e:
+                logger.error(f"Variant {variant['name']} failed: {e}")
+                return 2
+            logger.info(f"Variant {variant['name']} done in {time.monotonic() - start:.0f}s")
+        regressions = self.compare(results)
+        self.write_report(results, regressions)
+        return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Usage: python benchmark.py <config.json>")
+        sys.exit(2)
+    with open(sys.argv[1]) as f:
+        config = json.load(f)
+    config["_path"] = sys.argv[1]
+    sys.exit(Benchmark(config).run())
@@ -0,0 +1,170 @@
+import re
+import time
+import select
+import logging
+import threading
+from collections import OrderedDict
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+# Channel the V7 notify_table_change() triggers publish to
+CHANGES_CHANNEL = "table_changes"
+
+TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)', re.IGNORECASE)
+
+
+def referenced_tables(query_sql):
+    """Tables a query reads; CTE names may slip in, which only costs a spurious invalidation."""
+    return frozenset(name.lower() for name in TABLE_RE.findall(query_sql))
+
+
+def cache_key(query_name, values):
+    return query_name, tuple(sorted(values.items()))
+
+
+class CacheEntry:
+    def __init__(self, value, size, tables, expires_at):
+        self.value = value
+        self.size = size
+        self.tables = tables
+        self.expires_at = expires_at
+
+
+class ResultCache:
+    """LRU cache of query results bounded by their total size in bytes.
+
+    Entries expire after their TTL and are dropped as soon as a table they were
+    read from changes. An expired entry may still be served for `stale_seconds`
+    while another worker is already re-running the query, so a popular key
+    expiring does not send every worker to the database at once.
+
+    A result whose tables changed while it was being computed is not stored:
+    it may predate the change.
+    """
+
+    def __init__(self, max_bytes, stale_seconds=0, on_evict=None):
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self.on_evict = on_evict or (lambda entry, reason: None)
+        self._entries = OrderedDict()
+        # key -> version at which its refresh started
+        self._refreshing = {}
+        # table -> version of its last invalidation; None stands for "every table"
+        self._invalidated = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return (value, state) with state "hit", "stale" or "miss".
+
+        On a miss the caller owns the refresh and must call put() or abandon().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._refreshing[key] = self._version
+                return None, "miss"
+            now = time.monotonic()
+            if now < entry.expires_at:
+                self._entries.move_to_end(key)
+                return entry.value, "hit"
+            if key in self._refreshing and now < entry.expires_at + self.stale_seconds:
+                return entry.value, "stale"
+            self._refreshing[key] = self._version
+            return None, "miss"
+
+    def put(self, key, value, size, tables, ttl):
+        with self._lock:
+            started = self._refreshing.pop(key, self._version)
+            if key in self._entries:
+                self._remove(key, "replaced")
+            changed = max((self._invalidated.get(table, -1) for table in tables), default=-1)
+            if size > self.max_bytes or max(changed, self._invalidated.get(None, -1)) >= started:
+                return
+            self._entries[key] = CacheEntry(value, size, tables, time.monotonic() + ttl)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)), "lru")
+
+    def abandon(self, key):
+        with self._lock:
+            self._refreshing.pop(key, None)
+
+    def invalidate(self, table):
+        with self._lock:
+            self._invalidated[table] = self._version
+            self._version += 1
+            stale = [key for key, entry in self._entries.items() if table in entry.tables]
+            for key in stale:
+                self._remove(key, "invalidated")
+            return len(stale)
+
+    def clear(self, reason="cleared"):
+        with self._lock:
+            self._invalidated[None] = self._version
+            self._version += 1
+            for key in list(self._entries):
+                self._remove(key, reason)
+
+    def _remove(self, key, reason):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        # Replacing an entry with a fresh result is not an eviction
+        if reason != "replaced":
+            self.on_evict(entry, reason)
+
+
+class ChangeListener:
+    """LISTENs for table change notifications and invalidates the cache.
+
+    Notifications sent while the listener is disconnected are lost, so the
+    whole cache is cleared whenever the connection is (re)established.
+    """
+
+    def __init__(self, conn_kwargs, cache, on_change=None, reconnect_interval=5):
+        self.conn_kwargs = conn_kwargs
+        self.cache = cache
+        self.on_change = on_change or (lambda table, invalidated: None)
+        self.reconnect_interval = reconnect_interval
+
+    def start(self, stop_event):
+        thread = threading.Thread(target=self._run, args=(stop_event,), name="cache-listener", daemon=True)
+        thread.start()
+        return thread
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.conn_kwargs)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANGES_CHANNEL}")
+        self.cache.clear("resync")
+        logger.info(f"Listening for table changes on {self.conn_kwargs.get('host')}")
+        return conn
+
+    def _run(self, stop_event):
+        conn = None
+        while not stop_event.is_set():
+            try:
+                if conn is None or conn.closed:
+                    conn = self._connect()
+                if select.select([conn], [], [], 1) == ([], [], []):
+                    continue
+                conn.poll()
+                tables = {notify.payload for notify in conn.notifies}
+                conn.notifies.clear()
+                for table in tables:
+                    self.on_change(table, self.cache.invalidate(table))
+            except psycopg2.Error as e:
+                logger.warning(f"Change listener lost its connection: {e}")
+                if conn is not None:
+                    conn.close()
+                conn = None
+                stop_event.wait(self.reconnect_interval)
+        if conn is not None:
+            conn.close()
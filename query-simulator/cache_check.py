@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import logging
+import threading
+from cache import ChangeListener
+
+# The check needs the cache and nothing that would touch the database on its own
+os.environ.update({"CACHE_SIZE_MB": os.getenv("CACHE_SIZE_MB") or "16", "PLAN_SAMPLE_INTERVAL": "0",
+                   "PLAN_STORE": "", "SERVER_STATS_INTERVAL": "0", "WRITE_MATCHES": "0", "RESULTS_DIR": ""})
+
+from simulator import QuerySimulator  # noqa: E402
+
+logger = logging.getLogger("cache_check")
+
+# How long a committed write may take to reach the listener
+NOTIFY_TIMEOUT = 10
+
+
+class CacheCheck:
+    """End-to-end check of the result cache against a migrated database.
+
+    Runs one cacheable query twice with the same parameters and expects the
+    second run to be served from the cache, then makes a statement-level
+    change to a table the query reads (a DELETE matching no rows still fires
+    the V7 trigger) and expects the entry to be invalidated and the third
+    run to go to the database again.
+    """
+
+    def __init__(self, query_name=None):
+        self.simulator = QuerySimulator()
+        self.query_name = query_name
+        self.changed = {}
+        self._notified = threading.Condition()
+
+    def on_change(self, table, invalidated):
+        with self._notified:
+            self.changed[table] = self.changed.get(table, 0) + 1
+            self._notified.notify_all()
+
+    def touch(self, table):
+        """Commit a change to `table` and wait until the listener has seen it."""
+        seen = self.changed.get(table, 0)
+        with self.simulator.router.primary.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {table} WHERE false")
+            conn.commit()
+        with self._notified:
+            return self._notified.wait_for(lambda: self.changed.get(table, 0) > seen, NOTIFY_TIMEOUT)
+
+    def pick_query(self):
+        simulator = self.simulator
+        candidates = [name for name in sorted(simulator.queries)
+                      if simulator.cache_ttls[name] > 0 and simulator.cache_tables[name]]
+        if self.query_name:
+            return self.query_name if self.query_name in candidates else None
+        return candidates[0] if candidates else None
+
+    def pick_table(self, query_name):
+        # referenced_tables() may include CTE names
+        with self.simulator.router.primary.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                for table in sorted(self.simulator.cache_tables[query_name]):
+                    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+                    if cursor.fetchone()[0]:
+                        return table
+        return None
+
+    def run(self):
+        simulator = self.simulator
+        if simulator.cache is None:
+            logger.error("Result cache is disabled")
+            return 1
+        simulator.connect_db()
+        simulator.load_params()
+        query_name = self.pick_query()
+        if query_name is None:
+            logger.error("No cacheable query to check")
+            return 1
+        table = self.pick_table(query_name)
+        if table is None:
+            logger.error(f"{query_name} reads no table that exists")
+            return 1
+        ChangeListener(simulator.get_db_config(), simulator.cache, on_change=self.on_change).start(simulator.stop_event)
+        failures = []
+        try:
+            # The listener clears the cache when it connects; wait for it before filling the cache
+            deadline = time.monotonic() + NOTIFY_TIMEOUT
+            while not self.touch(table):
+                if time.monotonic() > deadline:
+                    logger.error(f"No change notification for {table}; is V7 applied?")
+                    return 1
+
+            # Same parameters every time, so every run maps to the same cache key
+            template = simulator.templates[query_name]
+            drawn = template.draw()
+            template.draw = lambda: drawn
+            cached = simulator.results.cached
+
+            simulator.execute_query(query_name)
+            if cached[query_name] != 0 or len(simulator.cache) != 1:
+                failures.append(f"first run of {query_name} was not stored ({len(simulator.cache)} entries)")
+            simulator.execute_query(query_name)
+            if cached[query_name] != 1:
+                failures.append(f"repeated run of {query_name} was not served from the cache")
+
+            if not self.touch(table):
+                failures.append(f"no change notification for {table}")
+            elif len(simulator.cache) != 0:
+                failures.append(f"change to {table} did not invalidate {query_name}")
+            simulator.execute_query(query_name)
+            if cached[query_name] != 1:
+                failures.append(f"{query_name} was served from the cache after {table} changed")
+        finally:
+            simulator.stop_event.set()
+            simulator.close()
+
+        for failure in failures:
+            logger.error(failure)
+        if not failures:
+            logger.info(f"Result cache OK: {query_name} cached on repeat and invalidated by a change to {table}")
+        return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(CacheCheck(sys.argv[1] if len(sys.argv) > 1 else None).run())
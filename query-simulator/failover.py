@@ -0,0 +1,182 @@
+import json
+import time
+import random
+import logging
+import threading
+import urllib.request
+import psycopg2
+import psycopg2.errors
+
+logger = logging.getLogger(__name__)
+
+# Patroni is asked for the leader at most this often, however many workers fail at once
+LOCATE_INTERVAL = 0.5
+
+# Admin shutdown, crash shutdown, cannot connect now (starting up or shutting down)
+SHUTDOWN_CODES = ("57P01", "57P02", "57P03")
+
+
+def classify(error, conn=None):
+    """What a failed statement says about the node it ran on.
+
+    connection    - the session is gone: node down, restarted or fenced by Patroni
+    read_only     - the node was demoted and no longer accepts writes
+    serialization - the transaction was rolled back (serialization failure,
+                    deadlock, conflict with recovery on a replica)
+    error         - anything else, including server errors that merely share
+                    OperationalError with lost connections (lock timeouts,
+                    disk full, out of memory, too many connections)
+
+    `conn` defaults to the connection of the cursor that raised `error`.
+    """
+    if isinstance(error, psycopg2.errors.TransactionRollbackError):
+        return "serialization"
+    if isinstance(error, psycopg2.errors.ReadOnlySqlTransaction):
+        return "read_only"
+    code = getattr(error, "pgcode", None)
+    if code is not None:
+        # Class 08 is connection exception
+        return "connection" if code.startswith("08") or code in SHUTDOWN_CODES else "error"
+    if conn is None and getattr(error, "cursor", None) is not None:
+        conn = error.cursor.connection
+    # No SQLSTATE: libpq failed to connect or lost the session before the server could answer
+    if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)) and (conn is None or conn.closed):
+        return "connection"
+    return "error"
+
+
+class RetryPolicy:
+    """How often and how soon a failed query is tried again.
+
+    Delays grow exponentially from `base_delay` up to `max_delay` with full
+    jitter, so workers that failed together do not come back together.
+    `max_attempts` counts the first attempt; 1 disables retries.
+    """
+
+    def __init__(self, max_attempts=8, base_delay=0.1, max_delay=5.0, rng=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt):
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** min(attempt, 32)))
+
+    def should_retry(self, kind, attempt, idempotent=True):
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if kind in ("read_only", "serialization"):
+            # Rejected or rolled back by the server; nothing was applied
+            return True
+        # A lost connection may have taken a commit with it
+        return kind == "connection" and idempotent
+
+
+class LeaderLocator:
+    """Asks the Patroni REST API which member currently leads the cluster."""
+
+    def __init__(self, urls, timeout=1.0):
+        self.urls = [url.rstrip("/") for url in urls]
+        self.timeout = timeout
+
+    @classmethod
+    def from_spec(cls, spec, timeout=1.0):
+        # "http://patroni1:8008,http://patroni2:8008,http://patroni3:8008"
+        urls = [item.strip() for item in spec.split(",") if item.strip()]
+        return cls(urls, timeout) if urls else None
+
+    def leader(self):
+        """(host, port) of the running leader, or None while there is none."""
+        for url in self.urls:
+            try:
+                with urllib.request.urlopen(f"{url}/cluster", timeout=self.timeout) as response:
+                    cluster = json.load(response)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Patroni API {url} unavailable: {e}")
+                continue
+            for member in cluster.get("members", []):
+                if member.get("role") == "leader" and member.get("state") == "running":
+                    return member["host"], str(member["port"])
+            # A reachable member without a leader means an election is under way
+            return None
+        return None
+
+
+class FailoverHandler:
+    """Decides what happens after a failed attempt and tracks when nodes are unavailable.
+
+    A node is unavailable from the first connection or read-only failure on
+    it until the next statement succeeds there; the length of that window is
+    reported through `on_recovery(node, seconds)`. After such a failure on
+    the leader pool its idle connections are dropped, and with a
+    `LeaderLocator` the pool is pointed straight at the new leader instead
+    of waiting for HAProxy health checks to notice the failover.
+
+    `on_retry(name, kind)` is called before every retry, `on_give_up(name, kind)`
+    when a query fails for good, `on_outage(node)` when a window opens and
+    `on_leader_change(host, port)` when the leader pool is moved.
+    """
+
+    def __init__(self, policy, stop_event, leader_pool=None, locator=None, on_retry=None, on_give_up=None,
+                 on_outage=None, on_recovery=None, on_leader_change=None):
+        self.policy = policy
+        self.stop_event = stop_event
+        self.leader_pool = leader_pool
+        self.locator = locator
+        self.on_retry = on_retry or (lambda name, kind: None)
+        self.on_give_up = on_give_up or (lambda name, kind: None)
+        self.on_outage = on_outage or (lambda node: None)
+        self.on_recovery = on_recovery or (lambda node, seconds: None)
+        self.on_leader_change = on_leader_change or (lambda host, port: None)
+        self._down = {}
+        self._lock = threading.Lock()
+        self._located_at = 0.0
+
+    def failure(self, pool, kind):
+        if kind not in ("connection", "read_only"):
+            return
+        with self._lock:
+            opened = pool.name not in self._down
+            if opened:
+                self._down[pool.name] = time.monotonic()
+        if opened:
+            logger.warning(f"{pool.name} unavailable ({kind})")
+            self.on_outage(pool.name)
+        if pool is self.leader_pool:
+            self.relocate(pool)
+
+    def success(self, pool):
+        if pool.name not in self._down:
+            return
+        with self._lock:
+            failed_at = self._down.pop(pool.name, None)
+        if failed_at is not None:
+            seconds = time.monotonic() - failed_at
+            logger.info(f"{pool.name} available again after {seconds:.2f}s")
+            self.on_recovery(pool.name, seconds)
+
+    def relocate(self, pool):
+        """Drop connections to the old leader and, when Patroni knows the new one, connect to it directly."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._located_at < LOCATE_INTERVAL:
+                return
+            self._located_at = now
+        leader = self.locator.leader() if self.locator else None
+        if leader and leader != pool.target:
+            logger.warning(f"Leader moved to {leader[0]}:{leader[1]}, reconnecting {pool.name} there")
+            pool.retarget(*leader)
+            self.on_leader_change(*leader)
+        else:
+            pool.reset()
+
+    def retry(self, pool, name, error, attempt, idempotent=True):
+        """Record a failed attempt and wait out its backoff; returns whether to try again."""
+        kind = classify(error)
+        self.failure(pool, kind)
+        if self.policy.should_retry(kind, attempt, idempotent):
+            self.on_retry(name, kind)
+            if not self.stop_event.wait(self.policy.delay(attempt)):
+                return True
+        self.on_give_up(name, kind)
+        return False
@@ -0,0 +1,72 @@
+import time
+import itertools
+
+FETCH_MODES = ("none", "buffered", "stream")
+
+
+def value_size(value):
+    """Approximate size of a value in PostgreSQL's text output format."""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    return len(str(value).encode())
+
+
+class RowConsumer:
+    """Stands in for the application reading the result: counts rows and bytes, keeps them only if asked."""
+
+    def __init__(self, keep=False):
+        self.rows = 0
+        self.bytes = 0
+        self.kept = [] if keep else None
+
+    def consume(self, row):
+        self.rows += 1
+        if self.kept is not None:
+            self.kept.append(row)
+        self.bytes += sum(value_size(value) for value in row)
+
+
+class FetchResult:
+    def __init__(self, first_row, fetch, rows, size, kept=None):
+        # Seconds from the start of execute to the first row in hand
+        self.first_row = first_row
+        # Seconds spent pulling rows after execute returned
+        self.fetch = fetch
+        self.rows = rows
+        self.bytes = size
+        # The rows themselves when fetched with keep_rows, e.g. for the result cache
+        self.kept = kept
+
+
+def fetch_result(conn, statement, args, mode, itersize=2000, name="sim_fetch", keep_rows=False):
+    """Execute a statement and deliver its whole result to a RowConsumer.
+
+    buffered - client-side cursor: execute returns once the full result is in client memory
+    stream   - named server-side cursor: rows arrive in batches of `itersize` via FETCH,
+               so the first row is available before the server has produced the last one
+    """
+    consumer = RowConsumer(keep_rows)
+    if mode == "stream":
+        cursor = conn.cursor(name=name)
+        cursor.itersize = itersize
+    else:
+        cursor = conn.cursor()
+    with cursor:
+        start = time.monotonic()
+        # For a named cursor this only DECLAREs it; the query runs on the first FETCH
+        cursor.execute(statement, args)
+        executed = time.monotonic()
+        # A named cursor has no description before its first FETCH
+        rows = iter(cursor) if mode == "stream" or cursor.description else iter(())
+        first_row = None
+        for row in itertools.islice(rows, 1):
+            first_row = time.monotonic() - start
+            consumer.consume(row)
+        for row in rows:
+            consumer.consume(row)
+        done = time.monotonic()
+    if first_row is None:
+        first_row = done - start
+    return FetchResult(first_row, done - executed, consumer.rows, consumer.bytes, consumer.kept)
@@ -0,0 +1,447 @@
+import os
+import re
+import logging
+from collections import defaultdict
+import psycopg2
+from plans import EXPLAIN_PREFIX, walk
+from router import COMMENT_RE, parse_endpoints
+from simulator import QuerySimulator
+
+logger = logging.getLogger("index_advisor")
+
+MIGRATION_RE = re.compile(r'^V(\d+)__\w+_up\.sql$')
+PREPARE_RE = re.compile(r'^\s*PREPARE\s+\w+(\s*\([^)]*\))?\s+AS\s+', re.IGNORECASE)
+# Literals, psycopg2 placeholders and pg_stat_statements' $n all become "?"
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|\$\d+|\b\d+(?:\.\d+)?\b")
+# "(transfer_date > '2020-01-01'::date)", "(t.surface_type = 'grass'::surface_type)"
+COMPARISON_RE = re.compile(r'(?:\b(\w+)\.)?\b(\w+)\)?\s*(=|<>|<=|>=|<|>|~~)')
+
+INDEXES_QUERY = """
+    SELECT ic.relname, t.relname, am.amname, i.indisunique, i.indisprimary,
+           EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid) AS backs_constraint,
+           -- Foreign keys of the table whose columns are the leading key columns, in any order
+           ARRAY(SELECT c.conname FROM pg_constraint c
+                 WHERE c.contype = 'f' AND c.conrelid = i.indrelid AND i.indpred IS NULL
+                   AND array_length(c.conkey, 1) <= i.indnkeyatts
+                   AND (i.indkey::int2[])[0:array_length(c.conkey, 1) - 1] @> c.conkey
+                   AND (i.indkey::int2[])[0:array_length(c.conkey, 1) - 1] <@ c.conkey
+                 ORDER BY c.conname) AS foreign_keys,
+           i.indpred IS NOT NULL OR i.indexprs IS NOT NULL AS special,
+           ARRAY(SELECT pg_get_indexdef(i.indexrelid, k, true) FROM generate_series(1, i.indnkeyatts) k) AS columns,
+           pg_get_indexdef(i.indexrelid),
+           (SELECT COALESCE(SUM(pg_relation_size(p.relid)), 0) FROM pg_partition_tree(i.indexrelid) p) AS size
+    FROM pg_index i
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    JOIN pg_am am ON am.oid = ic.relam
+    WHERE n.nspname = 'public' AND NOT ic.relispartition
+"""
+
+# Scans of partitioned indexes are counted on their partitions
+INDEX_SCANS_QUERY = """
+    SELECT ic.relname,
+           (SELECT COALESCE(SUM(s.idx_scan), 0) FROM pg_partition_tree(i.indexrelid) p
+            JOIN pg_stat_user_indexes s ON s.indexrelid = p.relid)
+    FROM pg_index i
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_namespace n ON n.oid = ic.relnamespace
+    WHERE n.nspname = 'public' AND NOT ic.relispartition
+"""
+
+# Every insert and non-HOT update adds an entry to each index of the table
+TABLE_WRITES_QUERY = """
+    SELECT t.relname,
+           (SELECT COALESCE(SUM(s.n_tup_ins + s.n_tup_upd - s.n_tup_hot_upd), 0) FROM pg_partition_tree(t.oid) p
+            JOIN pg_stat_user_tables s ON s.relid = p.relid)
+    FROM pg_class t
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = 'public' AND t.relkind IN ('r', 'p') AND NOT t.relispartition
+"""
+
+TABLE_COLUMNS_QUERY = """
+    SELECT c.relname, a.attname
+    FROM pg_attribute a
+    JOIN pg_class c ON c.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+      AND a.attnum > 0 AND NOT a.attisdropped
+"""
+
+# Plans name partitions and their indexes; findings are about the partitioned parents
+PARTITION_ROOTS_QUERY = """
+    SELECT c.relname, r.relname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_class r ON r.oid = pg_partition_root(c.oid)
+    WHERE n.nspname = 'public' AND c.relispartition
+"""
+
+STATEMENTS_QUERY = """
+    SELECT query, calls, total_exec_time, mean_exec_time, shared_blks_hit, shared_blks_read
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+"""
+
+
+def normalize_sql(sql):
+    body = PREPARE_RE.sub('', COMMENT_RE.sub('', sql))
+    body = LITERAL_RE.sub('?', body)
+    return ' '.join(body.split()).rstrip(';').strip().lower()
+
+
+def create_if_not_exists(definition):
+    definition = definition.replace(" ON ONLY ", " ON ", 1)
+    return re.sub(r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX IF NOT EXISTS ', definition) + ";"
+
+
+class IndexInfo:
+    def __init__(self, name, table, method, unique, primary, backs_constraint, foreign_keys, special, columns,
+                 definition, size):
+        self.name = name
+        self.table = table
+        self.method = method
+        self.unique = unique
+        self.primary = primary
+        # Primary keys, unique and exclusion constraints cannot lose their index
+        self.required = primary or backs_constraint
+        # Deletes and key updates on the referenced table look up referencing rows through it
+        self.foreign_keys = list(foreign_keys)
+        self.special = special
+        self.columns = list(columns)
+        self.definition = definition
+        self.size = size
+        self.scans = 0
+        self.used_by = set()
+
+    def covers(self, other):
+        """True if this btree index can serve every lookup `other` can."""
+        return (
+            self.method == other.method == "btree"
+            and not self.special and not other.special
+            and self.columns[:len(other.columns)] == other.columns
+        )
+
+
+class Finding:
+    def __init__(self, kind, index, reason, table_writes=0):
+        self.kind = kind
+        self.index = index
+        self.reason = reason
+        self.table_writes = table_writes
+
+    @property
+    def droppable(self):
+        return self.kind != "FK support"
+
+
+class MissingIndex:
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+        self.queries = set()
+        self.rows_removed = 0
+
+    @property
+    def name(self):
+        return f"idx_{self.table}_{'_'.join(self.columns)}"
+
+    @property
+    def definition(self):
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table}({', '.join(self.columns)});"
+
+
+class IndexAdvisor:
+    """Reports unused, redundant and missing indexes after a simulator workload.
+
+    Index scans are summed over the primary and REPLICA_ENDPOINTS, since the
+    simulator routes reads to replicas and every node keeps its own counters.
+    Plans come from EXPLAIN ANALYZE of every query with a few parameter draws;
+    pg_stat_statements, when installed, supplies call counts and timings.
+    """
+
+    def __init__(self):
+        self.output_dir = os.getenv("ADVISOR_OUTPUT", "/data/index_advisor")
+        self.samples = int(os.getenv("ADVISOR_SAMPLES", 3))
+        self.min_rows_removed = int(os.getenv("ADVISOR_MIN_ROWS_REMOVED", 1000))
+        self.max_selectivity = float(os.getenv("ADVISOR_MAX_SELECTIVITY", 0.05))
+        self.migrations_dir = os.getenv("MIGRATIONS_DIR", "/migrations/up")
+        self.simulator = QuerySimulator()
+        self.indexes = {}
+        self.table_writes = {}
+        self.table_columns = defaultdict(set)
+        self.partition_roots = {}
+        self.statements = {}
+        self.stats_reset = None
+        self.missing = {}
+        self.seq_scans = defaultdict(set)
+
+    def node_kwargs(self):
+        config = self.simulator.get_db_config()
+        nodes = [("primary", config)]
+        for host, port in parse_endpoints(self.simulator.replica_endpoints):
+            nodes.append((f"{host}:{port}", dict(config, host=host, port=port)))
+        return nodes
+
+    def collect_catalog(self, cursor):
+        cursor.execute(INDEXES_QUERY)
+        for row in cursor.fetchall():
+            self.indexes[row[0]] = IndexInfo(*row)
+        cursor.execute(TABLE_WRITES_QUERY)
+        self.table_writes = dict(cursor.fetchall())
+        cursor.execute(TABLE_COLUMNS_QUERY)
+        for table, column in cursor.fetchall():
+            self.table_columns[table].add(column)
+        cursor.execute(PARTITION_ROOTS_QUERY)
+        self.partition_roots = dict(cursor.fetchall())
+        cursor.execute("SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()")
+        self.stats_reset = cursor.fetchone()[0]
+
+    def collect_scans(self):
+        for node, kwargs in self.node_kwargs():
+            try:
+                conn = psycopg2.connect(**kwargs)
+            except psycopg2.OperationalError as e:
+                logger.warning(f"Skipping index scans of {node}: {e}")
+                continue
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(INDEX_SCANS_QUERY)
+                    for name, scans in cursor.fetchall():
+                        if name in self.indexes:
+                            self.indexes[name].scans += scans
+            finally:
+                conn.close()
+
+    def collect_statements(self, cursor):
+        cursor.execute("SELECT to_regclass('pg_stat_statements') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            logger.info("pg_stat_statements is not installed; reporting without call statistics")
+            return
+        cursor.execute(STATEMENTS_QUERY)
+        by_text = {}
+        for query, calls, total, mean, hit, read in cursor.fetchall():
+            stats = by_text.setdefault(normalize_sql(query), [0, 0.0, 0, 0])
+            stats[0] += calls
+            stats[1] += total
+            stats[2] += hit
+            stats[3] += read
+        for query_name, sql in self.simulator.queries.items():
+            stats = by_text.get(normalize_sql(sql))
+            if stats:
+                calls, total, hit, read = stats
+                self.statements[query_name] = {
+                    "calls": calls, "total_ms": total, "mean_ms": total / calls if calls else 0.0,
+                    "blks_hit": hit, "blks_read": read,
+                }
+
+    def root(self, relation):
+        return self.partition_roots.get(relation, relation)
+
+    def filter_columns(self, table, condition, alias=None):
+        """Columns of `table` compared in a condition, equality comparisons first."""
+        equality, other = [], []
+        for qualifier, column, operator in COMPARISON_RE.findall(condition or ""):
+            if alias and qualifier and qualifier != alias:
+                continue
+            if column not in self.table_columns[table] or column in equality or column in other:
+                continue
+            (equality if operator == "=" else other).append(column)
+        return (equality + other)[:3]
+
+    def suggest(self, query_name, table, columns, rows_removed):
+        if not columns:
+            return
+        # Already served by an existing index that the planner chose not to use
+        for index in self.indexes.values():
+            if index.table == table and index.method == "btree" and index.columns[:len(columns)] == columns:
+                return
+        candidate = self.missing.setdefault((table, tuple(columns)), MissingIndex(table, columns))
+        candidate.queries.add(query_name)
+        candidate.rows_removed = max(candidate.rows_removed, rows_removed)
+
+    def analyze_plan(self, query_name, plan):
+        for _, node in walk(plan):
+            index = self.indexes.get(self.root(node.get("Index Name", "")))
+            if index:
+                index.used_by.add(query_name)
+            loops = node.get("Actual Loops", 1)
+            if node.get("Node Type") == "Seq Scan":
+                table = self.root(node["Relation Name"])
+                self.seq_scans[table].add(query_name)
+                removed = node.get("Rows Removed by Filter", 0) * loops
+                kept = node.get("Actual Rows", 0) * loops
+                if removed >= self.min_rows_removed and kept / (kept + removed) <= self.max_selectivity:
+                    self.suggest(query_name, table, self.filter_columns(table, node.get("Filter")), removed)
+            if node.get("Node Type") == "Nested Loop" and "Join Filter" in node:
+                removed = node.get("Rows Removed by Join Filter", 0) * loops
+                inner = node.get("Plans", [])[-1:]
+                if inner and inner[0].get("Node Type") == "Seq Scan" and removed >= self.min_rows_removed:
+                    table = self.root(inner[0]["Relation Name"])
+                    columns = self.filter_columns(table, node["Join Filter"], inner[0].get("Alias"))
+                    self.suggest(query_name, table, columns, removed)
+
+    def collect_plans(self):
+        with self.simulator.router.primary.pool.connection() as conn:
+            for query_name, template in self.simulator.templates.items():
+                for _ in range(self.samples):
+                    values, _ = template.draw()
+                    statement, args = template.plain_sql(values)
+                    try:
+                        with conn.cursor() as cursor:
+                            cursor.execute(EXPLAIN_PREFIX + statement, args)
+                            explain = cursor.fetchone()[0]
+                    except psycopg2.Error as e:
+                        logger.error(f"Could not explain {query_name}: {e}")
+                        conn.rollback()
+                        break
+                    conn.rollback()
+                    result = explain[0] if isinstance(explain, list) else explain
+                    self.analyze_plan(query_name, result["Plan"])
+
+    def findings(self):
+        indexes = sorted(self.indexes.values(), key=lambda index: (index.table, index.name))
+        # Unique indexes enforce data rules even when nothing reads them
+        droppable = [index for index in indexes if not index.required and not index.unique]
+        unused = {index.name for index in droppable if index.scans == 0 and not index.used_by}
+        findings = []
+        for index in droppable:
+            writes = self.table_writes.get(index.table, 0)
+            covering = [
+                other for other in indexes
+                if other is not index and other.table == index.table and other.name not in unused
+                and other.covers(index)
+                # Of two identical indexes keep a required one, then the more used one, then the first by name
+                and (other.required or other.columns != index.columns
+                     or (other.scans, index.name) > (index.scans, other.name))
+            ]
+            if covering:
+                reason = f"covered by {covering[0].name} ({', '.join(covering[0].columns)})"
+                findings.append(Finding("redundant", index, reason, writes))
+            elif index.name in unused and index.foreign_keys:
+                # The workload rarely deletes or rekeys referenced rows, so the foreign key
+                # checks that would scan it never ran; without it each of them scans this table
+                reason = f"no scans, but supports {', '.join(index.foreign_keys)}; kept for referenced deletes"
+                findings.append(Finding("FK support", index, reason, writes))
+            elif index.name in unused:
+                findings.append(Finding("unused", index, "no scans on any node and in no plan", writes))
+        return findings
+
+    def next_version(self):
+        versions = [0]
+        if os.path.isdir(self.migrations_dir):
+            versions += [int(m.group(1)) for m in map(MIGRATION_RE.match, os.listdir(self.migrations_dir)) if m]
+        return max(versions) + 1
+
+    def write_migrations(self, findings, missing):
+        version = self.next_version()
+        up = [f"-- V{version}__index_advisor_up.sql", "-- Candidate generated by index_advisor.py; review before adding to db/migrations", ""]
+        down = [f"-- V{version}__index_advisor_down.sql"]
+        for finding in findings:
+            if not finding.droppable:
+                continue
+            up.append(f"-- {finding.kind}: {finding.reason}")
+            up.append(f"DROP INDEX IF EXISTS {finding.index.name};")
+            down.append(create_if_not_exists(finding.index.definition))
+        for candidate in missing:
+            up.append(f"-- missing: {', '.join(sorted(candidate.queries))}")
+            up.append(candidate.definition)
+            down.append(f"DROP INDEX IF EXISTS {candidate.name};")
+        paths = []
+        for suffix, lines in (("up", up), ("down", down)):
+            path = os.path.join(self.output_dir, f"V{version}__index_advisor_{suffix}.sql")
+            with open(path, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            paths.append(path)
+        return paths
+
+    def write_report(self, findings, missing, migrations):
+        mb = lambda size: f"{size / 1024 / 1024:.2f}"
+        lines = [
+            "# Index advisor",
+            "",
+            f"Statistics since {self.stats_reset or 'cluster start'}; "
+            f"scans summed over {', '.join(node for node, _ in self.node_kwargs())}.",
+            "",
+            "## Unused and redundant indexes",
+            "",
+            "| Index | Table | Kind | Size, MB | Scans | Table writes | Used by | Reason |",
+            "|---|---|---|---|---|---|---|---|",
+        ]
+        for finding in findings:
+            index = finding.index
+            lines.append(
+                f"| {index.name} | {index.table} | {finding.kind} | {mb(index.size)} | {index.scans} "
+                f"| {finding.table_writes} | {', '.join(sorted(index.used_by)) or '—'} | {finding.reason} |"
+            )
+        dropped = [finding for finding in findings if finding.droppable]
+        lines += [
+            "",
+            f"Dropping the unused and redundant ones frees {mb(sum(finding.index.size for finding in dropped))} MB "
+            f"and saves index maintenance on {sum(finding.table_writes for finding in dropped)} row writes so far. "
+            "FK support indexes are left out of the candidate migration.",
+            "",
+            "## Missing indexes",
+            "",
+            "| Table | Columns | Rows filtered out | Queries |",
+            "|---|---|---|---|",
+        ]
+        for candidate in missing:
+            lines.append(f"| {candidate.table} | {', '.join(candidate.columns)} | {candidate.rows_removed} "
+                         f"| {', '.join(sorted(candidate.queries))} |")
+        lines += [
+            "",
+            "## Indexes per table",
+            "",
+            "| Table | Indexes | Size, MB | Row writes | Index entries written |",
+            "|---|---|---|---|---|",
+        ]
+        by_table = defaultdict(list)
+        for index in self.indexes.values():
+            by_table[index.table].append(index)
+        for table in sorted(by_table):
+            writes = self.table_writes.get(table, 0)
+            lines.append(f"| {table} | {len(by_table[table])} | {mb(sum(i.size for i in by_table[table]))} "
+                         f"| {writes} | {writes * len(by_table[table])} |")
+        lines += [
+            "",
+            "## Queries",
+            "",
+            "| Query | Calls | Mean, ms | Blocks hit/read | Indexes used | Sequential scans |",
+            "|---|---|---|---|---|---|",
+        ]
+        for query_name in sorted(self.simulator.queries):
+            stats = self.statements.get(query_name)
+            used = sorted(index.name for index in self.indexes.values() if query_name in index.used_by)
+            scanned = sorted(table for table, queries in self.seq_scans.items() if query_name in queries)
+            calls = f"{stats['calls']} | {stats['mean_ms']:.1f} | {stats['blks_hit']}/{stats['blks_read']}" if stats else "— | — | —"
+            lines.append(f"| {query_name} | {calls} | {', '.join(used) or '—'} | {', '.join(scanned) or '—'} |")
+        lines += ["", "Candidate migrations: " + ", ".join(f"`{os.path.basename(path)}`" for path in migrations)]
+        path = os.path.join(self.output_dir, "report.md")
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def run(self):
+        self.simulator.connect_db()
+        self.simulator.load_params()
+        with self.simulator.router.primary.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                self.collect_catalog(cursor)
+                self.collect_statements(cursor)
+        self.collect_scans()
+        self.collect_plans()
+        self.simulator.close()
+
+        findings = self.findings()
+        dropped = sum(finding.droppable for finding in findings)
+        missing = sorted(self.missing.values(), key=lambda candidate: -candidate.rows_removed)
+        os.makedirs(self.output_dir, exist_ok=True)
+        migrations = self.write_migrations(findings, missing)
+        report = self.write_report(findings, missing, migrations)
+        logger.info(f"{dropped} indexes to drop, {len(findings) - dropped} unscanned FK support indexes kept, "
+                    f"{len(missing)} to add; report written to {report}")
+
+
+if __name__ == '__main__':
+    IndexAdvisor().run()
@@ -0,0 +1,137 @@
+import re
+import random
+import logging
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+# "-- param: since date range transfers.transfer_date"
+PARAM_RE = re.compile(r'^--\s*param\s*:\s*(\w+)\s+(\w+)\s+(\w+)\s+(.+?)\s*$', re.IGNORECASE)
+# Placeholders use psycopg2's named style: %(since)s
+PLACEHOLDER_RE = re.compile(r'%\((\w+)\)s')
+COLUMN_RE = re.compile(r'^(\w+)\.(\w+)$')
+
+GENERATORS = ("sample", "range", "values", "enum")
+
+
+def quartile(position):
+    """Label for a position in [0, 1] within a parameter's distribution."""
+    return f"q{min(3, int(position * 4)) + 1}"
+
+
+class QueryParam:
+    """A typed query parameter and the values it is drawn from.
+
+    Generators:
+      sample table.column  - values sampled from the column, so draws follow the real distribution
+      range table.column   - uniform between the column's MIN and MAX (dates and numbers)
+      values a,b,c         - one of the listed literals
+      enum type_name       - one of the labels of a PostgreSQL enum
+    """
+
+    def __init__(self, name, pg_type, generator, source):
+        if generator not in GENERATORS:
+            raise ValueError(f"Unknown generator '{generator}' for parameter {name}")
+        if generator in ("sample", "range") and not COLUMN_RE.match(source):
+            raise ValueError(f"Parameter {name} expects table.column, got '{source}'")
+        self.name = name
+        self.pg_type = pg_type
+        self.generator = generator
+        self.source = source
+        self.values = []
+        self.bounds = None
+
+    def load(self, cursor, sample_size=1000):
+        if self.generator == "values":
+            self.values = [value.strip() for value in self.source.split(',')]
+        elif self.generator == "enum":
+            cursor.execute("""
+                SELECT e.enumlabel FROM pg_enum e
+                JOIN pg_type t ON e.enumtypid = t.oid
+                WHERE t.typname = %s ORDER BY e.enumsortorder
+            """, (self.source,))
+            self.values = [row[0] for row in cursor.fetchall()]
+        elif self.generator == "sample":
+            table, column = COLUMN_RE.match(self.source).groups()
+            cursor.execute(
+                f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY random() LIMIT %s",
+                (sample_size,)
+            )
+            self.values = sorted(row[0] for row in cursor.fetchall())
+        else:
+            table, column = COLUMN_RE.match(self.source).groups()
+            cursor.execute(f"SELECT MIN({column}), MAX({column}) FROM {table}")
+            low, high = cursor.fetchone()
+            if low is not None:
+                self.bounds = (low, high)
+        if not self.values and self.bounds is None:
+            raise ValueError(f"No values for parameter {self.name} ({self.generator} {self.source})")
+
+    def draw(self, rng):
+        """Return (value, position) where position in [0, 1] locates the value in its distribution."""
+        if self.bounds is None:
+            index = rng.randrange(len(self.values))
+            return self.values[index], index / len(self.values)
+        low, high = self.bounds
+        if isinstance(low, date):
+            span = (high - low).days
+            offset = rng.randint(0, span)
+            return low + timedelta(days=offset), offset / span if span else 0.0
+        if isinstance(low, int):
+            value = rng.randint(low, high)
+        else:
+            low, high = float(low), float(high)
+            value = rng.uniform(low, high)
+        return value, (value - low) / (high - low) if high > low else 0.0
+
+
+def parse_params(query_sql):
+    params = []
+    for line in query_sql.splitlines():
+        match = PARAM_RE.match(line.strip())
+        if match:
+            params.append(QueryParam(*match.groups()))
+    names = {param.name for param in params}
+    missing = set(PLACEHOLDER_RE.findall(query_sql)) - names
+    if missing:
+        raise ValueError(f"Placeholders without a param directive: {sorted(missing)}")
+    return params
+
+
+class QueryTemplate:
+    """Query text plus its parameters, runnable as plain SQL or as a prepared statement."""
+
+    def __init__(self, query_name, query_sql):
+        self.query_name = query_name
+        self.sql = query_sql
+        self.params = parse_params(query_sql)
+        self.statement_name = f"sim_{query_name}"
+        self.rng = random.Random()
+
+    def load(self, cursor, sample_size=1000):
+        for param in self.params:
+            param.load(cursor, sample_size)
+
+    def draw(self):
+        """Draw a value for every parameter: ({name: value}, {name: quartile})."""
+        values, positions = {}, {}
+        for param in self.params:
+            values[param.name], position = param.draw(self.rng)
+            positions[param.name] = quartile(position)
+        return values, positions
+
+    def prepare_sql(self):
+        order = {param.name: i + 1 for i, param in enumerate(self.params)}
+        body = PLACEHOLDER_RE.sub(lambda m: f"${order[m.group(1)]}", self.sql).rstrip().rstrip(';')
+        types = f" ({', '.join(param.pg_type for param in self.params)})" if self.params else ""
+        return f"PREPARE {self.statement_name}{types} AS\n{body}"
+
+    def execute_sql(self, values):
+        """EXECUTE statement and its arguments for cursor.execute."""
+        if not self.params:
+            return f"EXECUTE {self.statement_name}", None
+        placeholders = ', '.join(['%s'] * len(self.params))
+        return f"EXECUTE {self.statement_name} ({placeholders})", [values[param.name] for param in self.params]
+
+    def plain_sql(self, values):
+        return self.sql, (values if self.params else None)
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)\n"
+
+# Node properties that define the plan shape; costs and row counts do not
+SHAPE_KEYS = (
+    "Node Type", "Parent Relationship", "Relation Name", "Index Name",
+    "Join Type", "Strategy", "Partial Mode", "Scan Direction",
+)
+
+BUFFER_KEYS = {
+    "hit": "Shared Hit Blocks",
+    "read": "Shared Read Blocks",
+    "dirtied": "Shared Dirtied Blocks",
+    "written": "Shared Written Blocks",
+    "temp_read": "Temp Read Blocks",
+    "temp_written": "Temp Written Blocks",
+}
+
+
+def walk(node, depth=0):
+    yield depth, node
+    for child in node.get("Plans", []):
+        yield from walk(child, depth + 1)
+
+
+def plan_shape(node):
+    """Indented one-line-per-node outline of a plan tree."""
+    lines = []
+    for depth, item in walk(node):
+        parts = [str(item[key]) for key in SHAPE_KEYS if key in item]
+        lines.append("  " * depth + " ".join(parts))
+    return "\n".join(lines)
+
+
+def fingerprint(shape):
+    return hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+
+def plan_variant(kind, quartiles):
+    """Which plans of a query are expected to share a shape.
+
+    A generic plan is built without the parameter values, so there is one per
+    query. A custom plan may legitimately differ with the values: a rare club
+    gets an index scan, a frequent one a sequential scan. Those are told apart
+    by the quartile of every parameter within its distribution.
+    """
+    if kind == "generic" or not quartiles:
+        return kind
+    return kind + " " + ",".join(f"{name}={quartiles[name]}" for name in sorted(quartiles))
+
+
+class PlanSample:
+    """One EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) result reduced to what we track."""
+
+    def __init__(self, explain):
+        if isinstance(explain, str):
+            explain = json.loads(explain)
+        # EXPLAIN ... FORMAT JSON returns a one-element list
+        result = explain[0] if isinstance(explain, list) else explain
+        plan = result["Plan"]
+        self.shape = plan_shape(plan)
+        self.fingerprint = fingerprint(self.shape)
+        self.total_cost = plan.get("Total Cost", 0.0)
+        self.rows = plan.get("Actual Rows", 0) * plan.get("Actual Loops", 1)
+        self.planning_time = result.get("Planning Time", 0.0) / 1000
+        self.execution_time = result.get("Execution Time", 0.0) / 1000
+        self.buffers = {kind: plan.get(key, 0) for kind, key in BUFFER_KEYS.items()}
+        self.nodes = [
+            {
+                "depth": depth,
+                "node": node.get("Node Type"),
+                "relation": node.get("Relation Name") or node.get("Index Name"),
+                "startup_cost": node.get("Startup Cost"),
+                "total_cost": node.get("Total Cost"),
+                "plan_rows": node.get("Plan Rows"),
+                "actual_rows": node.get("Actual Rows"),
+                "loops": node.get("Actual Loops"),
+                "actual_time": node.get("Actual Total Time"),
+            }
+            for depth, node in walk(plan)
+        ]
+        self.captured_at = time.time()
+
+    def to_dict(self):
+        return {
+            "fingerprint": self.fingerprint,
+            "shape": self.shape,
+            "total_cost": self.total_cost,
+            "rows": self.rows,
+            "planning_time": self.planning_time,
+            "execution_time": self.execution_time,
+            "buffers": self.buffers,
+            "nodes": self.nodes,
+            "captured_at": self.captured_at,
+        }
+
+
+class PlanStore:
+    """Latest plan per query and plan variant, optionally persisted to a JSON file.
+
+    Persisting lets a restarted simulator (for example after a migration)
+    compare new plans against the ones seen before the restart. A new shape
+    replaces the current one only after `confirm` consecutive samples of the
+    same variant, so a one-off plan near a quartile boundary is not reported
+    as a change.
+    """
+
+    def __init__(self, path=None, history=20, confirm=2):
+        self.path = path
+        self.history = history
+        self.confirm = max(1, confirm)
+        self.plans = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.plans = json.load(f)
+                logger.info(f"Loaded plans for {len(self.plans)} queries from {path}")
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not load plan store {path}: {e}")
+            # Stores written before plans were kept per variant have no variant to compare with
+            for query_name in [name for name, entry in self.plans.items() if "current" in entry]:
+                logger.info(f"Discarding stored plan of {query_name}: it has no plan variant")
+                del self.plans[query_name]
+
+    def current(self, query_name, variant):
+        entry = self.plans.get(query_name, {}).get(variant)
+        return entry["current"]["fingerprint"] if entry else None
+
+    def record(self, query_name, variant, sample):
+        """Store `sample`; return the previous fingerprint once a changed plan shape is confirmed."""
+        with self._lock:
+            entry = self.plans.setdefault(query_name, {}).setdefault(
+                variant, {"current": None, "pending": None, "changes": []}
+            )
+            previous = entry["current"]["fingerprint"] if entry["current"] else None
+            changed = previous is not None and previous != sample.fingerprint
+            if changed:
+                pending = entry.get("pending")
+                if pending and pending["fingerprint"] == sample.fingerprint:
+                    pending["samples"] += 1
+                else:
+                    pending = entry["pending"] = {"fingerprint": sample.fingerprint, "samples": 1}
+                if pending["samples"] < self.confirm:
+                    self.save()
+                    return None
+                entry["changes"].append({
+                    "from": previous, "to": sample.fingerprint, "at": sample.captured_at
+                })
+                del entry["changes"][:-self.history]
+            entry["pending"] = None
+            entry["current"] = sample.to_dict()
+            self.save()
+        return previous if changed else None
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.plans, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"Could not save plan store {self.path}: {e}")
+
+
+class PlanSampler:
+    """Decides when a query is due for plan capture: at most once per `interval` seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def due(self, query_name):
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            # The first execution of every query is sampled right away
+            if now < self._next.get(query_name, 0):
+                return False
+            self._next[query_name] = now + self.interval
+            return True
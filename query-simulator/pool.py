@@ -0,0 +1,159 @@
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+from failover import classify
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class SimulatorConnection(psycopg2.extensions.connection):
+    """psycopg2 connection carrying pool bookkeeping."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_used = time.monotonic()
+        self.pool_wait = 0.0
+        # Pool generation the connection was opened in; older ones are dropped on checkin
+        self.generation = 0
+        # Names of statements PREPAREd on this session
+        self.prepared = set()
+
+
+class ConnectionPool:
+    """Bounded pool shared by simulator workers.
+
+    At most `size` connections exist at once; callers block up to `timeout`
+    seconds for a free slot. Connections idle longer than
+    `health_check_interval` are probed with `SELECT 1` before reuse and
+    replaced when broken. `reset()` retires every open connection at once,
+    `retarget()` also moves the pool to another server.
+    """
+
+    def __init__(self, conn_kwargs, size, timeout=30, health_check_interval=30, name="primary"):
+        self.conn_kwargs = conn_kwargs
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.name = name
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._generation = 0
+        self.closed = False
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    @property
+    def target(self):
+        return self.conn_kwargs.get("host"), str(self.conn_kwargs.get("port"))
+
+    def _connect(self):
+        generation = self._generation
+        conn = psycopg2.connect(connection_factory=SimulatorConnection, **self.conn_kwargs)
+        conn.generation = generation
+        logger.info(f"Opened connection to {self.name} ({self.conn_kwargs.get('host')}:{self.conn_kwargs.get('port')})")
+        return conn
+
+    def _is_healthy(self, conn):
+        if conn.closed or conn.generation != self._generation:
+            return False
+        if time.monotonic() - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Health check failed on {self.name}: {e}")
+            return False
+
+    def _checkout(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def _checkin(self, conn, broken=False):
+        if broken or conn.closed or self.closed or conn.generation != self._generation:
+            self._discard(conn)
+            return
+        try:
+            # End the read transaction so idle connections do not pin snapshots
+            conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        self._idle.put(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No free connection in {self.name} pool after {self.timeout}s")
+        waited = time.monotonic() - start
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        conn.pool_wait = waited
+        with self._lock:
+            self._in_use += 1
+        broken = False
+        try:
+            yield conn
+        except psycopg2.Error as e:
+            # A demoted leader keeps the session open but refuses writes on it
+            broken = classify(e, conn) in ("connection", "read_only")
+            raise
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._checkin(conn, broken)
+            self._slots.release()
+
+    def _drain(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def reset(self):
+        """Retire all connections: idle ones now, checked out ones when they come back."""
+        with self._lock:
+            self._generation += 1
+        self._drain()
+
+    def retarget(self, host, port):
+        self.conn_kwargs = dict(self.conn_kwargs, host=host, port=port)
+        logger.info(f"{self.name} pool now connects to {host}:{port}")
+        self.reset()
+
+    def close(self):
+        self.closed = True
+        self._drain()
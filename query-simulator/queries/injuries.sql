@@ -1,4 +1,6 @@
 -- -- Запрос 2: Анализ травм по позициям
+-- weight: 3
+-- param: tournament_id bigint sample matches.tournament_id
 SELECT sl.position, 
        i.injury_type,
        COUNT(*) AS injury_count,
@@ -6,6 +8,8 @@ SELECT sl.position,
 FROM injuries i
 JOIN starting_lineups sl ON i.player_id = sl.player_id 
                          AND i.match_id = sl.match_id
-JOIN matches m ON i.match_id = m.id
+                         AND i.match_date = sl.match_date
+JOIN matches m ON i.match_id = m.id AND i.match_date = m.match_date
 JOIN tournaments t ON m.tournament_id = t.id
+WHERE t.id = %(tournament_id)s
 GROUP BY sl.position, i.injury_type;
\ No newline at end of file
@@ -1,16 +1,21 @@
 -- Запрос 3: Статистика всех игроков во всех играх 
+-- weight: 10
 SELECT p.id
     , p.name
     , p.surname
-    , COUNT(g.goal_id) as goals
-    , COUNT(a.id) as assists
-    , COUNT(f.id) as fouls
-    , COUNT(i.id) as injuries
-    , COUNT(c.id) as clean_sheets
+    , COALESCE(s.goals, 0) as goals
+    , COALESCE(s.assists, 0) as assists
+    , COALESCE(s.fouls, 0) as fouls
+    , COALESCE(s.injuries, 0) as injuries
+    , COALESCE(s.clean_sheets, 0) as clean_sheets
 FROM players p
-LEFT JOIN goals g ON p.id = g.scorer_id
-LEFT JOIN assists a ON p.id = a.assistant_id
-LEFT JOIN fouls f ON p.id = f.player_id
-LEFT JOIN injuries i ON p.id = i.player_id
-LEFT JOIN clean_sheets c ON p.id = c.player_id
-GROUP BY p.id
\ No newline at end of file
+LEFT JOIN (
+    SELECT player_id
+        , SUM(goals) as goals
+        , SUM(assists) as assists
+        , SUM(fouls) as fouls
+        , SUM(injuries) as injuries
+        , SUM(clean_sheets) as clean_sheets
+    FROM player_match_summary
+    GROUP BY player_id
+) s ON p.id = s.player_id
\ No newline at end of file
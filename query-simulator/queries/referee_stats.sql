@@ -1,4 +1,5 @@
 -- Статистика судей по нарушениям и посещаемости
+-- weight: 2
 SELECT 
     r.id AS referee_id,
     r.name || ' ' || r.surname AS referee_name,
@@ -13,7 +14,7 @@ SELECT
     AVG(m.attendance) AS avg_attendance
 FROM referees r
 JOIN matches m ON r.id = m.referee_id
-LEFT JOIN fouls f ON m.id = f.match_id
+LEFT JOIN fouls f ON m.id = f.match_id AND m.match_date = f.match_date
 GROUP BY r.id, r.name, r.surname
 HAVING COUNT(m.id) > 10  
 ORDER BY disciplinary_actions DESC;
\ No newline at end of file
@@ -1,4 +1,6 @@
 -- Запрос 1: Анализ эффективности трансферов
+-- weight: 1
+-- param: since date range transfers.transfer_date
 SELECT t.transfer_type, 
        c1.name AS from_club,
        c2.name AS to_club,
@@ -9,5 +11,5 @@ JOIN players p ON t.player_id = p.id
 JOIN clubs c1 ON t.from_club_id = c1.id
 JOIN clubs c2 ON t.to_club_id = c2.id
 JOIN league_statistics ls ON c2.id = ls.club_id 
-WHERE t.transfer_date > '2022-01-01'
+WHERE t.transfer_date > %(since)s
 GROUP BY t.transfer_type, c1.name, c2.name;
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+# Environment variables describing a run; credentials are never recorded
+CONFIG_PREFIXES = (
+    "SIMULATOR_", "POOL_", "LOAD_", "QUERY_", "REPLICA_", "ROUTING_", "MAX_REPLICA_", "LAG_", "PLAN_",
+    "STATEMENT_", "PARAM_", "FETCH_", "CACHE_", "SERVER_STATS_", "WRITE_", "RESULTS_", "RETRY_", "PATRONI_",
+    "CONNECT_",
+)
+
+SCHEMA_VERSION_QUERY = """
+    SELECT version FROM flyway_schema_history
+    WHERE success AND version IS NOT NULL
+    ORDER BY installed_rank DESC LIMIT 1
+"""
+
+
+class LatencyHistogram:
+    """HDR-style latency histogram in microseconds.
+
+    Values below 2^k microseconds are counted exactly; above that every
+    power-of-two range is split into 2^(k-1) equal sub-buckets, so any
+    recorded value is known to `significant_digits` decimal digits whether
+    it is 200us or 20 minutes. Only non-empty buckets are stored.
+    """
+
+    def __init__(self, significant_digits=3):
+        self.significant_digits = significant_digits
+        self.sub_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.sub_count = 1 << self.sub_bits
+        self.counts = defaultdict(int)
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def _key(self, value):
+        shift = max(0, value.bit_length() - self.sub_bits)
+        return shift * self.sub_count + (value >> shift)
+
+    def _highest(self, key):
+        # Largest value counted in a bucket; percentiles report this bound, as HdrHistogram does
+        shift, sub = divmod(key, self.sub_count)
+        return ((sub + 1) << shift) - 1
+
+    def record(self, seconds):
+        value = max(0, round(seconds * 1e6))
+        self.counts[self._key(value)] += 1
+        self.total += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        if other.significant_digits != self.significant_digits:
+            raise ValueError("Cannot merge histograms of different precision")
+        for key, count in other.counts.items():
+            self.counts[key] += count
+        self.total += other.total
+        self.sum += other.sum
+        for bound, pick in (("min", min), ("max", max)):
+            values = [v for v in (getattr(self, bound), getattr(other, bound)) if v is not None]
+            setattr(self, bound, pick(values) if values else None)
+
+    def percentile(self, q):
+        """Value in seconds at or below which `q` percent of the recorded values lie."""
+        if not self.total:
+            return None
+        rank = max(1, math.ceil(q / 100 * self.total))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                return min(self._highest(key), self.max) / 1e6
+        return self.max / 1e6
+
+    @property
+    def mean(self):
+        return self.sum / self.total / 1e6 if self.total else None
+
+    def to_dict(self):
+        return {
+            "unit": "us",
+            "significant_digits": self.significant_digits,
+            "total": self.total,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "counts": {str(key): count for key, count in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["significant_digits"])
+        histogram.counts.update({int(key): count for key, count in data["counts"].items()})
+        histogram.total = data["total"]
+        histogram.sum = data["sum"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class RunResults:
+    """Latency, error and cache counts of one simulator run, written as a JSON file.
+
+    The file is rewritten in place while the run goes on, so an interrupted
+    run still leaves its latest state behind.
+    """
+
+    def __init__(self, significant_digits=3):
+        self.significant_digits = significant_digits
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.monotonic()
+        self.histograms = defaultdict(lambda: LatencyHistogram(self.significant_digits))
+        self.errors = defaultdict(int)
+        self.cached = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.outages = []
+        self.info = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.histograms[name].record(seconds)
+
+    def error(self, name):
+        with self._lock:
+            self.errors[name] += 1
+
+    def cache_hit(self, name):
+        with self._lock:
+            self.cached[name] += 1
+
+    def retry(self, name):
+        with self._lock:
+            self.retries[name] += 1
+
+    def outage(self, node, seconds):
+        """An unavailability window of `node` that ended now after `seconds`."""
+        with self._lock:
+            self.outages.append({
+                "node": node,
+                "ended_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                "seconds": seconds,
+            })
+
+    def summary(self):
+        elapsed = time.monotonic() - self._started
+        queries = {}
+        with self._lock:
+            for name in sorted(set(self.histograms) | set(self.errors) | set(self.cached) | set(self.retries)):
+                histogram = self.histograms[name]
+                stats = {
+                    "count": histogram.total,
+                    "errors": self.errors[name],
+                    "cached": self.cached[name],
+                    "retries": self.retries[name],
+                    "throughput": histogram.total / elapsed if elapsed else 0.0,
+                    "mean": histogram.mean,
+                    "min": histogram.min / 1e6 if histogram.min is not None else None,
+                    "max": histogram.max / 1e6 if histogram.max is not None else None,
+                }
+                for q in PERCENTILES:
+                    stats[f"p{q:g}"] = histogram.percentile(q)
+                stats["histogram"] = histogram.to_dict()
+                queries[name] = stats
+            outages = list(self.outages)
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "duration_seconds": elapsed,
+            **self.info,
+            "outages": outages,
+            "queries": queries,
+        }
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.summary(), f, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+
+def run_config(queries, weights):
+    """Settings of a run: simulator environment plus a digest of every query text."""
+    return {
+        "env": {key: value for key, value in sorted(os.environ.items()) if key.startswith(CONFIG_PREFIXES)},
+        "weights": dict(sorted(weights.items())),
+        "queries": {name: hashlib.md5(sql.encode()).hexdigest() for name, sql in sorted(queries.items())},
+    }
+
+
+def database_info(cursor):
+    """Schema version applied by Flyway, server version and database size."""
+    cursor.execute("SELECT to_regclass('flyway_schema_history') IS NOT NULL")
+    version = None
+    if cursor.fetchone()[0]:
+        cursor.execute(SCHEMA_VERSION_QUERY)
+        row = cursor.fetchone()
+        version = row[0] if row else None
+    cursor.execute("SELECT current_setting('server_version'), pg_database_size(current_database())")
+    server_version, database_bytes = cursor.fetchone()
+    return {"schema_version": version, "server_version": server_version, "database_bytes": database_bytes}
+
+
+def format_seconds(value):
+    if value is None:
+        return "-"
+    if value < 1:
+        return f"{value * 1000:.2f}ms"
+    return f"{value:.3f}s"
+
+
+def format_change(base, value):
+    if base is None or value is None:
+        return ""
+    if base == 0:
+        return "" if value == 0 else "+inf%"
+    return f"{(value - base) / base * 100:+.1f}%"
+
+
+def show(run):
+    schema = f"V{run['schema_version']}" if run.get("schema_version") else "unknown"
+    print(f"Run {run['started_at']} - {run['finished_at']} ({run['duration_seconds']:.0f}s), schema {schema}")
+    for outage in run.get("outages", []):
+        print(f"{outage['node']} unavailable for {outage['seconds']:.2f}s until {outage['ended_at']}")
+    print("| Query | Count | Errors | Retries | Cached | Throughput | "
+          + " | ".join(f"p{q:g}" for q in PERCENTILES) + " |")
+    print("|---" * (6 + len(PERCENTILES)) + "|")
+    for name, stats in run["queries"].items():
+        percentiles = " | ".join(format_seconds(stats[f"p{q:g}"]) for q in PERCENTILES)
+        print(f"| {name} | {stats['count']} | {stats['errors']} | {stats.get('retries', 0)} | {stats['cached']} | "
+              f"{stats['throughput']:.2f}/s | {percentiles} |")
+
+
+def diff(base, run):
+    """Print what changed between two runs: schema, settings and per-query latency."""
+    for key in ("schema_version", "server_version", "database_bytes"):
+        if base.get(key) != run.get(key):
+            print(f"{key}: {base.get(key)} -> {run.get(key)}")
+    for label, outages in (("base", base.get("outages", [])), ("run", run.get("outages", []))):
+        if outages:
+            print(f"{label} outages: " + ", ".join(f"{o['node']} {o['seconds']:.2f}s" for o in outages))
+    base_config, config = base.get("config", {}), run.get("config", {})
+    for section in ("env", "weights", "queries"):
+        before, after = base_config.get(section, {}), config.get(section, {})
+        for key in sorted(set(before) | set(after)):
+            if before.get(key) != after.get(key):
+                print(f"{section}.{key}: {before.get(key, '-')} -> {after.get(key, '-')}")
+    print()
+    print("| Query | Metric | Base | Run | Change |")
+    print("|---|---|---|---|---|")
+    for name in sorted(set(base["queries"]) | set(run["queries"])):
+        before, after = base["queries"].get(name, {}), run["queries"].get(name, {})
+        for metric in [f"p{q:g}" for q in PERCENTILES] + ["throughput", "errors", "retries"]:
+            old, new = before.get(metric), after.get(metric)
+            if metric == "throughput":
+                shown = (f"{old:.2f}/s" if old is not None else "-", f"{new:.2f}/s" if new is not None else "-")
+            elif metric in ("errors", "retries"):
+                shown = (str(old if old is not None else "-"), str(new if new is not None else "-"))
+            else:
+                shown = (format_seconds(old), format_seconds(new))
+            print(f"| {name} | {metric} | {shown[0]} | {shown[1]} | {format_change(old, new)} |")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python results.py <run.json> | python results.py <base.json> <run.json>")
+        sys.exit(2)
+    runs = []
+    for path in sys.argv[1:]:
+        with open(path) as f:
+            runs.append(json.load(f))
+    if len(runs) == 1:
+        show(runs[0])
+    else:
+        diff(*runs)
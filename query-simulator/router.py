@@ -0,0 +1,139 @@
+import re
+import logging
+import threading
+from pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Replication lag reported as 0 when the replica has replayed everything it received
+LAG_QUERY = """
+    SELECT pg_is_in_recovery(),
+           CASE WHEN NOT pg_is_in_recovery()
+                  OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END
+"""
+
+READ_ONLY_RE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+LOCKING_RE = re.compile(r'\bFOR\s+(UPDATE|SHARE|NO\s+KEY\s+UPDATE|KEY\s+SHARE)\b', re.IGNORECASE)
+COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+
+
+def is_read_only(query_sql):
+    body = COMMENT_RE.sub('', query_sql)
+    return bool(READ_ONLY_RE.match(body)) and not LOCKING_RE.search(body)
+
+
+def parse_endpoints(spec):
+    # "patroni2:5432,patroni3:5432"
+    endpoints = []
+    for item in filter(None, spec.split(',')):
+        host, _, port = item.strip().partition(':')
+        endpoints.append((host, port or "5432"))
+    return endpoints
+
+
+class Endpoint:
+    def __init__(self, name, pool, role):
+        self.name = name
+        self.pool = pool
+        self.role = role
+        self.lag = 0.0
+        self.available = True
+        self.latency = {}
+
+
+class QueryRouter:
+    """Routes read-only queries to replicas and everything else to the primary.
+
+    Replicas whose replication lag exceeds `max_lag` seconds, or that cannot be
+    reached, are taken out of rotation until the next lag check says otherwise.
+    When no replica is eligible reads fall back to the primary.
+    """
+
+    def __init__(self, primary, replicas, policy="round_robin", max_lag=5.0, ewma_alpha=0.2):
+        self.primary = primary
+        self.replicas = replicas
+        self.policy = policy
+        self.max_lag = max_lag
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._next = 0
+
+    @classmethod
+    def from_config(cls, conn_kwargs, replica_spec, pool_kwargs, policy, max_lag):
+        primary = Endpoint("primary", ConnectionPool(conn_kwargs, name="primary", **pool_kwargs), "primary")
+        replicas = []
+        for host, port in parse_endpoints(replica_spec):
+            name = f"{host}:{port}"
+            options = " ".join(filter(None, [conn_kwargs.get("options"), "-c default_transaction_read_only=on"]))
+            replica_kwargs = dict(conn_kwargs, host=host, port=port, options=options)
+            replicas.append(Endpoint(name, ConnectionPool(replica_kwargs, name=name, **pool_kwargs), "replica"))
+        return cls(primary, replicas, policy, max_lag)
+
+    @property
+    def endpoints(self):
+        return [self.primary] + self.replicas
+
+    def eligible_replicas(self):
+        return [r for r in self.replicas if r.available and r.lag <= self.max_lag]
+
+    def route(self, query_name, read_only=True, lag_sensitive=False):
+        if not read_only or lag_sensitive:
+            return self.primary
+        candidates = self.eligible_replicas()
+        if not candidates:
+            return self.primary
+        if self.policy == "least_latency":
+            # Endpoints without a sample for this query are tried first
+            return min(candidates, key=lambda r: r.latency.get(query_name, 0.0))
+        with self._lock:
+            endpoint = candidates[self._next % len(candidates)]
+            self._next += 1
+        return endpoint
+
+    def record(self, endpoint, query_name, duration):
+        previous = endpoint.latency.get(query_name)
+        if previous is None:
+            endpoint.latency[query_name] = duration
+        else:
+            endpoint.latency[query_name] = previous + self.ewma_alpha * (duration - previous)
+
+    def mark_unavailable(self, endpoint):
+        if endpoint.role == "replica" and endpoint.available:
+            logger.warning(f"Replica {endpoint.name} taken out of rotation")
+            endpoint.available = False
+
+    def check_replicas(self):
+        for replica in self.replicas:
+            try:
+                with replica.pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(LAG_QUERY)
+                        in_recovery, lag = cursor.fetchone()
+                replica.lag = float(lag)
+                if not replica.available:
+                    logger.info(f"Replica {replica.name} back in rotation")
+                replica.available = True
+                if not in_recovery:
+                    logger.warning(f"{replica.name} is not in recovery (promoted?), still serving reads")
+            except Exception as e:
+                logger.error(f"Lag check failed on {replica.name}: {e}")
+                self.mark_unavailable(replica)
+
+    def monitor(self, stop_event, interval, on_check=None):
+        while not stop_event.is_set():
+            self.check_replicas()
+            if on_check:
+                on_check(self)
+            stop_event.wait(interval)
+
+    def start_monitor(self, stop_event, interval=5, on_check=None):
+        thread = threading.Thread(target=self.monitor, args=(stop_event, interval, on_check),
+                                  name="lag-monitor", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.pool.close()
@@ -0,0 +1,129 @@
+import os
+import time
+import queue
+import random
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ConstantProfile:
+    def __init__(self, rate):
+        self.rate = rate
+
+    def rate_at(self, elapsed):
+        return self.rate
+
+
+class StepProfile:
+    """Piecewise-constant rate given as [(rate, duration_seconds), ...].
+
+    The last step holds once the schedule is exhausted.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def rate_at(self, elapsed):
+        for rate, duration in self.steps:
+            if elapsed < duration:
+                return rate
+            elapsed -= duration
+        return self.steps[-1][0]
+
+
+class RampProfile:
+    def __init__(self, start_rate, end_rate, duration):
+        self.start_rate = start_rate
+        self.end_rate = end_rate
+        self.duration = duration
+
+    def rate_at(self, elapsed):
+        if elapsed >= self.duration:
+            return self.end_rate
+        return self.start_rate + (self.end_rate - self.start_rate) * elapsed / self.duration
+
+
+def parse_steps(spec):
+    # "10:60,20:60,40:120" -> [(10.0, 60.0), (20.0, 60.0), (40.0, 120.0)]
+    steps = []
+    for item in spec.split(','):
+        rate, duration = item.split(':')
+        steps.append((float(rate), float(duration)))
+    return steps
+
+
+def profile_from_env():
+    kind = os.getenv("LOAD_PROFILE", "constant")
+    if kind == "constant":
+        return ConstantProfile(float(os.getenv("LOAD_RATE", 5)))
+    if kind == "step":
+        return StepProfile(parse_steps(os.getenv("LOAD_STEPS", "5:60,10:60,20:60")))
+    if kind == "ramp":
+        return RampProfile(
+            float(os.getenv("LOAD_RATE_START", 1)),
+            float(os.getenv("LOAD_RATE_END", 50)),
+            float(os.getenv("LOAD_RAMP_SECONDS", 600))
+        )
+    raise ValueError(f"Unknown LOAD_PROFILE: {kind}")
+
+
+class OpenLoopScheduler:
+    """Fires queries at a target arrival rate independent of response times.
+
+    Arrivals are enqueued with their intended start time; workers measure
+    latency from that instant, so time spent queueing behind slow queries is
+    part of the observed latency instead of being silently skipped
+    (coordinated omission).
+    """
+
+    def __init__(self, weights, profile, arrivals="uniform", max_backlog=10000, on_drop=None):
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.profile = profile
+        self.arrivals = arrivals
+        self.max_backlog = max_backlog
+        self.on_drop = on_drop
+        self.queue = queue.Queue()
+        self.rng = random.Random()
+
+    def next_interval(self, rate):
+        if self.arrivals == "poisson":
+            return self.rng.expovariate(rate)
+        return 1.0 / rate
+
+    def run(self, stop_event):
+        start = time.monotonic()
+        intended = start
+        while not stop_event.is_set():
+            rate = self.profile.rate_at(intended - start)
+            if rate <= 0:
+                # Idle step: re-check the profile shortly
+                intended += 0.1
+                stop_event.wait(max(0, intended - time.monotonic()))
+                continue
+
+            intended += self.next_interval(rate)
+            delay = intended - time.monotonic()
+            if delay > 0 and stop_event.wait(delay):
+                break
+
+            query_name = self.rng.choices(self.names, weights=self.weights)[0]
+            if self.queue.qsize() >= self.max_backlog:
+                if self.on_drop:
+                    self.on_drop(query_name)
+                continue
+            self.queue.put((query_name, intended))
+
+    def start(self, stop_event):
+        thread = threading.Thread(target=self.run, args=(stop_event,), name="scheduler", daemon=True)
+        thread.start()
+        logger.info(f"Open-loop scheduler started ({self.arrivals} arrivals, weights {dict(zip(self.names, self.weights))})")
+        return thread
+
+    def next_arrival(self, timeout=1):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
@@ -0,0 +1,172 @@
+import re
+import math
+import logging
+import threading
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+# Every simulator statement starts with this comment; pg_stat_statements keeps
+# the text of the first execution, so the comment maps a queryid to its file
+QUERY_TAG_RE = re.compile(r'/\*\s*query:\s*(\w+)\s*\*/')
+
+STATEMENTS_QUERY = """
+    SELECT query, calls, total_exec_time, mean_exec_time, stddev_exec_time,
+           total_plan_time, plans, shared_blks_hit, shared_blks_read, temp_blks_written, rows, wal_bytes
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+      AND query LIKE '%/* query:%'
+"""
+
+IO_QUERY = """
+    SELECT backend_type, object, context, reads, writes, extends, hits, evictions, fsyncs
+    FROM pg_stat_io
+"""
+IO_OPS = ("reads", "writes", "extends", "hits", "evictions", "fsyncs")
+
+TEMP_QUERY = "SELECT temp_files, temp_bytes FROM pg_stat_database WHERE datname = current_database()"
+
+WAL_QUERY = "SELECT wal_records, wal_fpi, wal_bytes FROM pg_stat_wal"
+WAL_KINDS = ("records", "fpi", "bytes")
+
+# Standbys streaming from this node; empty on replicas without cascading
+REPLICATION_QUERY = """
+    SELECT application_name,
+           COALESCE(pg_wal_lsn_diff(pg_current_wal_lsn(), replay_lsn), 0),
+           COALESCE(EXTRACT(EPOCH FROM write_lag), 0),
+           COALESCE(EXTRACT(EPOCH FROM flush_lag), 0),
+           COALESCE(EXTRACT(EPOCH FROM replay_lag), 0)
+    FROM pg_stat_replication
+"""
+
+
+def tag_query(query_name, query_sql):
+    return f"/* query: {query_name} */\n{query_sql}"
+
+
+class QueryStats:
+    """pg_stat_statements counters of one query, summed over its queryids (e.g. plain and prepared)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.exec_time = 0.0
+        # Sum of squared execution times, to combine stddev across queryids
+        self.exec_square = 0.0
+        self.plans = 0
+        self.plan_time = 0.0
+        self.shared_hit = 0
+        self.shared_read = 0
+        self.temp_written = 0
+        self.rows = 0
+        self.wal_bytes = 0
+
+    def add(self, calls, total, mean, stddev, plan_time, plans, hit, read, temp_written, rows, wal_bytes):
+        self.calls += calls
+        self.exec_time += total
+        self.exec_square += calls * (stddev ** 2 + mean ** 2)
+        self.plans += plans
+        self.plan_time += plan_time
+        self.shared_hit += hit
+        self.shared_read += read
+        self.temp_written += temp_written
+        self.rows += rows
+        self.wal_bytes += int(wal_bytes)
+
+    @property
+    def mean(self):
+        return self.exec_time / self.calls if self.calls else 0.0
+
+    @property
+    def stddev(self):
+        if not self.calls:
+            return 0.0
+        return math.sqrt(max(0.0, self.exec_square / self.calls - self.mean ** 2))
+
+    @property
+    def mean_plan_time(self):
+        return self.plan_time / self.plans if self.plans else 0.0
+
+
+class ServerStatsCollector:
+    """Polls pg_stat_statements, pg_stat_io, WAL, replication and temp file counters of every endpoint.
+
+    Each node keeps its own statistics, so replicas serving reads are polled
+    too. Views that are missing (pg_stat_statements not preloaded, pg_stat_io
+    before PostgreSQL 16) are skipped.
+    """
+
+    def __init__(self, endpoints):
+        # [(node name, conn_kwargs)]
+        self.endpoints = endpoints
+        self._conns = {}
+        self._warned = set()
+
+    def start(self, stop_event, interval, on_poll):
+        thread = threading.Thread(target=self.run, args=(stop_event, interval, on_poll),
+                                  name="server-stats", daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, stop_event, interval, on_poll):
+        while not stop_event.is_set():
+            for node, conn_kwargs in self.endpoints:
+                try:
+                    on_poll(node, self.poll(node, conn_kwargs))
+                except psycopg2.Error as e:
+                    logger.warning(f"Could not poll server statistics of {node}: {e}")
+                    self._close(node)
+            stop_event.wait(interval)
+        for node in list(self._conns):
+            self._close(node)
+
+    def _connect(self, node, conn_kwargs):
+        conn = self._conns.get(node)
+        if conn is None or conn.closed:
+            conn = psycopg2.connect(**conn_kwargs)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            self._conns[node] = conn
+        return conn
+
+    def _close(self, node):
+        conn = self._conns.pop(node, None)
+        if conn is not None:
+            conn.close()
+
+    def _optional(self, cursor, node, view, query):
+        try:
+            cursor.execute(query)
+            return cursor.fetchall()
+        except (psycopg2.errors.UndefinedTable, psycopg2.errors.ObjectNotInPrerequisiteState) as e:
+            if (node, view) not in self._warned:
+                logger.warning(f"{view} is unavailable on {node}: {str(e).strip()}")
+                self._warned.add((node, view))
+            return []
+
+    def poll(self, node, conn_kwargs):
+        conn = self._connect(node, conn_kwargs)
+        queries = {}
+        with conn.cursor() as cursor:
+            for row in self._optional(cursor, node, "pg_stat_statements", STATEMENTS_QUERY):
+                match = QUERY_TAG_RE.search(row[0])
+                if match:
+                    queries.setdefault(match.group(1), QueryStats()).add(*row[1:])
+            io = [
+                (backend_type, obj, context, dict(zip(IO_OPS, values)))
+                for backend_type, obj, context, *values in self._optional(cursor, node, "pg_stat_io", IO_QUERY)
+            ]
+            cursor.execute(TEMP_QUERY)
+            temp_files, temp_bytes = cursor.fetchone()
+            wal = [dict(zip(WAL_KINDS, row)) for row in self._optional(cursor, node, "pg_stat_wal", WAL_QUERY)]
+            replication = []
+            if not self._in_recovery(cursor):
+                cursor.execute(REPLICATION_QUERY)
+                replication = cursor.fetchall()
+        return {"queries": queries, "io": io, "temp_files": temp_files, "temp_bytes": temp_bytes,
+                "wal": wal[0] if wal else {}, "replication": replication}
+
+    def _in_recovery(self, cursor):
+        # pg_current_wal_lsn() cannot be called during recovery
+        cursor.execute("SELECT pg_is_in_recovery()")
+        return cursor.fetchone()[0]
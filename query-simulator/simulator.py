@@ -1,14 +1,28 @@
 import os
 import time
+import signal
 import logging
-from prometheus_client import start_http_server, Histogram
+import threading
+import re
+from prometheus_client import start_http_server, Histogram, Gauge, Counter
 import psycopg2
 from psycopg2.extensions import parse_dsn
+from cache import ChangeListener, ResultCache, cache_key, referenced_tables
+from failover import FailoverHandler, LeaderLocator, RetryPolicy, classify
+from fetch import FETCH_MODES, fetch_result
+from params import QueryTemplate
+from plans import EXPLAIN_PREFIX, PlanSample, PlanSampler, PlanStore, plan_variant
+from pool import PoolTimeout
+from results import RunResults, database_info, run_config
+from router import QueryRouter, is_read_only
+from scheduler import OpenLoopScheduler, profile_from_env
+from server_stats import ServerStatsCollector, tag_query
+from writer import TRANSACTIONS, MatchWriter, References, check_schema
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
@@ -16,77 +30,858 @@ logger = logging.getLogger(__name__)
 QUERY_DURATION = Histogram(
     'query_duration_seconds',
     'Time taken to execute SQL query',
+    ['query_name', 'worker', 'pool_wait', 'node'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, float('inf'))
+)
+POOL_WAIT = Histogram(
+    'pool_wait_seconds',
+    'Time spent waiting for a free pooled connection',
+    ['worker'],
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, float('inf'))
+)
+POOL_IN_USE = Gauge(
+    'pool_connections_in_use',
+    'Connections currently checked out of the pool',
+    ['node']
+)
+ROUTED_QUERIES = Counter(
+    'routed_queries_total',
+    'Queries executed per database node',
+    ['query_name', 'node', 'role']
+)
+REPLICA_LAG = Gauge(
+    'replica_lag_seconds',
+    'Replication lag observed on a replica endpoint',
+    ['node']
+)
+REPLICA_AVAILABLE = Gauge(
+    'replica_in_rotation',
+    'Whether a replica currently receives read traffic (1) or not (0)',
+    ['node']
+)
+QUEUE_DELAY = Histogram(
+    'query_queue_delay_seconds',
+    'Delay between intended and actual query start in open-loop mode',
     ['query_name'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, float('inf'))
+)
+DROPPED_ARRIVALS = Counter(
+    'scheduler_dropped_arrivals_total',
+    'Scheduled queries dropped because the backlog limit was reached',
+    ['query_name']
+)
+TARGET_RATE = Gauge(
+    'scheduler_target_rate',
+    'Target query arrival rate per second in open-loop mode'
+)
+ACTIVE_WORKERS = Gauge(
+    'simulator_workers',
+    'Number of concurrent simulator workers'
+)
+PLAN_ROWS = Gauge(
+    'query_plan_rows',
+    'Rows returned by the last sampled EXPLAIN ANALYZE of a query',
+    ['query_name']
+)
+PLAN_BUFFERS = Gauge(
+    'query_plan_buffers',
+    'Buffer blocks touched by the last sampled EXPLAIN ANALYZE of a query',
+    ['query_name', 'kind']
+)
+PLAN_COST = Gauge(
+    'query_plan_total_cost',
+    'Planner total cost of the last sampled plan',
+    ['query_name']
+)
+PLAN_TIME = Gauge(
+    'query_plan_time_seconds',
+    'Planning and execution time reported by the last sampled EXPLAIN ANALYZE',
+    ['query_name', 'phase']
+)
+PLAN_INFO = Gauge(
+    'query_plan_info',
+    'Fingerprint of the current plan shape of a query per plan kind and parameter quartiles',
+    ['query_name', 'variant', 'fingerprint']
+)
+PLAN_CHANGES = Counter(
+    'query_plan_changes_total',
+    'Plan shape changes detected by plan sampling',
+    ['query_name', 'variant']
+)
+PLAN_CHANGED = Gauge(
+    'query_plan_changed',
+    'Set to 1 for PLAN_ALERT_SECONDS after the plan shape of a query changes',
+    ['query_name']
+)
+PREPARE_DURATION = Histogram(
+    'query_prepare_seconds',
+    'Time taken to PREPARE a query on a connection',
+    ['query_name'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, float('inf'))
+)
+PARAM_DURATION = Histogram(
+    'query_param_duration_seconds',
+    'Query duration by the quartile of the drawn parameter value within its distribution',
+    ['query_name', 'param', 'quartile'],
     buckets=(0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, float('inf'))
 )
+PLAN_CACHE = Gauge(
+    'query_plan_cache_plans',
+    'Generic and custom plans chosen so far for a prepared query on the sampled connection',
+    ['query_name', 'kind']
+)
+TIME_TO_FIRST_ROW = Histogram(
+    'query_time_to_first_row_seconds',
+    'Time from query start until the first result row reached the client',
+    ['query_name', 'fetch_mode'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, float('inf'))
+)
+FETCH_DURATION = Histogram(
+    'query_fetch_seconds',
+    'Time spent fetching and consuming result rows after execute returned',
+    ['query_name', 'fetch_mode'],
+    buckets=(0.0001, 0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, float('inf'))
+)
+RESULT_ROWS = Histogram(
+    'query_result_rows',
+    'Rows returned by a query',
+    ['query_name'],
+    buckets=(1, 10, 100, 1000, 10000, 100000, 1000000, float('inf'))
+)
+RESULT_BYTES = Histogram(
+    'query_result_bytes',
+    'Size of a query result in text format',
+    ['query_name'],
+    buckets=(1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, float('inf'))
+)
+CACHE_REQUESTS = Counter(
+    'query_cache_requests_total',
+    'Result cache lookups by outcome: hit, stale (expired entry served during a refresh) or miss',
+    ['query_name', 'result']
+)
+CACHE_EVICTIONS = Counter(
+    'query_cache_evictions_total',
+    'Entries removed from the result cache',
+    ['reason']
+)
+CACHE_INVALIDATIONS = Counter(
+    'query_cache_invalidations_total',
+    'Cache entries dropped because a table they were read from changed',
+    ['table']
+)
+CACHE_BYTES = Gauge(
+    'query_cache_bytes',
+    'Size of the cached results in text format'
+)
+CACHE_ENTRIES = Gauge(
+    'query_cache_entries',
+    'Number of cached results'
+)
+SERVER_CALLS = Gauge(
+    'server_query_calls',
+    'Executions of a query counted by pg_stat_statements (cumulative)',
+    ['query_name', 'node']
+)
+SERVER_EXEC_TIME = Gauge(
+    'server_query_exec_seconds',
+    'Executor time of a query from pg_stat_statements: mean and stddev per call, total cumulative',
+    ['query_name', 'node', 'stat']
+)
+SERVER_PLAN_TIME = Gauge(
+    'server_query_plan_seconds',
+    'Mean planning time of a query; needs pg_stat_statements.track_planning',
+    ['query_name', 'node']
+)
+SERVER_BLOCKS = Gauge(
+    'server_query_blocks',
+    'Blocks touched by a query from pg_stat_statements (cumulative)',
+    ['query_name', 'node', 'kind']
+)
+SERVER_ROWS = Gauge(
+    'server_query_rows',
+    'Rows returned or affected by a query from pg_stat_statements (cumulative)',
+    ['query_name', 'node']
+)
+SERVER_IO = Gauge(
+    'server_io_operations',
+    'I/O operations from pg_stat_io (cumulative)',
+    ['node', 'backend_type', 'object', 'context', 'op']
+)
+SERVER_TEMP_FILES = Gauge(
+    'server_temp_files',
+    'Temporary files created by sorts and hashes that spilled to disk (cumulative)',
+    ['node']
+)
+SERVER_TEMP_BYTES = Gauge(
+    'server_temp_bytes',
+    'Bytes written to temporary files (cumulative)',
+    ['node']
+)
+SERVER_QUERY_WAL = Gauge(
+    'server_query_wal_bytes',
+    'WAL generated by a query from pg_stat_statements (cumulative)',
+    ['query_name', 'node']
+)
+SERVER_WAL = Gauge(
+    'server_wal',
+    'WAL records, full page images and bytes generated by a node from pg_stat_wal (cumulative)',
+    ['node', 'kind']
+)
+SERVER_REPLICATION_LAG = Gauge(
+    'server_replication_lag_seconds',
+    'Write, flush and replay lag of a standby as reported by pg_stat_replication on its upstream',
+    ['node', 'standby', 'kind']
+)
+SERVER_REPLICATION_LAG_BYTES = Gauge(
+    'server_replication_lag_bytes',
+    'WAL generated on a node but not yet replayed by a standby',
+    ['node', 'standby']
+)
+WRITE_DURATION = Histogram(
+    'write_transaction_seconds',
+    'Time taken by a live match write transaction, commit included',
+    ['transaction'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, float('inf'))
+)
+WRITE_COMMITS = Counter(
+    'write_commits_total',
+    'Committed live match write transactions',
+    ['transaction']
+)
+WRITE_ERRORS = Counter(
+    'write_errors_total',
+    'Live match write transactions rolled back after an error',
+    ['transaction']
+)
+WRITE_ROWS = Counter(
+    'write_rows_total',
+    'Rows inserted or updated by live match writers',
+    ['table']
+)
+LIVE_MATCHES = Gauge(
+    'simulator_live_matches',
+    'Number of concurrent live match writers'
+)
+QUERY_RETRIES = Counter(
+    'query_retries_total',
+    'Queries and write transactions run again after a failed attempt',
+    ['query_name', 'reason']
+)
+QUERY_FAILURES = Counter(
+    'query_failures_total',
+    'Queries and write transactions that failed for good',
+    ['query_name', 'reason']
+)
+QUERY_RECOVERY = Histogram(
+    'query_recovery_seconds',
+    'Time from the first failed attempt of a query to its successful retry',
+    ['query_name'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, float('inf'))
+)
+ENDPOINT_AVAILABLE = Gauge(
+    'endpoint_available',
+    'Set to 0 while a node fails every statement after a connection loss or demotion',
+    ['node']
+)
+ENDPOINT_OUTAGES = Counter(
+    'endpoint_outages_total',
+    'Unavailability windows seen by the simulator',
+    ['node']
+)
+ENDPOINT_UNAVAILABLE = Histogram(
+    'endpoint_unavailable_seconds',
+    'Length of an unavailability window, from the first failure to the next success on the node',
+    ['node'],
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 15, 20, 30, 60, 120, float('inf'))
+)
+LEADER_CHANGES = Counter(
+    'leader_changes_total',
+    'Times the primary pool was moved to a new leader found through the Patroni API'
+)
+
+# Waits shorter than this are treated as an immediately available connection
+POOL_WAIT_THRESHOLD = 0.001
+
+# Header lines like "-- weight: 10" configure a query file
+DIRECTIVE_RE = re.compile(r'^--\s*(\w+)\s*:\s*(.+?)\s*$')
+
+
+def parse_directives(query_sql):
+    directives = {}
+    for line in query_sql.splitlines():
+        match = DIRECTIVE_RE.match(line.strip())
+        if match:
+            directives[match.group(1).lower()] = match.group(2)
+    return directives
+
+
+def parse_weights(spec):
+    # "player_stats=10,transfers_effeciency=1"
+    weights = {}
+    for item in filter(None, spec.split(',')):
+        name, weight = item.split('=')
+        weights[name.strip()] = float(weight)
+    return weights
+
 
 class QuerySimulator:
     def __init__(self):
-        self.conn = None
+        self.router = None
         self.queries = {}
+        self.templates = {}
+        self.weights = {}
+        self.routes = {}
+        self.mode = os.getenv("LOAD_MODE", "closed")
+        self.workers = int(os.getenv("SIMULATOR_WORKERS", 1))
+        self.write_matches = int(os.getenv("WRITE_MATCHES", 0))
+        self.write_match_seconds = float(os.getenv("WRITE_MATCH_SECONDS", 90))
+        self.write_pause_seconds = float(os.getenv("WRITE_PAUSE_SECONDS", 5))
+        # Writers hold a connection only for the duration of a transaction
+        self.pool_size = int(os.getenv("POOL_SIZE") or self.workers + self.write_matches)
+        self.pool_timeout = float(os.getenv("POOL_TIMEOUT", 30))
+        self.health_check_interval = float(os.getenv("POOL_HEALTH_CHECK_INTERVAL", 30))
+        self.replica_endpoints = os.getenv("REPLICA_ENDPOINTS", "")
+        self.routing_policy = os.getenv("ROUTING_POLICY", "round_robin")
+        self.max_replica_lag = float(os.getenv("MAX_REPLICA_LAG", 5))
+        self.lag_check_interval = float(os.getenv("LAG_CHECK_INTERVAL", 5))
+        self.statement_mode = os.getenv("STATEMENT_MODE", "simple")
+        if self.statement_mode not in ("simple", "prepared"):
+            raise ValueError(f"Unknown STATEMENT_MODE: {self.statement_mode}")
+        self.plan_cache_mode = os.getenv("PLAN_CACHE_MODE", "auto")
+        self.param_sample_size = int(os.getenv("PARAM_SAMPLE_SIZE", 1000))
+        self.fetch_mode = os.getenv("FETCH_MODE", "none")
+        if self.fetch_mode not in FETCH_MODES:
+            raise ValueError(f"Unknown FETCH_MODE: {self.fetch_mode}")
+        if self.fetch_mode == "stream" and self.statement_mode == "prepared":
+            # DECLARE ... CURSOR FOR accepts SELECT or VALUES, not EXECUTE
+            raise ValueError("FETCH_MODE=stream cannot be combined with STATEMENT_MODE=prepared")
+        self.fetch_itersize = int(os.getenv("FETCH_ITERSIZE", 2000))
+        self.cache = None
+        self.cache_ttls = {}
+        self.cache_tables = {}
+        self.cache_ttl = float(os.getenv("CACHE_TTL", 60))
+        cache_mb = float(os.getenv("CACHE_SIZE_MB", 0))
+        if cache_mb > 0:
+            self.cache = ResultCache(
+                int(cache_mb * 1024 * 1024),
+                stale_seconds=float(os.getenv("CACHE_STALE_SECONDS", 5)),
+                on_evict=lambda entry, reason: CACHE_EVICTIONS.labels(reason=reason).inc()
+            )
+        self.stop_event = threading.Event()
+        self.scheduler = None
+        self.plan_sampler = PlanSampler(float(os.getenv("PLAN_SAMPLE_INTERVAL", 0)))
+        self.plan_store = PlanStore(os.getenv("PLAN_STORE") or None,
+                                    confirm=int(os.getenv("PLAN_CONFIRM_SAMPLES", 2)))
+        self.plan_alert_seconds = float(os.getenv("PLAN_ALERT_SECONDS", 3600))
+        self.plan_changed_at = {}
+        self.server_stats_interval = float(os.getenv("SERVER_STATS_INTERVAL", 15))
+        self.results = RunResults(int(os.getenv("RESULTS_PRECISION", 3)))
+        self.results_path = None
+        results_dir = os.getenv("RESULTS_DIR")
+        if results_dir:
+            started = self.results.started_at.strftime("%Y%m%d-%H%M%S")
+            self.results_path = os.path.join(results_dir, f"run-{started}.json")
+        self.results_interval = float(os.getenv("RESULTS_INTERVAL", 60))
+        self.connect_timeout = int(os.getenv("CONNECT_TIMEOUT", 3))
+        self.retry_policy = RetryPolicy(
+            max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", 8)),
+            base_delay=float(os.getenv("RETRY_BASE_DELAY", 0.1)),
+            max_delay=float(os.getenv("RETRY_MAX_DELAY", 5))
+        )
+        self.leader_locator = LeaderLocator.from_spec(os.getenv("PATRONI_API", ""))
+        self.failover = None
+        self.idempotent = {}
         self.load_queries()
-        
+
     def load_queries(self):
-        queries_dir = os.path.join(os.path.dirname(__file__), 'queries')
+        queries_dir = os.getenv("QUERIES_DIR") or os.path.join(os.path.dirname(__file__), 'queries')
         for filename in os.listdir(queries_dir):
             if filename.endswith('.sql'):
                 query_name = os.path.splitext(filename)[0]
                 with open(os.path.join(queries_dir, filename), 'r') as f:
                     self.queries[query_name] = f.read()
+                # The leading comment ties pg_stat_statements entries to the query file
+                self.templates[query_name] = QueryTemplate(query_name, tag_query(query_name, self.queries[query_name]))
+                directives = parse_directives(self.queries[query_name])
+                self.weights[query_name] = float(directives.get('weight', 1))
+                # "-- route: primary" pins a query to the leader, "-- lag_sensitive: true" too
+                read_only = directives.get('route', 'auto') != 'primary' and is_read_only(self.queries[query_name])
+                lag_sensitive = directives.get('lag_sensitive', 'false').lower() == 'true'
+                self.routes[query_name] = (read_only, lag_sensitive)
+                # Only idempotent queries are retried after a lost connection
+                idempotent = directives.get('idempotent', str(is_read_only(self.queries[query_name])))
+                self.idempotent[query_name] = idempotent.lower() == 'true'
+                # "-- cache_ttl: 0" keeps a query out of the result cache
+                self.cache_ttls[query_name] = float(directives.get('cache_ttl', self.cache_ttl))
+                self.cache_tables[query_name] = referenced_tables(self.queries[query_name])
+        self.weights.update(parse_weights(os.getenv("QUERY_WEIGHTS", "")))
         logger.info(f"Loaded {len(self.queries)} queries")
 
+    def get_db_config(self):
+        return {
+            "dbname": os.getenv('DB_NAME'),
+            "user": os.getenv('DB_ADMIN_USER'),
+            "password": os.getenv('DB_ADMIN_PASSWORD'),
+            "host": os.getenv("POSTGRES_HOST", "haproxy"),
+            "port": os.getenv("POSTGRES_PORT", 5000),
+            # auto, force_custom_plan or force_generic_plan; matters for STATEMENT_MODE=prepared
+            "options": f"-c plan_cache_mode={self.plan_cache_mode}",
+            "application_name": "query-simulator",
+            # Fail fast on a dead node instead of hanging in connect during failover
+            "connect_timeout": self.connect_timeout,
+        }
+
     def connect_db(self):
         try:
-            self.conn = psycopg2.connect(
-                dbname=os.getenv('DB_NAME'),
-                user=os.getenv('DB_ADMIN_USER'),
-                password=os.getenv('DB_ADMIN_PASSWORD'),
-                host=os.getenv("POSTGRES_HOST", "haproxy"),
-                port=os.getenv("POSTGRES_PORT", 5000)
+            router = QueryRouter.from_config(
+                self.get_db_config(),
+                self.replica_endpoints,
+                pool_kwargs={
+                    "size": self.pool_size,
+                    "timeout": self.pool_timeout,
+                    "health_check_interval": self.health_check_interval,
+                },
+                policy=self.routing_policy,
+                max_lag=self.max_replica_lag
+            )
+            # Open the first connection eagerly so misconfiguration fails fast
+            with router.primary.pool.connection():
+                pass
+            self.router = router
+            self.failover = FailoverHandler(
+                self.retry_policy,
+                self.stop_event,
+                leader_pool=router.primary.pool,
+                locator=self.leader_locator,
+                on_retry=self.record_retry,
+                on_give_up=lambda name, reason: QUERY_FAILURES.labels(query_name=name, reason=reason).inc(),
+                on_outage=self.record_outage,
+                on_recovery=self.record_recovery,
+                on_leader_change=lambda host, port: LEADER_CHANGES.inc()
             )
-            logger.info("Connected to PostgreSQL database")
+            for endpoint in router.endpoints:
+                ENDPOINT_AVAILABLE.labels(node=endpoint.name).set(1)
+            logger.info(f"Connected to PostgreSQL database (pool size {self.pool_size}, "
+                        f"{len(router.replicas)} replicas, {self.routing_policy} routing)")
         except psycopg2.OperationalError as e:
             logger.error(f"Connection failed: {e}")
             raise
 
-    def execute_query(self, query_name, query_sql):
+    def load_params(self):
+        """Sample parameter values from the database; queries whose parameters cannot be loaded are dropped."""
+        with self.router.primary.pool.connection() as conn:
+            for query_name, template in list(self.templates.items()):
+                if not template.params:
+                    continue
+                try:
+                    with conn.cursor() as cursor:
+                        template.load(cursor, self.param_sample_size)
+                    logger.info(f"Loaded parameters of {query_name}: {', '.join(p.name for p in template.params)}")
+                except (psycopg2.Error, ValueError) as e:
+                    conn.rollback()
+                    logger.error(f"Disabling {query_name}, could not load its parameters: {e}")
+                    del self.queries[query_name]
+                    del self.templates[query_name]
+
+    def prepare(self, conn, template):
+        if template.statement_name in conn.prepared:
+            return
+        start = time.monotonic()
+        with conn.cursor() as cursor:
+            cursor.execute(template.prepare_sql())
+        PREPARE_DURATION.labels(query_name=template.query_name).observe(time.monotonic() - start)
+        conn.prepared.add(template.statement_name)
+
+    def execute_query(self, query_name, worker="0", intended_start=None):
+        template = self.templates[query_name]
+        values, quartiles = template.draw()
+        key = None
+        if self.cache is not None and self.cache_ttls[query_name] > 0:
+            key = cache_key(query_name, values)
+            rows, state = self.cache.get(key)
+            CACHE_REQUESTS.labels(query_name=query_name, result=state).inc()
+            if state != "miss":
+                logger.info(f"Served {query_name} from cache ({state}, {len(rows)} rows)")
+                self.results.cache_hit(query_name)
+                return 0.0
+        read_only, lag_sensitive = self.routes.get(query_name, (False, False))
+        # Cached results have to be read; without a fetch mode they are read buffered
+        fetch_mode = self.fetch_mode if key is None or self.fetch_mode != "none" else "buffered"
+        attempt = 0
+        failed_at = None
+        try:
+            while True:
+                endpoint = self.router.route(query_name, read_only, lag_sensitive)
+                began = time.monotonic()
+                try:
+                    duration = self.run_query(query_name, template, values, quartiles, endpoint, worker,
+                                              intended_start, fetch_mode, key, queued=attempt == 0)
+                    key = None
+                    self.failover.success(endpoint.pool)
+                    if failed_at is not None:
+                        QUERY_RECOVERY.labels(query_name=query_name).observe(time.monotonic() - failed_at)
+                    return duration
+                except PoolTimeout as e:
+                    logger.error(f"Error executing {query_name}: {e}")
+                    QUERY_FAILURES.labels(query_name=query_name, reason="pool_timeout").inc()
+                    self.results.error(query_name)
+                    return None
+                except psycopg2.Error as e:
+                    logger.error(f"Error executing {query_name} on {endpoint.name} (attempt {attempt + 1}): {e}")
+                    if classify(e) == "connection":
+                        # Retries of reads then go to another replica or the primary
+                        self.router.mark_unavailable(endpoint)
+                    if failed_at is None:
+                        failed_at = time.monotonic()
+                        # A retried query is timed from its first attempt
+                        intended_start = intended_start if intended_start is not None else began
+                    if not self.failover.retry(endpoint.pool, query_name, e, attempt,
+                                               self.idempotent.get(query_name, False)):
+                        self.results.error(query_name)
+                        return None
+                    attempt += 1
+        finally:
+            if key is not None:
+                # The query failed; let the next caller refresh the entry
+                self.cache.abandon(key)
+
+    def run_query(self, query_name, template, values, quartiles, endpoint, worker, intended_start, fetch_mode, key,
+                  queued=True):
+        """One attempt at a query on `endpoint`; returns its duration, raises what the attempt raised."""
         try:
-            with self.conn.cursor() as cursor:
-                start_time = time.time()
-                cursor.execute(query_sql)
-                duration = time.time() - start_time
-                QUERY_DURATION.labels(query_name=query_name).observe(duration)
-                logger.info(f"Executed {query_name} in {duration:.4f}s")
+            with endpoint.pool.connection() as conn:
+                POOL_IN_USE.labels(node=endpoint.name).set(endpoint.pool.in_use)
+                POOL_WAIT.labels(worker=worker).observe(conn.pool_wait)
+                pool_wait = "queued" if conn.pool_wait >= POOL_WAIT_THRESHOLD else "none"
+                if self.statement_mode == "prepared":
+                    self.prepare(conn, template)
+                    statement, args = template.execute_sql(values)
+                else:
+                    statement, args = template.plain_sql(values)
+                start_time = time.monotonic()
+                if intended_start is None:
+                    intended_start = start_time
+                elif queued:
+                    QUEUE_DELAY.labels(query_name=query_name).observe(start_time - intended_start)
+                if fetch_mode == "none":
+                    with conn.cursor() as cursor:
+                        cursor.execute(statement, args)
+                else:
+                    # Duration then covers delivering the whole result, not just execute
+                    result = fetch_result(conn, statement, args, fetch_mode, self.fetch_itersize,
+                                          name=f"fetch_{query_name}", keep_rows=key is not None)
+                    TIME_TO_FIRST_ROW.labels(query_name=query_name, fetch_mode=fetch_mode).observe(result.first_row)
+                    FETCH_DURATION.labels(query_name=query_name, fetch_mode=fetch_mode).observe(result.fetch)
+                    RESULT_ROWS.labels(query_name=query_name).observe(result.rows)
+                    RESULT_BYTES.labels(query_name=query_name).observe(result.bytes)
+                    if key is not None:
+                        self.cache.put(key, result.kept, result.bytes, self.cache_tables[query_name],
+                                       self.cache_ttls[query_name])
+                # In open-loop mode this includes queueing behind earlier arrivals
+                duration = time.monotonic() - intended_start
+                QUERY_DURATION.labels(
+                    query_name=query_name, worker=worker, pool_wait=pool_wait, node=endpoint.name
+                ).observe(duration)
+                for param, quartile in quartiles.items():
+                    PARAM_DURATION.labels(query_name=query_name, param=param, quartile=quartile).observe(duration)
+                ROUTED_QUERIES.labels(query_name=query_name, node=endpoint.name, role=endpoint.role).inc()
+                self.results.record(query_name, duration)
+                self.router.record(endpoint, query_name, time.monotonic() - start_time)
+                logger.info(f"Executed {query_name} on {endpoint.name} in {duration:.4f}s")
+                if self.plan_sampler.due(query_name):
+                    self.capture_plan(query_name, statement, args, quartiles, conn)
                 return duration
-        except Exception as e:
-            logger.error(f"Error executing {query_name}: {e}")
+        finally:
+            POOL_IN_USE.labels(node=endpoint.name).set(endpoint.pool.in_use)
+
+    def capture_plan(self, query_name, statement, args, quartiles, conn):
+        """Run the query under EXPLAIN (ANALYZE, BUFFERS) and export what its plan did."""
+        plan_kind = "custom"
+        try:
+            with conn.cursor() as cursor:
+                before = self.prepared_plans(cursor, query_name)
+                # For prepared statements this is EXPLAIN EXECUTE, showing the cached plan in use
+                cursor.execute(EXPLAIN_PREFIX + statement, args)
+                explain = cursor.fetchone()[0]
+                plans = self.prepared_plans(cursor, query_name)
+                if plans:
+                    PLAN_CACHE.labels(query_name=query_name, kind="generic").set(plans[0])
+                    PLAN_CACHE.labels(query_name=query_name, kind="custom").set(plans[1])
+                    # The EXPLAIN EXECUTE above counted as one more generic or custom plan
+                    if before and plans[0] > before[0]:
+                        plan_kind = "generic"
+        except psycopg2.Error as e:
+            logger.error(f"Error capturing plan of {query_name}: {e}")
+            conn.rollback()
+            return
+        # EXPLAIN ANALYZE really executes the statement; never keep its effects
+        conn.rollback()
+
+        sample = PlanSample(explain)
+        PLAN_ROWS.labels(query_name=query_name).set(sample.rows)
+        PLAN_COST.labels(query_name=query_name).set(sample.total_cost)
+        PLAN_TIME.labels(query_name=query_name, phase="planning").set(sample.planning_time)
+        PLAN_TIME.labels(query_name=query_name, phase="execution").set(sample.execution_time)
+        for kind, blocks in sample.buffers.items():
+            PLAN_BUFFERS.labels(query_name=query_name, kind=kind).set(blocks)
+
+        # Plans are only compared within a variant: generic vs custom, and custom
+        # plans by parameter quartile, which may legitimately have different shapes
+        variant = plan_variant(plan_kind, quartiles)
+        previous = self.plan_store.record(query_name, variant, sample)
+        if previous:
+            try:
+                PLAN_INFO.remove(query_name, variant, previous)
+            except KeyError:
+                pass
+        # An unconfirmed new shape leaves the current one in place
+        current = self.plan_store.current(query_name, variant)
+        PLAN_INFO.labels(query_name=query_name, variant=variant, fingerprint=current).set(1)
+        if previous:
+            logger.warning(f"Plan of {query_name} ({variant}) changed from {previous} to {sample.fingerprint}:\n"
+                           f"{sample.shape}")
+            PLAN_CHANGES.labels(query_name=query_name, variant=variant).inc()
+            PLAN_CHANGED.labels(query_name=query_name).set(1)
+            self.plan_changed_at[query_name] = time.monotonic()
+
+    def prepared_plans(self, cursor, query_name):
+        """(generic_plans, custom_plans) of the query's prepared statement on this connection."""
+        if self.statement_mode != "prepared":
             return None
+        cursor.execute(
+            "SELECT generic_plans, custom_plans FROM pg_prepared_statements WHERE name = %s",
+            (self.templates[query_name].statement_name,)
+        )
+        return cursor.fetchone()
 
-    def run_queries(self):
-        while True:
+    def expire_plan_alerts(self):
+        now = time.monotonic()
+        for query_name, changed_at in list(self.plan_changed_at.items()):
+            if now - changed_at >= self.plan_alert_seconds:
+                PLAN_CHANGED.labels(query_name=query_name).set(0)
+                del self.plan_changed_at[query_name]
+
+    def worker_loop(self, worker):
+        failures = 0
+        while not self.stop_event.is_set():
             try:
-                if not self.conn or self.conn.closed:
-                    self.connect_db()
-                
-                for query_name, query_sql in self.queries.items():
-                    self.execute_query(query_name, query_sql)
-                
+                for query_name in list(self.queries):
+                    if self.stop_event.is_set():
+                        break
+                    self.execute_query(query_name, worker)
+                failures = 0
+
                 # Interval between query cycles
-                time.sleep(2)
-                
-            except KeyboardInterrupt:
-                logger.info("Stopping query simulator")
-                break
+                self.stop_event.wait(2)
+
             except Exception as e:
                 logger.error(f"Error in query cycle: {e}")
-                time.sleep(10)
+                self.stop_event.wait(self.retry_policy.delay(failures))
+                failures += 1
+
+    def open_loop_worker(self, worker):
+        while not self.stop_event.is_set():
+            arrival = self.scheduler.next_arrival()
+            if arrival is None:
+                continue
+            query_name, intended_start = arrival
+            self.execute_query(query_name, worker, intended_start)
+
+    def start_scheduler(self):
+        profile = profile_from_env()
+        weights = {name: weight for name, weight in self.weights.items() if name in self.queries and weight > 0}
+        self.scheduler = OpenLoopScheduler(
+            weights,
+            profile,
+            arrivals=os.getenv("LOAD_ARRIVALS", "uniform"),
+            max_backlog=int(os.getenv("LOAD_MAX_BACKLOG", 10000)),
+            on_drop=lambda query_name: DROPPED_ARRIVALS.labels(query_name=query_name).inc()
+        )
+        TARGET_RATE.set(profile.rate_at(0))
+        return self.scheduler.start(self.stop_event)
+
+    def export_replica_state(self, router):
+        for replica in router.replicas:
+            REPLICA_LAG.labels(node=replica.name).set(replica.lag)
+            in_rotation = replica.available and replica.lag <= router.max_lag
+            REPLICA_AVAILABLE.labels(node=replica.name).set(1 if in_rotation else 0)
+            if replica.available:
+                # Reads stay off a failed replica, so its lag check is what ends the window
+                self.failover.success(replica.pool)
+
+    def export_server_stats(self, node, snapshot):
+        for query_name, stats in snapshot["queries"].items():
+            SERVER_CALLS.labels(query_name=query_name, node=node).set(stats.calls)
+            # pg_stat_statements reports milliseconds
+            SERVER_EXEC_TIME.labels(query_name=query_name, node=node, stat="mean").set(stats.mean / 1000)
+            SERVER_EXEC_TIME.labels(query_name=query_name, node=node, stat="stddev").set(stats.stddev / 1000)
+            SERVER_EXEC_TIME.labels(query_name=query_name, node=node, stat="total").set(stats.exec_time / 1000)
+            SERVER_PLAN_TIME.labels(query_name=query_name, node=node).set(stats.mean_plan_time / 1000)
+            SERVER_BLOCKS.labels(query_name=query_name, node=node, kind="shared_hit").set(stats.shared_hit)
+            SERVER_BLOCKS.labels(query_name=query_name, node=node, kind="shared_read").set(stats.shared_read)
+            SERVER_BLOCKS.labels(query_name=query_name, node=node, kind="temp_written").set(stats.temp_written)
+            SERVER_ROWS.labels(query_name=query_name, node=node).set(stats.rows)
+            SERVER_QUERY_WAL.labels(query_name=query_name, node=node).set(stats.wal_bytes)
+        for backend_type, obj, context, ops in snapshot["io"]:
+            for op, value in ops.items():
+                # NULL marks operations that do not apply to this backend and context
+                if value is not None:
+                    SERVER_IO.labels(node=node, backend_type=backend_type, object=obj, context=context, op=op).set(value)
+        SERVER_TEMP_FILES.labels(node=node).set(snapshot["temp_files"])
+        SERVER_TEMP_BYTES.labels(node=node).set(snapshot["temp_bytes"])
+        for kind, value in snapshot["wal"].items():
+            SERVER_WAL.labels(node=node, kind=kind).set(value)
+        for standby, lag_bytes, write_lag, flush_lag, replay_lag in snapshot["replication"]:
+            SERVER_REPLICATION_LAG_BYTES.labels(node=node, standby=standby).set(lag_bytes)
+            SERVER_REPLICATION_LAG.labels(node=node, standby=standby, kind="write").set(write_lag)
+            SERVER_REPLICATION_LAG.labels(node=node, standby=standby, kind="flush").set(flush_lag)
+            SERVER_REPLICATION_LAG.labels(node=node, standby=standby, kind="replay").set(replay_lag)
+
+    def record_write(self, transaction, duration, rows):
+        WRITE_DURATION.labels(transaction=transaction).observe(duration)
+        self.results.record(f"write_{transaction}", duration)
+        WRITE_COMMITS.labels(transaction=transaction).inc()
+        for table, count in rows.items():
+            WRITE_ROWS.labels(table=table).inc(count)
+
+    def record_write_error(self, transaction):
+        WRITE_ERRORS.labels(transaction=transaction).inc()
+        self.results.error(f"write_{transaction}")
+
+    def record_retry(self, query_name, reason):
+        QUERY_RETRIES.labels(query_name=query_name, reason=reason).inc()
+        self.results.retry(query_name)
+
+    def record_outage(self, node):
+        ENDPOINT_AVAILABLE.labels(node=node).set(0)
+        ENDPOINT_OUTAGES.labels(node=node).inc()
+
+    def record_recovery(self, node, seconds):
+        ENDPOINT_AVAILABLE.labels(node=node).set(1)
+        ENDPOINT_UNAVAILABLE.labels(node=node).observe(seconds)
+        self.results.outage(node, seconds)
+
+    def start_writers(self):
+        """Start WRITE_MATCHES live match writers on the primary alongside the readers."""
+        references = References()
+        with self.router.primary.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                check_schema(cursor)
+                references.load(cursor)
+        for transaction in TRANSACTIONS:
+            WRITE_ERRORS.labels(transaction=transaction)
+        writers = [
+            MatchWriter(
+                self.router.primary.pool,
+                references,
+                match_seconds=self.write_match_seconds,
+                pause_seconds=self.write_pause_seconds,
+                on_transaction=self.record_write,
+                on_error=self.record_write_error,
+                failover=self.failover
+            ).start(self.stop_event, f"writer-{i}")
+            for i in range(self.write_matches)
+        ]
+        LIVE_MATCHES.set(len(writers))
+        logger.info(f"Started {len(writers)} live match writers, {self.write_match_seconds:.0f}s per match")
+        return writers
+
+    def collect_run_info(self):
+        """Describe the run in its results file: settings, schema version and database size."""
+        self.results.info["config"] = run_config(self.queries, self.weights)
+        try:
+            with self.router.primary.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    self.results.info.update(database_info(cursor))
+        except psycopg2.Error as e:
+            logger.warning(f"Could not read the schema version: {e}")
+
+    def save_results(self):
+        if not self.results_path:
+            return
+        try:
+            self.results.write(self.results_path)
+        except OSError as e:
+            logger.error(f"Could not write run results to {self.results_path}: {e}")
+
+    def run_queries(self):
+        attempt = 0
+        while self.router is None and not self.stop_event.is_set():
+            try:
+                self.connect_db()
+            except psycopg2.OperationalError:
+                self.stop_event.wait(self.retry_policy.delay(attempt))
+                attempt += 1
+        if self.router is None:
+            return
+        self.load_params()
+        self.collect_run_info()
+        if self.cache is not None:
+            ChangeListener(
+                self.get_db_config(),
+                self.cache,
+                on_change=lambda table, invalidated: CACHE_INVALIDATIONS.labels(table=table).inc(invalidated)
+            ).start(self.stop_event)
+
+        if self.server_stats_interval > 0:
+            endpoints = [(endpoint.name, endpoint.pool.conn_kwargs) for endpoint in self.router.endpoints]
+            ServerStatsCollector(endpoints).start(self.stop_event, self.server_stats_interval, self.export_server_stats)
+
+        if self.router.replicas:
+            self.router.start_monitor(self.stop_event, self.lag_check_interval, self.export_replica_state)
+
+        target = self.worker_loop
+        if self.mode == "open":
+            self.start_scheduler()
+            target = self.open_loop_worker
+
+        threads = [
+            threading.Thread(target=target, args=(str(i),), name=f"worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        ACTIVE_WORKERS.set(len(threads))
+        logger.info(f"Started {len(threads)} workers in {self.mode}-loop mode")
+        if self.write_matches > 0:
+            try:
+                threads += self.start_writers()
+            except (psycopg2.Error, ValueError) as e:
+                logger.error(f"Live match writers disabled: {e}")
+
+        try:
+            start = time.monotonic()
+            saved_at = start
+            while any(thread.is_alive() for thread in threads):
+                if time.monotonic() - saved_at >= self.results_interval:
+                    self.save_results()
+                    saved_at = time.monotonic()
+                if self.mode == "open":
+                    TARGET_RATE.set(self.scheduler.profile.rate_at(time.monotonic() - start))
+                self.expire_plan_alerts()
+                if self.cache is not None:
+                    CACHE_BYTES.set(self.cache.bytes)
+                    CACHE_ENTRIES.set(len(self.cache))
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("Stopping query simulator")
+            self.stop_event.set()
+            for thread in threads:
+                thread.join(timeout=30)
+        self.save_results()
+        if self.results_path:
+            logger.info(f"Run results written to {self.results_path}")
+
+    def close(self):
+        if self.router:
+            self.router.close()
 
 if __name__ == '__main__':
     start_http_server(8000)
     logger.info("Prometheus metrics server started on port 8000")
-    
+
     simulator = QuerySimulator()
+    # docker stop sends SIGTERM; stop the workers so the run results get written
+    signal.signal(signal.SIGTERM, lambda signum, frame: simulator.stop_event.set())
     simulator.run_queries()
-    
-    if simulator.conn:
-        simulator.conn.close()
\ No newline at end of file
+    simulator.close()
@@ -0,0 +1,350 @@
+import math
+import time
+import random
+import logging
+import threading
+from datetime import date
+import psycopg2
+from psycopg2.extras import execute_values
+from failover import classify
+from server_stats import tag_query
+
+logger = logging.getLogger(__name__)
+
+# Every write runs in one of these transactions; they label the write metrics
+# and, as "write_<name>", the statements in pg_stat_statements
+TRANSACTIONS = ("kickoff", "goal", "foul", "injury", "substitution", "final_whistle")
+
+MATCH_MINUTES = 90
+FORMATION = "4-3-3"
+POSITIONS = ["ST", "RW", "LW", "CM", "RM", "LM", "CB", "CB", "LB", "RB", "GK"]
+
+# Lineup of every club as the seeder laid it out, in lineup order
+LINEUPS_QUERY = """
+    SELECT club_id, player_id, position FROM (
+        SELECT DISTINCT ON (club_id, player_id) club_id, player_id, position, id
+        FROM starting_lineups
+        ORDER BY club_id, player_id, id
+    ) l
+    ORDER BY id
+"""
+
+# Event tables the writer inserts into; from V6 on they carry match_date
+EVENT_TABLES = ("starting_lineups", "club_match_stats", "goals", "assists", "fouls", "injuries",
+                "substitutions", "clean_sheets")
+
+
+def check_schema(cursor):
+    """Raise ValueError unless the schema is partitioned by season (V6), which the writes assume."""
+    cursor.execute("SELECT to_regproc('ensure_season_partitions') IS NOT NULL")
+    missing = [] if cursor.fetchone()[0] else ["ensure_season_partitions()"]
+    cursor.execute("""
+        SELECT t.name
+        FROM unnest(%s::text[]) AS t(name)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM information_schema.columns c
+            WHERE c.table_schema = 'public' AND c.table_name = t.name AND c.column_name = 'match_date'
+        )
+        ORDER BY t.name
+    """, (list(EVENT_TABLES),))
+    missing += [f"{row[0]}.match_date" for row in cursor.fetchall()]
+    if missing:
+        raise ValueError(f"WRITE_MATCHES needs the V6 schema (partitioned by season); missing {', '.join(missing)}")
+
+
+def poisson(rng, mean):
+    # Knuth; means here are small
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def season_start(match_day):
+    # Mirrors season_start() from V6: seasons run from July 1 to July 1
+    return date(match_day.year if match_day.month >= 7 else match_day.year - 1, 7, 1)
+
+
+class References:
+    """Rows a live match points at: tournaments, clubs with their stadiums, referees and lineups."""
+
+    def __init__(self):
+        self.tournaments = []
+        self.clubs = []
+        self.referees = []
+        self.players = []
+        self.lineups = {}
+
+    def load(self, cursor):
+        cursor.execute("SELECT id FROM tournaments ORDER BY id")
+        self.tournaments = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT id, stadium_id FROM clubs WHERE NOT is_defunct ORDER BY id")
+        self.clubs = cursor.fetchall()
+        cursor.execute("SELECT id FROM referees ORDER BY id")
+        self.referees = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT id FROM players ORDER BY id")
+        self.players = [row[0] for row in cursor.fetchall()]
+        cursor.execute(LINEUPS_QUERY)
+        lineups = {}
+        for club_id, player_id, position in cursor.fetchall():
+            lineups.setdefault(club_id, []).append(player_id)
+        self.lineups = {club_id: players[:len(POSITIONS)] for club_id, players in lineups.items()}
+        if not (self.tournaments and len(self.clubs) >= 2 and self.referees and len(self.players) >= len(POSITIONS)):
+            raise ValueError("live matches need tournaments, two clubs, referees and a full lineup of players")
+
+    def lineup(self, rng, club_id):
+        lineup = self.lineups.get(club_id)
+        if not lineup or len(lineup) < len(POSITIONS):
+            # Clubs the seeder gave no matches get a squad on first use
+            lineup = self.lineups[club_id] = rng.sample(self.players, len(POSITIONS))
+        return lineup
+
+
+class LiveMatch:
+    """One match: who plays, and its events by minute, drawn at kickoff."""
+
+    def __init__(self, rng, references, match_date):
+        self.match_date = match_date
+        self.tournament_id = rng.choice(references.tournaments)
+        (self.home, stadium_id), (self.away, _) = rng.sample(references.clubs, 2)
+        self.stadium_id = stadium_id
+        self.referee_id = rng.choice(references.referees)
+        self.attendance = rng.randint(10000, 50000)
+        self.lineups = {club: references.lineup(rng, club) for club in (self.home, self.away)}
+        self.bench = {club: [p for p in rng.sample(references.players, min(len(references.players), 30))
+                             if p not in self.lineups[club]][:3]
+                      for club in (self.home, self.away)}
+        self.match_id = None
+        self.score = {self.home: 0, self.away: 0}
+        self.fouls = {self.home: 0, self.away: 0}
+
+        events = []
+        for club, goals in ((self.home, poisson(rng, 1.5)), (self.away, poisson(rng, 1.2))):
+            events += [(rng.randint(1, MATCH_MINUTES), "goal", club) for _ in range(goals)]
+            events += [(rng.randint(1, MATCH_MINUTES), "foul", club) for _ in range(rng.randint(8, 16))]
+            events += [(rng.randint(1, MATCH_MINUTES), "injury", club) for _ in range(poisson(rng, 0.3))]
+            events += [(rng.randint(55, 85), "substitution", club) for _ in range(len(self.bench[club]))]
+        self.events = sorted(events, key=lambda event: event[0])
+
+    def opponent(self, club):
+        return self.away if club == self.home else self.home
+
+    def checkpoint(self):
+        """State the transactions change, to be put back when one of them rolls back."""
+        return (self.match_id, dict(self.score), dict(self.fouls),
+                {club: list(bench) for club, bench in self.bench.items()})
+
+    def restore(self, state):
+        self.match_id, self.score, self.fouls, self.bench = state
+
+
+class MatchWriter:
+    """Plays out live matches on the primary as a stream of small transactions.
+
+    Kickoff inserts the match, both lineups and zeroed club stats; every goal,
+    foul, injury and substitution is then its own transaction at its minute,
+    and the final whistle settles the club stats and clean sheets. The V5
+    summary triggers and V7 change notifications fire on all of them, so the
+    writes also drive summary maintenance and result cache invalidation.
+
+    `on_transaction(name, duration, rows)` is called after every commit and
+    `on_error(name)` after every failed transaction. With a `FailoverHandler`
+    a transaction that fails because the leader went away or it lost a
+    serialization conflict is run again after backoff, unless the connection
+    dropped during COMMIT and it may already have been applied.
+    """
+
+    # Seasons whose partitions exist, shared by all writers
+    _seasons = set()
+    _seasons_lock = threading.Lock()
+
+    def __init__(self, pool, references, match_seconds=90, pause_seconds=5, rng=None,
+                 on_transaction=None, on_error=None, failover=None):
+        self.pool = pool
+        self.references = references
+        self.minute_seconds = match_seconds / MATCH_MINUTES
+        self.pause_seconds = pause_seconds
+        self.rng = rng or random.Random()
+        self.on_transaction = on_transaction or (lambda name, duration, rows: None)
+        self.on_error = on_error or (lambda name: None)
+        self.failover = failover
+
+    def start(self, stop_event, name):
+        thread = threading.Thread(target=self.run, args=(stop_event,), name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                self.play(stop_event)
+            except Exception as e:
+                logger.error(f"Live match aborted: {e}")
+            stop_event.wait(self.pause_seconds)
+
+    def play(self, stop_event):
+        match = LiveMatch(self.rng, self.references, date.today())
+        self.ensure_partitions(match.match_date)
+        if not self.transaction("kickoff", self.kickoff, match):
+            return
+        started = time.monotonic()
+        for minute, kind, club in match.events:
+            if stop_event.wait(max(0.0, started + minute * self.minute_seconds - time.monotonic())):
+                return
+            self.transaction(kind, getattr(self, kind), match, minute, club)
+        if not stop_event.wait(max(0.0, started + MATCH_MINUTES * self.minute_seconds - time.monotonic())):
+            self.transaction("final_whistle", self.final_whistle, match)
+        logger.info(f"Match {match.match_id} finished {match.score[match.home]}:{match.score[match.away]}")
+
+    def transaction(self, name, body, match, *args):
+        """Run `body(cursor, match, *args)` in one transaction; returns whether it committed.
+
+        Duration runs from the first attempt, so retries after a failover show up in it.
+        """
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            state = match.checkpoint()
+            committing = False
+            try:
+                with self.pool.connection() as conn:
+                    try:
+                        with conn.cursor() as cursor:
+                            rows = body(cursor, match, *args)
+                        committing = True
+                        conn.commit()
+                    except psycopg2.Error:
+                        if not conn.closed:
+                            conn.rollback()
+                        raise
+                if self.failover:
+                    self.failover.success(self.pool)
+                self.on_transaction(name, time.monotonic() - start, rows)
+                return True
+            except Exception as e:
+                match.restore(state)
+                logger.error(f"Write transaction {name} failed: {e}")
+                if self.failover and isinstance(e, psycopg2.Error):
+                    # Only a COMMIT lost with its connection has an unknown outcome
+                    idempotent = not (committing and classify(e) == "connection")
+                    if self.failover.retry(self.pool, f"write_{name}", e, attempt, idempotent):
+                        attempt += 1
+                        continue
+                self.on_error(name)
+                return False
+
+    def execute(self, cursor, name, statement, args):
+        cursor.execute(tag_query(f"write_{name}", statement), args)
+
+    def ensure_partitions(self, match_date):
+        """Create the partitions of a new season once, outside the kickoff transaction."""
+        season = season_start(match_date)
+        with self._seasons_lock:
+            if season in self._seasons:
+                return
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT ensure_season_partitions(%s, %s)", (match_date, match_date))
+                conn.commit()
+            self._seasons.add(season)
+
+    def kickoff(self, cursor, match):
+        self.execute(cursor, "kickoff", """
+            INSERT INTO matches (tournament_id, club1_id, club2_id, match_date, stadium_id,
+                                 club1_score, club2_score, referee_id, attendance)
+            VALUES (%s, %s, %s, %s, %s, 0, 0, %s, %s)
+            RETURNING id
+        """, (match.tournament_id, match.home, match.away, match.match_date, match.stadium_id,
+              match.referee_id, match.attendance))
+        match.match_id = cursor.fetchone()[0]
+        lineups = [
+            (match.match_id, club, player_id, POSITIONS[i], i == 3, FORMATION, match.match_date)
+            for club in (match.home, match.away)
+            for i, player_id in enumerate(match.lineups[club])
+        ]
+        execute_values(cursor, tag_query("write_kickoff", """
+            INSERT INTO starting_lineups (match_id, club_id, player_id, position, is_captain, formation, match_date)
+            VALUES %s
+        """), lineups, template="(%s, %s, %s, %s::player_position, %s, %s, %s)")
+        execute_values(cursor, tag_query("write_kickoff", """
+            INSERT INTO club_match_stats (match_id, club_id, possession, shots, shots_on_target, passes,
+                                          pass_accuracy, fouls_committed, offsides, corners, match_date)
+            VALUES %s
+        """), [(match.match_id, club, 50, 0, 0, 0, 0, 0, 0, 0, match.match_date) for club in (match.home, match.away)])
+        return {"matches": 1, "starting_lineups": len(lineups), "club_match_stats": 2}
+
+    def goal(self, cursor, match, minute, club):
+        lineup = match.lineups[club]
+        # Keeper never scores; strikers and wingers most often
+        scorer = self.rng.choices(lineup[:10], weights=[1 / (rank + 1) for rank in range(10)])[0]
+        goal_type = self.rng.choices(["Open Play", "Free Kick", "Penalty", "Own Goal"], weights=[80, 8, 10, 2])[0]
+        self.execute(cursor, "goal", """
+            INSERT INTO goals (match_id, scorer_id, club_id, goal_mn, goal_type, match_date)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING goal_id
+        """, (match.match_id, scorer, club, minute, goal_type, match.match_date))
+        goal_id = cursor.fetchone()[0]
+        rows = {"goals": 1, "matches": 1}
+        if goal_type == "Open Play" and self.rng.random() < 0.7:
+            assistant = self.rng.choice([player for player in lineup[:10] if player != scorer])
+            self.execute(cursor, "goal", """
+                INSERT INTO assists (match_id, goal_id, assistant_id, assist_mn, match_date)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (match.match_id, goal_id, assistant, minute, match.match_date))
+            rows["assists"] = 1
+        column = "club1_score" if club == match.home else "club2_score"
+        self.execute(cursor, "goal", f"""
+            UPDATE matches SET {column} = {column} + 1
+            WHERE id = %s AND match_date = %s
+        """, (match.match_id, match.match_date))
+        match.score[club] += 1
+        return rows
+
+    def foul(self, cursor, match, minute, club):
+        foul_type = self.rng.choices(["Warning", "Foul", "Yellow Card", "Red Card"], weights=[20, 65, 14, 1])[0]
+        self.execute(cursor, "foul", """
+            INSERT INTO fouls (match_id, player_id, club_id, foul_mn, foul_type, match_date)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (match.match_id, self.rng.choice(match.lineups[club]), club, minute, foul_type, match.match_date))
+        match.fouls[club] += 1
+        return {"fouls": 1}
+
+    def injury(self, cursor, match, minute, club):
+        injury_type = self.rng.choice(["Muscular", "Joint", "Fracture", "Concussion", "Ligament Rupture"])
+        self.execute(cursor, "injury", """
+            INSERT INTO injuries (match_id, player_id, club_id, injury_type, injury_mn, recovery_days, match_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (match.match_id, self.rng.choice(match.lineups[club]), club, injury_type, minute,
+              self.rng.randint(3, 90), match.match_date))
+        return {"injuries": 1}
+
+    def substitution(self, cursor, match, minute, club):
+        player_in = match.bench[club].pop()
+        self.execute(cursor, "substitution", """
+            INSERT INTO substitutions (match_id, club_id, player_out_id, player_in_id, substitution_mn, match_date)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (match.match_id, club, self.rng.choice(match.lineups[club][:10]), player_in, minute, match.match_date))
+        return {"substitutions": 1}
+
+    def final_whistle(self, cursor, match):
+        possession = self.rng.randint(30, 70)
+        rows = {"club_match_stats": 2}
+        for club, club_possession in ((match.home, possession), (match.away, 100 - possession)):
+            goals = match.score[club]
+            shots = self.rng.randint(goals, max(goals, 20))
+            self.execute(cursor, "final_whistle", """
+                UPDATE club_match_stats
+                SET possession = %s, shots = %s, shots_on_target = %s, passes = %s, pass_accuracy = %s,
+                    fouls_committed = %s, offsides = %s, corners = %s
+                WHERE match_id = %s AND club_id = %s AND match_date = %s
+            """, (club_possession, shots, self.rng.randint(goals, shots), self.rng.randint(400, 700),
+                  self.rng.randint(70, 95), match.fouls[club], self.rng.randint(0, 7), self.rng.randint(0, 15),
+                  match.match_id, club, match.match_date))
+            if match.score[match.opponent(club)] == 0:
+                self.execute(cursor, "final_whistle", """
+                    INSERT INTO clean_sheets (match_id, club_id, player_id, match_date)
+                    VALUES (%s, %s, %s, %s)
+                """, (match.match_id, club, match.lineups[club][-1], match.match_date))
+                rows["clean_sheets"] = rows.get("clean_sheets", 0) + 1
+        return rows